@@ -1,6 +1,10 @@
+from django.conf import settings
 from rest_framework import serializers
 
-from .validators import phone_number_validator, token_validator
+from app.calls import GROUP_CALL_ALL, GROUP_CALL_FIRST
+from app.serializers import CallerSerializer, get_sip_user_id_field, IncomingCallSerializer, SipUserIdSerializer
+
+from .validators import token_validator
 
 
 class TokenSerializer(serializers.Serializer):
@@ -10,13 +14,6 @@ class TokenSerializer(serializers.Serializer):
     token = serializers.CharField(max_length=250, validators=[token_validator])
 
 
-class SipUserIdSerializer(serializers.Serializer):
-    """
-    Base serializer for the sip_user_id field.
-    """
-    sip_user_id = serializers.IntegerField(max_value=999999999, min_value=int(1e8))
-
-
 class DeviceSerializer(TokenSerializer, SipUserIdSerializer):
     """
     Serializer for the device view post.
@@ -39,15 +36,50 @@ class CallResponseSerializer(serializers.Serializer):
     """
     Serializer for the call response view.
     """
-    unique_key = serializers.CharField(max_length=255)
+    # Room for a call_id of 255 characters with the expiry and signature.
+    unique_key = serializers.CharField(max_length=300)
     message_start_time = serializers.FloatField()
     available = serializers.BooleanField(default=True)
+    # Attempt of the push message the device responds to.
+    attempt = serializers.IntegerField(min_value=1, default=None)
+    # Token of the responding device, used to stop the other devices of the
+    # account from ringing.
+    token = serializers.CharField(max_length=250, default='', allow_blank=True)
+
+
+class CallCancelSerializer(serializers.Serializer):
+    """
+    Serializer for the call cancel view.
+    """
+    # The call_id of the incoming call or the unique_key when it had none.
+    call_id = serializers.CharField(max_length=255)
+    notify = serializers.BooleanField(default=True)
 
 
-class IncomingCallSerializer(SipUserIdSerializer):
+class IncomingGroupCallSerializer(CallerSerializer):
     """
-    Serializer for the incoming call view.
+    Serializer for the incoming group call view.
     """
-    caller_id = serializers.CharField(max_length=255, default='', allow_blank=True)
-    phonenumber = serializers.CharField(max_length=32, validators=[phone_number_validator])
-    call_id = serializers.CharField(max_length=255, default=None, allow_blank=True)
+    # Comma separated sip_user_ids.
+    sip_user_ids = serializers.CharField()
+    mode = serializers.ChoiceField(choices=(GROUP_CALL_FIRST, GROUP_CALL_ALL), default=GROUP_CALL_FIRST)
+
+    def validate_sip_user_ids(self, value):
+        """
+        Validate every sip_user_id and remove duplicates.
+
+        Returns:
+            list: The sip_user_ids in the given order.
+        """
+        field = get_sip_user_id_field()
+
+        sip_user_ids = []
+        for sip_user_id in value.split(','):
+            sip_user_id = field.run_validation(sip_user_id.strip())
+            if sip_user_id not in sip_user_ids:
+                sip_user_ids.append(sip_user_id)
+
+        if len(sip_user_ids) > settings.GROUP_CALL_MAX_ACCOUNTS:
+            raise serializers.ValidationError('More than {0} sip_user_ids.'.format(settings.GROUP_CALL_MAX_ACCOUNTS))
+
+        return sip_user_ids
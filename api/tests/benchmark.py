@@ -0,0 +1,98 @@
+import json
+import os
+import time
+
+
+def run_benchmark(func, iterations):
+    """
+    Function to time a callable over a number of iterations.
+
+    Args:
+        func (callable): Function to benchmark, called without arguments.
+        iterations (int): The amount of times func is called.
+
+    Returns:
+        dict: Iterations and the min, median and mean time per call in msec.
+    """
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+
+    return {
+        'iterations': iterations,
+        'min': timings[0],
+        'median': timings[len(timings) // 2],
+        'mean': sum(timings) / len(timings),
+    }
+
+
+def load_baseline(path):
+    """
+    Function to load stored benchmark results.
+
+    Args:
+        path (string): Path of the json file with the baseline.
+
+    Returns:
+        dict: Benchmark results by name, empty when there is no baseline.
+    """
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def save_baseline(path, results):
+    """
+    Function to store benchmark results as the new baseline.
+
+    Args:
+        path (string): Path of the json file to write.
+        results (dict): Benchmark results by name.
+    """
+    with open(path, 'w') as baseline_file:
+        json.dump(results, baseline_file, indent=4, sort_keys=True)
+
+
+def compare_results(results, baseline, tolerance):
+    """
+    Function to compare benchmark results against a baseline. The median is
+    compared because it is the least sensitive to a noisy machine.
+
+    Args:
+        results (dict): Benchmark results by name.
+        baseline (dict): Stored benchmark results by name.
+        tolerance (float): Fraction the median may be slower than the
+            baseline before it counts as a regression.
+
+    Returns:
+        tuple: The report as a string and a list with the names of the
+            benchmarks that regressed.
+    """
+    lines = ['{0:<40} {1:>14} {2:>14} {3:>10}'.format('Benchmark', 'Baseline (ms)', 'Current (ms)', 'Change')]
+    regressions = []
+
+    for name in sorted(results):
+        current = results[name]['median']
+
+        if name not in baseline:
+            lines.append('{0:<40} {1:>14} {2:>14.4f} {3:>10}'.format(name, '-', current, 'new'))
+            continue
+
+        previous = baseline[name]['median']
+        change = (current - previous) / previous if previous else 0.0
+
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = ' REGRESSION'
+
+        lines.append('{0:<40} {1:>14.4f} {2:>14.4f} {3:>+9.1f}%{4}'.format(
+            name, previous, current, change * 100, flag))
+
+    return '\n'.join(lines), regressions
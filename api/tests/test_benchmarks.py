@@ -0,0 +1,124 @@
+import datetime
+import time
+from unittest import mock, skipUnless
+from uuid import uuid4
+
+from django.conf import settings
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from app.cache import RedisClusterCache
+from app.models import App, Device, ResponseLog, APNS_PLATFORM
+from app.push import get_call_push_payload
+from app.utils import get_metrics
+from app.validators import phone_number_validator
+
+from ..serializers import CallResponseSerializer, IncomingCallSerializer
+from .benchmark import compare_results, load_baseline, run_benchmark, save_baseline
+
+
+@skipUnless(settings.BENCHMARK_ENABLED, 'Benchmarks run with BENCHMARK_ENABLED=True')
+class HotPathBenchmarkTest(TransactionTestCase):
+    """
+    Micro benchmarks for the code that runs on every incoming call. The
+    results are compared against the stored baseline in
+    BENCHMARK_BASELINE_FILE and printed as a report.
+    """
+    def setUp(self):
+        super(HotPathBenchmarkTest, self).setUp()
+        self.client = APIClient()
+
+        self.ios_app, created = App.objects.get_or_create(platform='apns', app_id='com.voipgrid.vialer')
+
+        Device.objects.create(
+            name='test device',
+            token='a652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='123456789',
+            os_version='8.3',
+            client_version='1.0',
+            last_seen=datetime.datetime.now(),
+            app=self.ios_app
+        )
+
+        # Synthetic response logs for the metrics.
+        ResponseLog.objects.bulk_create([
+            ResponseLog(platform=APNS_PLATFORM, roundtrip_time=(i % 40) / 10, available=bool(i % 4))
+            for i in range(1000)
+        ])
+
+        self.call_data = {
+            'sip_user_id': '123456789',
+            'caller_id': 'Test name',
+            'phonenumber': '+31 (0)50 123 4567',
+            'call_id': 'sduiqayduiryqwuioeryqwer76789',
+        }
+
+    def _benchmark_incoming_call_serializer(self):
+        IncomingCallSerializer(data=self.call_data).is_valid(raise_exception=True)
+
+    def _benchmark_call_response_serializer(self):
+        CallResponseSerializer(data={
+            'unique_key': 'sduiqayduiryqwuioeryqwer76789',
+            'message_start_time': time.time(),
+        }).is_valid(raise_exception=True)
+
+    def _benchmark_phone_number_validator(self):
+        phone_number_validator(self.call_data['phonenumber'])
+
+    def _benchmark_call_push_payload(self):
+        get_call_push_payload('sduiqayduiryqwuioeryqwer76789', '0123456789', 'Test name', 1)
+
+    def _benchmark_redis_round_trip(self):
+        redis_cache = RedisClusterCache()
+        redis_cache.set('benchmark_key', 'True')
+        redis_cache.get('benchmark_key')
+
+    @mock.patch('app.push.send_apns_message')
+    @mock.patch.object(RedisClusterCache, 'hget', return_value='True')
+    def _benchmark_incoming_call_view(self, *mocks):
+        # The device answers at once so only the dispatch is measured. Every
+        # iteration is a new call, a repeated call_id is a duplicate request.
+        response = self.client.post('/api/incoming-call/', dict(self.call_data, call_id=uuid4().hex))
+        self.assertEqual(response.content, b'status=ACK')
+
+    def _benchmark_get_metrics(self):
+        start_date = datetime.date.today().replace(day=1)
+        get_metrics(start_date, start_date + datetime.timedelta(days=31), APNS_PLATFORM)
+
+    def test_benchmarks(self):
+        """
+        Run all benchmarks and report the difference with the baseline.
+        """
+        iterations = settings.BENCHMARK_ITERATIONS
+
+        benchmarks = {
+            'serializer.incoming_call': self._benchmark_incoming_call_serializer,
+            'serializer.call_response': self._benchmark_call_response_serializer,
+            'validator.phone_number': self._benchmark_phone_number_validator,
+            'push.call_payload': self._benchmark_call_push_payload,
+            'cache.redis_round_trip': self._benchmark_redis_round_trip,
+            'view.incoming_call': self._benchmark_incoming_call_view,
+            'utils.get_metrics': self._benchmark_get_metrics,
+        }
+
+        results = {}
+        for name, benchmark in benchmarks.items():
+            # Warm up imports and connections before timing.
+            benchmark()
+            results[name] = run_benchmark(benchmark, iterations)
+
+        baseline = load_baseline(settings.BENCHMARK_BASELINE_FILE)
+        report, regressions = compare_results(results, baseline, settings.BENCHMARK_TOLERANCE)
+        missing = sorted(name for name in results if name not in baseline)
+
+        print('\nBenchmarks with {0} iterations:\n{1}'.format(iterations, report))
+
+        if settings.BENCHMARK_SAVE_BASELINE:
+            save_baseline(settings.BENCHMARK_BASELINE_FILE, results)
+            print('Stored new baseline in {0}'.format(settings.BENCHMARK_BASELINE_FILE))
+
+        if settings.BENCHMARK_FAIL_ON_REGRESSION and not settings.BENCHMARK_SAVE_BASELINE:
+            # Without a baseline every benchmark is new and can not regress.
+            self.assertEqual(missing, [], msg='Benchmarks without baseline in {0}'.format(
+                settings.BENCHMARK_BASELINE_FILE))
+            self.assertEqual(regressions, [], msg='Benchmarks slower than the baseline')
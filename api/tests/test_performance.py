@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 import time
 from unittest import mock
+from uuid import uuid4
 
 from django.conf import settings
 from django.test import TransactionTestCase
@@ -36,7 +37,8 @@ class IncomingCallPerformanceTest(TransactionTestCase):
             'sip_user_id': '123456789',
             'caller_id': 'Test name',
             'phonenumber': '0123456789',
-            'call_id': 'sduiqayduiryqwuioeryqwer76789',
+            # A new call every iteration, not a duplicate of the last one.
+            'call_id': uuid4().hex,
         }
 
         # Now the device exists, call it again in seperate thread.
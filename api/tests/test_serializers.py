@@ -3,8 +3,8 @@ import time
 from django.test import TestCase
 
 from ..serializers import (CallResponseSerializer, IncomingCallSerializer,
-                           DeviceSerializer, SipUserIdSerializer,
-                           TokenSerializer)
+                           IncomingGroupCallSerializer, DeviceSerializer,
+                           SipUserIdSerializer, TokenSerializer)
 
 
 class TestTokenSerializer(TestCase):
@@ -195,3 +195,30 @@ class TestIncomingCallSerializer(TestCase):
         }
 
         self.assertFalse(self.serializer(data=data).is_valid())
+
+
+class TestIncomingGroupCallSerializer(TestCase):
+
+    def setUp(self):
+        self.serializer = IncomingGroupCallSerializer
+
+    def test_validation(self):
+        """
+        Test if every sip_user_id is validated and duplicates are removed.
+        """
+        data = {
+            'sip_user_ids': '123456789, 234567890,123456789',
+            'phonenumber': '0123456789',
+        }
+
+        serializer = self.serializer(data=data)
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.validated_data['sip_user_ids'], [123456789, 234567890])
+        self.assertEqual(serializer.validated_data['mode'], 'first')
+
+        data['sip_user_ids'] = '123456789,12345'
+        self.assertFalse(self.serializer(data=data).is_valid())
+
+        data['sip_user_ids'] = '123456789'
+        data['mode'] = 'random'
+        self.assertFalse(self.serializer(data=data).is_valid())
@@ -1,17 +1,27 @@
 from datetime import datetime, timedelta
+import json
+import threading
 import time
 from unittest import mock
 
 from django.conf import settings
+from django.contrib.auth.models import User
 from django.core.cache import cache
-from django.test import TestCase, TransactionTestCase
+from django.test import override_settings, TestCase, TransactionTestCase
 from rest_framework.test import APIClient
 
-from app.models import App, Device, ResponseLog
+from app import drain
+from app.cache import RedisClusterCache
+from app import callbacks
+from app.callbacks import stop_scheduler
+from app.models import App, CallLog, Device, ResponseLog
+from app.warmup import start_warm_up
 
-from .utils import mocked_send_apns_message, mocked_send_fcm_message, ThreadWithReturn
+from .utils import (clear_call_state, mocked_send_apns_message, mocked_send_fcm_message, start_callback_server,
+                    ThreadWithReturn)
 
 
+@override_settings(MAX_DEVICES_PER_ACCOUNT=1)
 class RegisterDeviceTest(TestCase):
 
     def setUp(self):
@@ -114,6 +124,59 @@ class RegisterDeviceTest(TestCase):
         })
         self.assertEqual(response.status_code, 200, msg='Wrong status code for unregister, expected 200')
 
+    def test_register_unchanged_device(self):
+        """
+        Test that registering an unchanged device does not write last_seen
+        again within DEVICE_LAST_SEEN_INTERVAL.
+        """
+        response = self.client.post(self.ios_url, self.data)
+        self.assertEqual(response.status_code, 201, msg='Wrong status code for create')
+
+        last_seen = Device.objects.get(sip_user_id=self.data['sip_user_id']).last_seen
+
+        response = self.client.post(self.ios_url, self.data)
+        self.assertEqual(response.status_code, 200, msg='Wrong status code for update')
+
+        device = Device.objects.get(sip_user_id=self.data['sip_user_id'])
+        self.assertEqual(device.last_seen, last_seen, msg='last_seen should not be updated')
+
+        # A changed field is stored.
+        self.data['client_version'] = '2.0'
+        response = self.client.post(self.ios_url, self.data)
+        self.assertEqual(response.status_code, 200, msg='Wrong status code for update')
+
+        device = Device.objects.get(sip_user_id=self.data['sip_user_id'])
+        self.assertEqual(device.client_version, '2.0', msg='Wrong value for client_version')
+        self.assertEqual(Device.objects.count(), 1)
+
+    @override_settings(MAX_DEVICES_PER_ACCOUNT=2)
+    @mock.patch('app.push.send_fcm_message', side_effect=mocked_send_fcm_message)
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_register_multiple_devices(self, *mocks):
+        """
+        Test that an account keeps MAX_DEVICES_PER_ACCOUNT devices and the
+        least recently seen device is replaced.
+        """
+        response = self.client.post(self.ios_url, self.data)
+        self.assertEqual(response.status_code, 201, msg='Wrong status code for create')
+        Device.objects.update(last_seen=datetime.now() - timedelta(days=14))
+
+        self.data['token'] = 'android4bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6'
+        response = self.client.post(self.android_url, self.data)
+        self.assertEqual(response.status_code, 200, msg='Wrong status code for second device')
+        self.assertEqual(Device.objects.filter(sip_user_id=self.data['sip_user_id']).count(), 2)
+
+        self.data['token'] = 'b652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6'
+        response = self.client.post(self.ios_url, self.data)
+        self.assertEqual(response.status_code, 200, msg='Wrong status code for third device')
+
+        # The least recently seen device is replaced.
+        tokens = Device.objects.filter(sip_user_id=self.data['sip_user_id']).values_list('token', flat=True)
+        self.assertEqual(sorted(tokens), sorted([
+            'android4bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            'b652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+        ]))
+
     def test_register_unexisting_app(self):
         """
         Test registration of an unexisting app
@@ -160,6 +223,7 @@ class IOSIncomingCallTest(TransactionTestCase):
 
     def setUp(self):
         super(IOSIncomingCallTest, self).setUp()
+        clear_call_state('sduiqayduiryqwuioeryqwer76789', 'sduiqayduiryqwuioeryqwer76790')
         self.client = APIClient()
 
         # URL's.
@@ -313,6 +377,46 @@ class IOSIncomingCallTest(TransactionTestCase):
         self.assertEqual(response.content, b'status=NAK')
         self.assertEqual(cache.get('attempts'), 3)
 
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_duplicate_incoming_call(self, mocked_apns):
+        """
+        Test that a retry for the same call_id waits for the outcome of the
+        first request without sending push messages.
+        """
+        call_data = {
+            'sip_user_id': '123456789',
+            'caller_id': 'Test name',
+            'phonenumber': '0123456789',
+            'call_id': 'sduiqayduiryqwuioeryqwer76789',
+        }
+
+        Device.objects.create(
+            name='test device',
+            token='a652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='123456789',
+            app=self.ios_app
+        )
+
+        first = ThreadWithReturn(target=self.client.post, args=(self.incoming_url, call_data))
+        first.start()
+        time.sleep(0.1)
+        duplicate = ThreadWithReturn(target=self.client.post, args=(self.incoming_url, call_data))
+        duplicate.start()
+
+        # Respond before the push message is resent.
+        time.sleep(0.5)
+
+        app_data = {
+            'unique_key': call_data['call_id'],
+            'message_start_time': time.time(),
+        }
+        response = self.client.post(self.response_url, app_data)
+        self.assertEqual(response.status_code, 202)
+
+        self.assertEqual(first.join().content, b'status=ACK')
+        self.assertEqual(duplicate.join().content, b'status=ACK')
+        self.assertEqual(mocked_apns.call_count, 1)
+
     @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
     def test_log_to_db(self, *mocks):
         """
@@ -370,11 +474,453 @@ class IOSIncomingCallTest(TransactionTestCase):
         # Check if there is a log entry.
         self.assertGreater(log_count, 0)
 
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_log_response_timing(self, *mocks):
+        """
+        Test that the round trip time and the attempt that woke the device
+        are timed with the send times of the push messages.
+        """
+        Device.objects.create(
+            token='a652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='123456789',
+            app=self.ios_app
+        )
+        call_data = {
+            'sip_user_id': '123456789',
+            'caller_id': 'Test name',
+            'phonenumber': '0123456789',
+            'call_id': 'sduiqayduiryqwuioeryqwer76789',
+        }
+
+        thread = ThreadWithReturn(target=self.client.post, args=(self.incoming_url, call_data))
+        thread.start()
+
+        # Respond after the second push message with a wrong start time.
+        time.sleep(1.5)
+        response = self.client.post(self.response_url, {
+            'unique_key': call_data['call_id'],
+            'message_start_time': time.time() - 100,
+        })
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(thread.join().content, b'status=ACK')
+
+        # Wait to be sure the thread that writes to log is finished.
+        time.sleep(1)
+
+        log = ResponseLog.objects.get(platform=self.ios_app.platform)
+        self.assertEqual(log.attempt, 2)
+        self.assertAlmostEqual(log.roundtrip_time, 1.5, delta=0.3)
+        self.assertAlmostEqual(log.attempt_latency, 0.5, delta=0.3)
+        self.assertGreater(log.client_roundtrip_time, 100)
+
+    @override_settings(APP_PUSH_ROUNDTRIP_WAIT=2000, CALL_LOG_BATCH_SIZE=1)
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_log_calls(self, *mocks):
+        """
+        Test that calls without a device and calls no device answered are
+        logged.
+        """
+        call_data = {
+            'sip_user_id': '123456789',
+            'caller_id': 'Test name',
+            'phonenumber': '0123456789',
+            'call_id': 'sduiqayduiryqwuioeryqwer76789',
+        }
+        response = self.client.post(self.incoming_url, call_data)
+        self.assertEqual(response.content, b'status=NAK')
+
+        Device.objects.create(
+            token='a652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='123456789',
+            client_version='1.0',
+            app=self.ios_app
+        )
+        call_data['call_id'] = 'sduiqayduiryqwuioeryqwer76790'
+        response = self.client.post(self.incoming_url, call_data)
+        self.assertEqual(response.content, b'status=NAK')
+
+        # Wait to be sure the thread that writes the logs is finished.
+        time.sleep(1)
+
+        call_log = CallLog.objects.get(unique_key='sduiqayduiryqwuioeryqwer76789')
+        self.assertEqual(call_log.outcome, 'no-device')
+
+        call_log = CallLog.objects.get(unique_key='sduiqayduiryqwuioeryqwer76790')
+        self.assertEqual(call_log.outcome, 'timeout')
+        self.assertEqual(call_log.app_id, 'com.voipgrid.vialer')
+        self.assertEqual(call_log.client_version, '1.0')
+        self.assertEqual(call_log.pushes, 1)
+        self.assertAlmostEqual(call_log.wait_time, 2, delta=0.3)
+
+
+@override_settings(UNIQUE_KEY_SIGNING=True)
+class SignedUniqueKeyTest(TransactionTestCase):
+
+    def setUp(self):
+        super(SignedUniqueKeyTest, self).setUp()
+        clear_call_state('sduiqayduiryqwuioeryqwer76789', 'sduiqayduiryqwuioeryqwer76790')
+        self.client = APIClient()
+
+        # URL's.
+        self.response_url = '/api/call-response/'
+        self.incoming_url = '/api/incoming-call/'
+
+        self.ios_app, created = App.objects.get_or_create(platform='apns', app_id='com.voipgrid.vialer')
+        Device.objects.create(
+            token='a652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='123456789',
+            app=self.ios_app,
+        )
+
+        self.call_data = {
+            'sip_user_id': '123456789',
+            'caller_id': 'Test name',
+            'phonenumber': '0123456789',
+            'call_id': 'sduiqayduiryqwuioeryqwer76789',
+        }
+
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_signed_unique_key(self, mocked_apns):
+        """
+        Test that the device gets a signed unique_key and can answer with it.
+        """
+        thread = ThreadWithReturn(target=self.client.post, args=(self.incoming_url, self.call_data))
+        thread.start()
+
+        time.sleep(0.5)
+
+        unique_key = mocked_apns.call_args[0][3]['unique_key']
+        self.assertTrue(unique_key.startswith('{0}:'.format(self.call_data['call_id'])))
+
+        response = self.client.post(self.response_url, {
+            'unique_key': self.call_data['call_id'],
+            'message_start_time': time.time(),
+        })
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.post(self.response_url, {
+            'unique_key': unique_key,
+            'message_start_time': time.time(),
+        })
+        self.assertEqual(response.status_code, 202)
+
+        response = thread.join()
+        self.assertEqual(response.content, b'status=ACK')
+
+    @mock.patch('app.cache.RedisClusterCache.hgetall')
+    def test_unsigned_unique_key(self, mocked_hgetall):
+        """
+        Test that responses with keys we did not sign do not touch redis.
+        """
+        response = self.client.post(self.response_url, {
+            'unique_key': 'sduiqayduiryqwuioeryqwer76789:1:abc',
+            'message_start_time': time.time(),
+        })
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(mocked_hgetall.called)
+
+
+@override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={'ip': '2/min'}))
+class ThrottleTest(TestCase):
+
+    def setUp(self):
+        super(ThrottleTest, self).setUp()
+        clear_call_state('sduiqayduiryqwuioeryqwer76789', 'sduiqayduiryqwuioeryqwer76790')
+        self.client = APIClient()
+        RedisClusterCache().delete('throttle_ip_127.0.0.1')
+
+    def test_throttle_call_response(self):
+        """
+        Test that a client gets 429 once its bucket is empty.
+        """
+        data = {
+            'unique_key': 'sduiqayduiryqwuioeryqwer76789',
+            'message_start_time': time.time(),
+        }
+        for i in range(2):
+            response = self.client.post('/api/call-response/', data)
+            self.assertEqual(response.status_code, 404)
+
+        response = self.client.post('/api/call-response/', data)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn(response['Retry-After'], ('29', '30'))
+
+    def test_forwarded_for(self):
+        """
+        Test that a client can not get a new bucket by changing the
+        X-Forwarded-For header without proxies in front of the api.
+        """
+        data = {
+            'unique_key': 'sduiqayduiryqwuioeryqwer76789',
+            'message_start_time': time.time(),
+        }
+        for i in range(2):
+            response = self.client.post('/api/call-response/', data, HTTP_X_FORWARDED_FOR='10.0.0.{0}'.format(i))
+            self.assertEqual(response.status_code, 404)
+
+        response = self.client.post('/api/call-response/', data, HTTP_X_FORWARDED_FOR='10.0.0.2')
+        self.assertEqual(response.status_code, 429)
+
+    @mock.patch('app.cache.RedisClusterCache.run_script', side_effect=ConnectionError)
+    def test_redis_unavailable(self, *mocks):
+        """
+        Test that requests are allowed when the throttle can not reach redis.
+        """
+        for i in range(3):
+            response = self.client.post('/api/call-response/', {
+                'unique_key': 'sduiqayduiryqwuioeryqwer76789',
+                'message_start_time': time.time(),
+            })
+            self.assertEqual(response.status_code, 404)
+
+
+class CallCancelTest(TransactionTestCase):
+
+    def setUp(self):
+        super(CallCancelTest, self).setUp()
+        clear_call_state('sduiqayduiryqwuioeryqwer76789', 'sduiqayduiryqwuioeryqwer76790')
+        self.client = APIClient()
+
+        # URL's.
+        self.response_url = '/api/call-response/'
+        self.incoming_url = '/api/incoming-call/'
+        self.cancel_url = '/api/call-cancel/'
+
+        self.ios_app, created = App.objects.get_or_create(platform='apns', app_id='com.voipgrid.vialer')
+        Device.objects.create(
+            token='a652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='123456789',
+            app=self.ios_app,
+        )
+
+        self.call_data = {
+            'sip_user_id': '123456789',
+            'caller_id': 'Test name',
+            'phonenumber': '0123456789',
+            'call_id': 'sduiqayduiryqwuioeryqwer76789',
+        }
+
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_cancel_incoming_call(self, mocked_apns):
+        """
+        Test that a cancelled call stops waiting and the device can not
+        answer anymore.
+        """
+        start_time = time.time()
+        thread = ThreadWithReturn(target=self.client.post, args=(self.incoming_url, self.call_data))
+        thread.start()
+
+        time.sleep(0.5)
+
+        response = self.client.post(self.cancel_url, {'call_id': self.call_data['call_id']})
+        self.assertEqual(response.content, b'status=ACK')
+
+        response = thread.join()
+        self.assertEqual(response.content, b'status=NAK')
+        self.assertLess(time.time() - start_time, settings.APP_PUSH_ROUNDTRIP_WAIT / 1000)
+
+        response = self.client.post(self.response_url, {
+            'unique_key': self.call_data['call_id'],
+            'message_start_time': time.time(),
+        })
+        self.assertEqual(response.status_code, 404)
+
+        # Wait to be sure the thread that sends the cancel push is finished.
+        time.sleep(0.5)
+        self.assertEqual(mocked_apns.call_args[0][2], 'cancel')
+
+    def test_cancel_unknown_call(self):
+        """
+        Test cancelling a call that is not waiting.
+        """
+        response = self.client.post(self.cancel_url, {'call_id': 'unknown'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.content, b'status=NAK')
+
+
+@override_settings(MAX_WAITING_CALLS=1)
+class LoadSheddingTest(TransactionTestCase):
+
+    def setUp(self):
+        super(LoadSheddingTest, self).setUp()
+        clear_call_state('sduiqayduiryqwuioeryqwer76789', 'sduiqayduiryqwuioeryqwer76790')
+        self.client = APIClient()
+
+        # URL's.
+        self.response_url = '/api/call-response/'
+        self.incoming_url = '/api/incoming-call/'
+
+        self.ios_app, created = App.objects.get_or_create(platform='apns', app_id='com.voipgrid.vialer')
+        Device.objects.create(
+            token='a652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='123456789',
+            app=self.ios_app,
+        )
+
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_shed_call(self, *mocks):
+        """
+        Test that a call is refused at once when the node has no budget for
+        waiting calls left.
+        """
+        call_data = {
+            'sip_user_id': '123456789',
+            'caller_id': 'Test name',
+            'phonenumber': '0123456789',
+            'call_id': 'sduiqayduiryqwuioeryqwer76789',
+        }
+        thread = ThreadWithReturn(target=self.client.post, args=(self.incoming_url, call_data))
+        thread.start()
+
+        time.sleep(0.5)
+
+        start_time = time.time()
+        response = self.client.post(self.incoming_url, dict(call_data, call_id='sduiqayduiryqwuioeryqwer76790'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.content, b'status=NAK')
+        self.assertLess(time.time() - start_time, 1)
+
+        self.client.post(self.response_url, {
+            'unique_key': call_data['call_id'],
+            'message_start_time': time.time(),
+        })
+        self.assertEqual(thread.join().content, b'status=ACK')
+
+
+class DrainTest(TestCase):
+
+    def setUp(self):
+        super(DrainTest, self).setUp()
+        clear_call_state('sduiqayduiryqwuioeryqwer76789', 'sduiqayduiryqwuioeryqwer76790')
+        self.client = APIClient()
+        self.incoming_url = '/api/incoming-call/'
+
+    def tearDown(self):
+        drain._draining.clear()
+        super(DrainTest, self).tearDown()
+
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_draining_worker(self, mocked_apns):
+        """
+        Test that a draining worker refuses incoming calls with a 503 so they
+        can be retried on another node.
+        """
+        drain.start_draining()
+
+        response = self.client.post(self.incoming_url, {
+            'sip_user_id': '123456789',
+            'caller_id': 'Test name',
+            'phonenumber': '0123456789',
+            'call_id': 'sduiqayduiryqwuioeryqwer76789',
+        })
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.content, b'status=NAK')
+        self.assertFalse(mocked_apns.called)
+
+
+@override_settings(CALLBACK_ALLOWED_HOSTS='127.0.0.1')
+class CallbackModeTest(TransactionTestCase):
+
+    def setUp(self):
+        super(CallbackModeTest, self).setUp()
+        clear_call_state('sduiqayduiryqwuioeryqwer76789', 'sduiqayduiryqwuioeryqwer76790')
+        self.client = APIClient()
+
+        # URL's.
+        self.response_url = '/api/call-response/'
+        self.incoming_url = '/api/incoming-call/'
+
+        self.ios_app, created = App.objects.get_or_create(platform='apns', app_id='com.voipgrid.vialer')
+        Device.objects.create(
+            token='a652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='123456789',
+            app=self.ios_app,
+        )
+
+        self.server = start_callback_server()
+        self.call_data = {
+            'sip_user_id': '123456789',
+            'caller_id': 'Test name',
+            'phonenumber': '0123456789',
+            'call_id': 'sduiqayduiryqwuioeryqwer76789',
+            'callback_url': 'http://127.0.0.1:{0}/callback/'.format(self.server.server_port),
+        }
+
+    def tearDown(self):
+        stop_scheduler()
+        self.server.shutdown()
+        super(CallbackModeTest, self).tearDown()
+
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_answered_call(self, *mocks):
+        """
+        Test that the request returns at once and the answer is posted to
+        the callback url.
+        """
+        start_time = time.time()
+        response = self.client.post(self.incoming_url, self.call_data)
+        self.assertEqual(response.content, b'status=PENDING&unique_key=sduiqayduiryqwuioeryqwer76789')
+        self.assertLess(time.time() - start_time, 1)
+
+        response = self.client.post(self.response_url, {
+            'unique_key': self.call_data['call_id'],
+            'message_start_time': time.time(),
+        })
+        self.assertEqual(response.status_code, 202)
+
+        # Wait to be sure the thread that posts the callback is finished.
+        time.sleep(0.5)
+        self.assertEqual(self.server.callbacks, [{'unique_key': self.call_data['call_id'], 'status': 'ACK'}])
+
+    @override_settings(APP_PUSH_ROUNDTRIP_WAIT=3000)
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_timed_out_call(self, *mocks):
+        """
+        Test that the scheduler resends the push message and posts a NAK at
+        the deadline.
+        """
+        response = self.client.post(self.incoming_url, self.call_data)
+        self.assertEqual(response.content, b'status=PENDING&unique_key=sduiqayduiryqwuioeryqwer76789')
+
+        time.sleep(1.5)
+        self.assertEqual(cache.get('attempts'), 2)
+        self.assertEqual(self.server.callbacks, [])
+
+        time.sleep(2.0)
+        self.assertEqual(self.server.callbacks, [{'unique_key': self.call_data['call_id'], 'status': 'NAK'}])
+
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_restart_scheduler(self, *mocks):
+        """
+        Test that a stopped scheduler starts again with a call in callback
+        mode and not with other calls.
+        """
+        stop_scheduler()
+        self.assertFalse(callbacks._scheduler.is_alive() if callbacks._scheduler else False)
+
+        call_data = dict(self.call_data)
+        del call_data['callback_url']
+        thread = ThreadWithReturn(target=self.client.post, args=(self.incoming_url, call_data))
+        thread.start()
+        time.sleep(0.5)
+        self.client.post(self.response_url, {
+            'unique_key': self.call_data['call_id'],
+            'message_start_time': time.time(),
+        })
+        self.assertEqual(thread.join().content, b'status=ACK')
+        self.assertFalse(callbacks._scheduler.is_alive() if callbacks._scheduler else False)
+
+        response = self.client.post(self.incoming_url, dict(self.call_data, call_id='sduiqayduiryqwuioeryqwer76790'))
+        self.assertEqual(response.content, b'status=PENDING&unique_key=sduiqayduiryqwuioeryqwer76790')
+        self.assertTrue(callbacks._scheduler.is_alive())
+
 
 class AndroidIncomingCallTest(TransactionTestCase):
 
     def setUp(self):
         super(AndroidIncomingCallTest, self).setUp()
+        clear_call_state('sduiqayduiryqwuioeryqwer76789', 'sduiqayduiryqwuioeryqwer76790')
         self.client = APIClient()
 
         # URL's.
@@ -583,3 +1129,356 @@ class AndroidIncomingCallTest(TransactionTestCase):
 
         # Check if there is a log entry.
         self.assertGreater(log_count, 0)
+
+
+class MultipleDevicesIncomingCallTest(TransactionTestCase):
+
+    def setUp(self):
+        super(MultipleDevicesIncomingCallTest, self).setUp()
+        clear_call_state('sduiqayduiryqwuioeryqwer76789', 'sduiqayduiryqwuioeryqwer76790')
+        self.client = APIClient()
+
+        # URL's.
+        self.response_url = '/api/call-response/'
+        self.incoming_url = '/api/incoming-call/'
+
+        self.ios_app, created = App.objects.get_or_create(platform='apns', app_id='com.voipgrid.vialer')
+        self.android_app, created = App.objects.get_or_create(platform='android', app_id='com.voipgrid.vialer')
+
+        self.ios_token = 'a652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6'
+        self.android_token = 'android4bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6'
+        Device.objects.create(token=self.ios_token, sip_user_id='123456789', app=self.ios_app)
+        Device.objects.create(token=self.android_token, sip_user_id='123456789', app=self.android_app)
+
+        self.call_data = {
+            'sip_user_id': '123456789',
+            'caller_id': 'Test name',
+            'phonenumber': '0123456789',
+            'call_id': 'sduiqayduiryqwuioeryqwer76789',
+        }
+
+    @mock.patch('app.push.send_fcm_message', side_effect=mocked_send_fcm_message)
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_first_device_answers(self, mocked_apns, mocked_fcm):
+        """
+        Test that the first available device gets the call and the other
+        device is told to stop ringing.
+        """
+        thread = ThreadWithReturn(target=self.client.post, args=(self.incoming_url, self.call_data))
+        thread.start()
+
+        # Simulate some wait-time before the devices respond.
+        time.sleep(0.5)
+
+        response = self.client.post(self.response_url, {
+            'unique_key': self.call_data['call_id'],
+            'message_start_time': time.time(),
+            'token': self.android_token,
+        })
+        self.assertEqual(response.status_code, 202)
+
+        response = self.client.post(self.response_url, {
+            'unique_key': self.call_data['call_id'],
+            'message_start_time': time.time(),
+            'token': self.ios_token,
+        })
+        self.assertEqual(response.status_code, 404)
+
+        response = thread.join()
+        self.assertEqual(response.content, b'status=ACK')
+
+        # Wait to be sure the thread that sends the cancel push is finished.
+        time.sleep(0.5)
+
+        self.assertEqual(mocked_fcm.call_args[0][2], 'call')
+        self.assertEqual(mocked_apns.call_args[0][2], 'cancel')
+
+    @mock.patch('app.push.send_fcm_message', side_effect=mocked_send_fcm_message)
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_all_devices_not_available(self, *mocks):
+        """
+        Test that the call is only refused when every device is not
+        available.
+        """
+        thread = ThreadWithReturn(target=self.client.post, args=(self.incoming_url, self.call_data))
+        thread.start()
+
+        time.sleep(0.5)
+
+        app_data = {
+            'unique_key': self.call_data['call_id'],
+            'message_start_time': time.time(),
+            'available': 'False',
+            'token': self.ios_token,
+        }
+        response = self.client.post(self.response_url, app_data)
+        self.assertEqual(response.status_code, 202)
+
+        # The other device can still answer.
+        time.sleep(0.1)
+        self.assertTrue(thread.is_alive())
+
+        app_data['token'] = self.android_token
+        response = self.client.post(self.response_url, app_data)
+        self.assertEqual(response.status_code, 202)
+
+        response = thread.join()
+        self.assertEqual(response.content, b'status=NAK')
+
+    @mock.patch('app.push.send_fcm_message', side_effect=mocked_send_fcm_message)
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_device_responds_again(self, *mocks):
+        """
+        Test that the device that answered still gets a 202 when it responds
+        again, eq. to a resent push message.
+        """
+        thread = ThreadWithReturn(target=self.client.post, args=(self.incoming_url, self.call_data))
+        thread.start()
+
+        time.sleep(0.5)
+
+        app_data = {
+            'unique_key': self.call_data['call_id'],
+            'message_start_time': time.time(),
+            'token': self.android_token,
+        }
+        response = self.client.post(self.response_url, app_data)
+        self.assertEqual(response.status_code, 202)
+
+        response = self.client.post(self.response_url, app_data)
+        self.assertEqual(response.status_code, 202)
+
+        response = thread.join()
+        self.assertEqual(response.content, b'status=ACK')
+
+    @mock.patch('app.push.send_fcm_message', side_effect=mocked_send_fcm_message)
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_device_declines_again(self, *mocks):
+        """
+        Test that a device that declines twice does not refuse the call while
+        the other device may still answer.
+        """
+        thread = ThreadWithReturn(target=self.client.post, args=(self.incoming_url, self.call_data))
+        thread.start()
+
+        time.sleep(0.5)
+
+        app_data = {
+            'unique_key': self.call_data['call_id'],
+            'message_start_time': time.time(),
+            'available': 'False',
+            'token': self.ios_token,
+        }
+        self.client.post(self.response_url, app_data)
+        self.client.post(self.response_url, app_data)
+
+        time.sleep(0.1)
+        self.assertTrue(thread.is_alive())
+
+        response = self.client.post(self.response_url, {
+            'unique_key': self.call_data['call_id'],
+            'message_start_time': time.time(),
+            'token': self.android_token,
+        })
+        self.assertEqual(response.status_code, 202)
+
+        response = thread.join()
+        self.assertEqual(response.content, b'status=ACK')
+
+
+class IncomingGroupCallTest(TransactionTestCase):
+
+    def setUp(self):
+        super(IncomingGroupCallTest, self).setUp()
+        clear_call_state(
+            'sduiqayduiryqwuioeryqwer76789',
+            'sduiqayduiryqwuioeryqwer76789_123456789',
+            'sduiqayduiryqwuioeryqwer76789_234567890',
+            'sduiqayduiryqwuioeryqwer76789_345678901',
+        )
+        self.client = APIClient()
+
+        # URL's.
+        self.response_url = '/api/call-response/'
+        self.group_url = '/api/incoming-group-call/'
+
+        self.ios_app, created = App.objects.get_or_create(platform='apns', app_id='com.voipgrid.vialer')
+
+        Device.objects.create(
+            token='a652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='123456789',
+            app=self.ios_app,
+        )
+        Device.objects.create(
+            token='b652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='234567890',
+            app=self.ios_app,
+        )
+
+        self.call_data = {
+            'sip_user_ids': '123456789,234567890,345678901',
+            'caller_id': 'Test name',
+            'phonenumber': '0123456789',
+            'call_id': 'sduiqayduiryqwuioeryqwer76789',
+        }
+
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_first_account_answers(self, *mocks):
+        """
+        Test that the group call stops at the first account that answers and
+        the other account can not answer anymore.
+        """
+        thread = ThreadWithReturn(target=self.client.post, args=(self.group_url, self.call_data))
+        thread.start()
+
+        time.sleep(0.5)
+
+        response = self.client.post(self.response_url, {
+            'unique_key': '{0}_234567890'.format(self.call_data['call_id']),
+            'message_start_time': time.time(),
+        })
+        self.assertEqual(response.status_code, 202)
+
+        response = thread.join()
+        self.assertEqual(response.content, b'status=ACK&accounts=234567890')
+
+        response = self.client.post(self.response_url, {
+            'unique_key': '{0}_123456789'.format(self.call_data['call_id']),
+            'message_start_time': time.time(),
+        })
+        self.assertEqual(response.status_code, 404)
+
+    @mock.patch('app.push.send_apns_message', side_effect=mocked_send_apns_message)
+    def test_all_accounts(self, *mocks):
+        """
+        Test that the group call waits for every account in the all mode.
+        """
+        self.call_data['mode'] = 'all'
+        thread = ThreadWithReturn(target=self.client.post, args=(self.group_url, self.call_data))
+        thread.start()
+
+        time.sleep(0.5)
+
+        for sip_user_id, available in (('123456789', 'True'), ('234567890', 'False')):
+            response = self.client.post(self.response_url, {
+                'unique_key': '{0}_{1}'.format(self.call_data['call_id'], sip_user_id),
+                'message_start_time': time.time(),
+                'available': available,
+            })
+            self.assertEqual(response.status_code, 202)
+
+        response = thread.join()
+        self.assertEqual(response.content, b'status=ACK&accounts=123456789')
+
+
+class InflightCallsViewTest(TestCase):
+
+    def setUp(self):
+        super(InflightCallsViewTest, self).setUp()
+        self.client = APIClient()
+        self.inflight_url = '/api/inflight-calls/'
+
+    @mock.patch('api.views.get_inflight_summary', return_value={'total': 0})
+    def test_staff_only(self, *mocks):
+        """
+        Test that only staff users can see the calls per node.
+        """
+        response = self.client.get(self.inflight_url)
+        self.assertIn(response.status_code, (401, 403))
+
+        User.objects.create_user('user', 'user@example.com', 'password')
+        self.client.login(username='user', password='password')
+        response = self.client.get(self.inflight_url)
+        self.assertEqual(response.status_code, 403)
+
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        response = self.client.get(self.inflight_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'total': 0})
+
+
+@override_settings(HEALTH_CACHE_TIMEOUT=0)
+class HealthViewTest(TestCase):
+
+    def setUp(self):
+        super(HealthViewTest, self).setUp()
+        self.client = APIClient()
+        self.health_url = '/api/health/'
+
+    @mock.patch('app.cache.RedisClusterCache.ping', return_value={'127.0.0.1:7000': True})
+    def test_healthy(self, *mocks):
+        """
+        Test the health check when all dependencies are up.
+        """
+        response = self.client.get(self.health_url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['healthy'])
+        self.assertTrue(response.data['checks']['database']['ok'])
+        self.assertEqual(response.data['checks']['redis']['detail'], '1 nodes')
+
+    @mock.patch('app.cache.RedisClusterCache.ping', return_value={'127.0.0.1:7000': True})
+    def test_missing_push_credentials(self, *mocks):
+        """
+        Test that only staff users get the apps with missing push credentials.
+        """
+        App.objects.create(platform='android', app_id='com.voipgrid.vialer', push_key='')
+
+        response = self.client.get(self.health_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['checks']['push_credentials']['detail'], 'Missing push credentials for 1 apps')
+        self.assertNotIn('com.voipgrid.vialer', json.dumps(response.data))
+        self.assertNotIn('missing_push_credentials', response.data)
+
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        response = self.client.get(self.health_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['missing_push_credentials']), 1)
+        self.assertIn('com.voipgrid.vialer', response.data['missing_push_credentials'][0])
+
+    @mock.patch('app.cache.RedisClusterCache.ping', side_effect=ConnectionError('Connection refused'))
+    def test_redis_down(self, *mocks):
+        """
+        Test the health check when a redis node is down.
+        """
+        response = self.client.get(self.health_url)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.data['healthy'])
+
+    @mock.patch('app.cache.RedisClusterCache.ping', return_value={'127.0.0.1:7000': True})
+    @mock.patch('app.warmup.start_scheduler')
+    @mock.patch('app.warmup._build_membership_filter')
+    @mock.patch('app.warmup._connect_database')
+    @mock.patch('app.warmup.prepare_worker')
+    def test_warming_up(self, *mocks):
+        """
+        Test that the health check fails while the worker warms up in the
+        background.
+        """
+        loading = threading.Event()
+        loaded = threading.Event()
+
+        def load_apps():
+            loading.set()
+            loaded.wait(5)
+
+        with mock.patch('app.warmup._load_apps', side_effect=load_apps):
+            thread = start_warm_up()
+            loading.wait(5)
+
+            response = self.client.get(self.health_url)
+            self.assertEqual(response.status_code, 503)
+            self.assertFalse(response.data['checks']['warm_up']['ok'])
+            self.assertEqual(response.data['checks']['warm_up']['detail'], 'Worker is warming up')
+
+            loaded.set()
+            thread.join(5)
+
+        response = self.client.get(self.health_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['checks']['warm_up']['ok'])
+        self.assertTrue(response.data['checks']['warm_up']['detail'].startswith('Warmed up in'))
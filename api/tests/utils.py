@@ -1,18 +1,35 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from threading import Thread
+from urllib.parse import parse_qs
 
 from django.core.cache import cache
 
+from app.cache import RedisClusterCache
+from app.calls import get_call_cache_key
+
 
 def mocked_send_apns_message(device, app, message_type, data=None):
     cache.set('attempts', data.get('attempt', 1), 300)
     print('WORKED APNS')
     print(data.get('attempt', 1))
+    return True
 
 
 def mocked_send_fcm_message(device, app, message_type, data=None):
     cache.set('attempts', data.get('attempt', 1), 300)
     print('WORKED FCM')
     print(data.get('attempt', 1))
+    return True
+
+
+def clear_call_state(*unique_keys):
+    """
+    Delete the call state earlier tests left behind, a call with the same
+    call_id would be handled as a duplicate request of that call.
+    """
+    redis_cache = RedisClusterCache()
+    for unique_key in unique_keys:
+        redis_cache.delete(get_call_cache_key(unique_key))
 
 
 class ThreadWithReturn(Thread):
@@ -29,3 +46,32 @@ class ThreadWithReturn(Thread):
         super(ThreadWithReturn, self).join(*args, **kwargs)
 
         return self._return
+
+
+class CallbackRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler for a stub PBX that stores the posted callbacks.
+    """
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        data = parse_qs(self.rfile.read(length).decode('utf-8'))
+        self.server.callbacks.append({key: values[0] for key, values in data.items()})
+
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_callback_server():
+    """
+    Start a stub PBX on a free local port.
+
+    Returns:
+        HTTPServer: The server, posted callbacks are in its callbacks list.
+    """
+    server = HTTPServer(('127.0.0.1', 0), CallbackRequestHandler)
+    server.callbacks = []
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
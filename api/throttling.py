@@ -0,0 +1,119 @@
+import logging
+import time
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from app.cache import RedisClusterCache
+
+logger = logging.getLogger('django')
+
+# Token bucket in a redis hash, refilled by the time passed since the last
+# request. Returns if the request is allowed and the msec until a token is
+# available.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'time')
+local tokens = tonumber(bucket[1]) or capacity
+local last = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - last, 0) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens), 'time', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, math.ceil(math.max(1 - tokens, 0) / rate * 1000)}
+"""
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle with a token bucket per client in redis. The rate is taken from
+    DEFAULT_THROTTLE_RATES by scope, eq. '20/min' allows bursts of 20
+    requests and refills 20 tokens per minute. Requests are allowed when
+    redis is not available.
+    """
+    scope = None
+
+    def __init__(self):
+        self.wait_time = None
+
+    def get_cache_key(self, request, view):
+        """
+        Function to get the client the request is counted for.
+
+        Returns:
+            string: The client or None to not throttle the request.
+        """
+        raise NotImplementedError('get_cache_key() must be overridden')
+
+    def get_rate(self):
+        """
+        Returns:
+            tuple: The capacity and the tokens per second or None when the
+                scope has no rate.
+        """
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if not rate:
+            return None
+
+        num, period = rate.split('/')
+        return int(num), int(num) / DURATIONS[period[0]]
+
+    def allow_request(self, request, view):
+        rate = self.get_rate()
+        if rate is None:
+            return True
+
+        ident = self.get_cache_key(request, view)
+        if ident is None:
+            return True
+
+        capacity, refill_rate = rate
+        key = 'throttle_{0}_{1}'.format(self.scope, ident)
+        try:
+            allowed, wait_ms = RedisClusterCache().run_script(
+                TOKEN_BUCKET_SCRIPT, [key], [capacity, refill_rate, time.time()])
+        except Exception:
+            logger.exception('Failed to check the {0} throttle'.format(self.scope))
+            return True
+
+        if allowed:
+            return True
+
+        logger.warning('Throttled {0} {1}'.format(self.scope, ident))
+        self.wait_time = wait_ms / 1000
+        return False
+
+    def wait(self):
+        return self.wait_time
+
+
+class IPThrottle(TokenBucketThrottle):
+    """
+    Throttle per client ip. X-Forwarded-For is only trusted for the amount of
+    proxies in NUM_PROXIES.
+    """
+    scope = 'ip'
+
+    def get_cache_key(self, request, view):
+        return self.get_ident(request)
+
+
+class SipUserIdThrottle(TokenBucketThrottle):
+    """
+    Throttle per sip account, for requests with a sip_user_id.
+    """
+    scope = 'sip_user_id'
+
+    def get_cache_key(self, request, view):
+        sip_user_id = request.data.get('sip_user_id')
+        if not sip_user_id:
+            return None
+        return str(sip_user_id)[:32]
@@ -1,11 +1,16 @@
 from django.conf.urls import url
 from rest_framework import routers
-from api.views import CallResponseView, DeviceView, IncomingCallView
+from api.views import (CallCancelView, CallResponseView, DeviceView, HealthView, IncomingCallView,
+                       IncomingGroupCallView, InflightCallsView)
 
 router = routers.DefaultRouter()
 
 urlpatterns = [
     url(r'^incoming-call/', IncomingCallView.as_view()),
+    url(r'^incoming-group-call/', IncomingGroupCallView.as_view()),
     url(r'^call-response/', CallResponseView.as_view()),
+    url(r'^call-cancel/', CallCancelView.as_view()),
     url(r'^(?P<platform>(apns|gcm|android))-device/', DeviceView.as_view()),
+    url(r'^health/', HealthView.as_view()),
+    url(r'^inflight-calls/', InflightCallsView.as_view()),
 ]
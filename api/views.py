@@ -1,27 +1,47 @@
+from collections import OrderedDict
 import datetime
 import json
 import logging
-import random
 import time
 
 from django.conf import settings
+from django.core.signing import BadSignature
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import never_cache
 from rest_framework import views
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
 from rest_framework.exceptions import ParseError
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.status import (HTTP_200_OK, HTTP_201_CREATED,
-                                   HTTP_202_ACCEPTED, HTTP_404_NOT_FOUND)
+                                   HTTP_202_ACCEPTED, HTTP_404_NOT_FOUND,
+                                   HTTP_503_SERVICE_UNAVAILABLE)
 
+from app.admission import admit_call, release_call
 from app.cache import RedisClusterCache
+from app.callbacks import send_callback, start_scheduler
+from app.calllog import log_call
+from app.calls import (cancel_call, get_call_cache_key, get_response_timing, get_unique_key, GroupCall,
+                       IncomingCall, OUTCOME_ACK, OUTCOME_NAK)
+from app.devicemodel import record_call
+from app.drain import is_draining
+from app.health import get_health, get_missing_push_credentials
+from app.membership import add_device, might_have_devices
 from app.models import App, Device
-from app.tasks import log_to_db, task_incoming_call_notify, task_notify_old_token
+from app.registry import get_inflight_summary
+from app.signing import unsign_unique_key
+from app.tasks import log_to_db, task_notify_old_token
+from app.timing import PhaseTimer
 
 from .authentication import VoipgridAuthentication
 from .renderers import PlainTextRenderer
-from .serializers import (CallResponseSerializer, IncomingCallSerializer,
+from .serializers import (CallCancelSerializer, CallResponseSerializer, IncomingCallSerializer,
+                          IncomingGroupCallSerializer,
                           DeviceSerializer, DeleteDeviceSerializer)
+from .throttling import IPThrottle, SipUserIdThrottle
 
 logger = logging.getLogger('django')
 
@@ -32,6 +52,38 @@ class VialerAPIView(views.APIView):
     the api views we provide.
     """
     serializer_class = None
+    # Name used to log and aggregate the phase timings, None disables timing.
+    timing_name = None
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+        Override to time the phases of the request and emit them once the
+        response is ready.
+        """
+        self.timer = PhaseTimer(self.timing_name)
+
+        response = super(VialerAPIView, self).dispatch(request, *args, **kwargs)
+
+        self.timer.emit(response.status_code)
+        return response
+
+    def initial(self, request, *args, **kwargs):
+        """
+        Override to check the throttles before authentication, which calls
+        the VoIPGRID api for every request.
+        """
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+
+        neg = self.perform_content_negotiation(request)
+        request.accepted_renderer, request.accepted_media_type = neg
+
+        version, scheme = self.determine_version(request, *args, **kwargs)
+        request.version, request.versioning_scheme = version, scheme
+
+        with self.timer.phase('throttle'):
+            self.check_throttles(request)
+        self.perform_authentication(request)
+        self.check_permissions(request)
 
     def _serialize_data(self, data, serializer_class=None):
         """
@@ -61,7 +113,10 @@ class VialerAPIView(views.APIView):
             self.serializer_class = serializer_class
 
         serializer = self.serializer_class(data=data)
-        if not serializer.is_valid(raise_exception=False):
+        with self.timer.phase('serialize'):
+            valid = serializer.is_valid(raise_exception=False)
+
+        if not valid:
             # Log errors.
             logger.info('BAD REQUEST! Serialization failed with following errors:\n\n{0}\n\nData:\n\n{1}'.format(
                 serializer.errors,
@@ -92,6 +147,7 @@ class IncomingCallView(VialerAPIView):
     """
     serializer_class = IncomingCallSerializer
     renderer_classes = (PlainTextRenderer, )
+    timing_name = 'incoming-call'
 
     def post(self, request):
         """
@@ -102,23 +158,27 @@ class IncomingCallView(VialerAPIView):
 
         Returns:
             string: With status=ACK or status=NAK based on succes or failure.
+                A draining worker responds with status=NAK and status code
+                503 so the call can be retried on another node. With a
+                callback_url the response is status=PENDING&unique_key=<key>
+                at once and the outcome is posted to the callback_url.
 
         Raises:
             Http404: When an app_id is provided that does not exist.
         """
+        if is_draining():
+            self.timer.outcome = 'draining'
+            return Response('status=NAK', status=HTTP_503_SERVICE_UNAVAILABLE)
+
         serialized_data = self._serialize_request(request)
 
         sip_user_id = serialized_data['sip_user_id']
         caller_id = serialized_data['caller_id']
         phonenumber = serialized_data['phonenumber']
-        call_id = serialized_data['call_id']
+        callback_url = serialized_data['callback_url']
+        unique_key = get_unique_key(serialized_data['call_id'])
 
-        if not call_id:
-            # Generate unique_key for reference on incoming call answer.
-            unique_key = random.getrandbits(128)
-            unique_key = '%032x' % unique_key
-        else:
-            unique_key = call_id
+        self.timer.key = unique_key
 
         logger.info('{0} | Incoming call for SIP:{1} FROM:\'{2}/{3}\' (POST:{4})'.format(
             unique_key,
@@ -128,97 +188,227 @@ class IncomingCallView(VialerAPIView):
             json.dumps(request.POST, ensure_ascii=False))
         )
         try:
-            # Check if there is a registered device for given sip_user_id.
-            device = get_object_or_404(Device, sip_user_id=sip_user_id)
+            # Check if there are registered devices for given sip_user_id.
+            with self.timer.phase('device_lookup'):
+                devices = []
+                # Skip the query for accounts that never registered a device.
+                if might_have_devices(sip_user_id):
+                    devices = list(
+                        Device.objects.select_related('app').filter(sip_user_id=sip_user_id).order_by('-last_seen')
+                    )
+            if not devices:
+                raise Http404
         except Http404:
+            self.timer.outcome = 'no-device'
             logger.warning('{0} | Failed to find a device for SIP_user_ID : {1} sending NAK'.format(
                 unique_key,
                 sip_user_id)
             )
+            log_call(unique_key, self.timer.outcome)
         except Exception:
             logger.exception('{0} | EXCEPTION WHILE FINDING DEVICE FOR SIP_USER_ID : {1}'.format(
                 unique_key,
                 sip_user_id)
             )
+            self.timer.outcome = 'error'
+            log_call(unique_key, self.timer.outcome)
         else:
+            if callback_url:
+                # No request waits for the call, the scheduler threads
+                # resend the push messages and post the outcome.
+                start_scheduler()
+                call = IncomingCall(
+                    unique_key,
+                    sip_user_id,
+                    phonenumber,
+                    caller_id,
+                    devices,
+                    timer=self.timer,
+                    callback_url=callback_url,
+                )
+                call.start()
+                self.timer.outcome = 'pending'
+                return Response('status=PENDING&unique_key={0}'.format(unique_key))
+
+            with self.timer.phase('redis'):
+                admitted = admit_call(unique_key)
+            if not admitted:
+                self.timer.outcome = 'shed'
+                log_call(unique_key, self.timer.outcome, devices=devices)
+                return Response(settings.LOAD_SHED_RESPONSE, status=HTTP_503_SERVICE_UNAVAILABLE)
+
+            call = IncomingCall(unique_key, sip_user_id, phonenumber, caller_id, devices, timer=self.timer)
+            try:
+                call.start()
+
+                outcome = None
+                try:
+                    # We have to wait till one of the apps responds and sets
+                    # the available flag.
+                    outcome = call.check()
+                    while outcome is None:
+                        with self.timer.phase('wait'):
+                            time.sleep(.01)  # wait 10 ms
+                        outcome = call.check()
+                finally:
+                    call.finish(outcome)
+            finally:
+                with self.timer.phase('redis'):
+                    release_call(unique_key)
+
+            self.timer.outcome = outcome
+            if outcome == OUTCOME_ACK:
+                # Succes status for asterisk.
+                return Response('status=ACK')
 
-            attempt = 1
-            # Send push message to wake up app.
-            task_incoming_call_notify(
-                device,
-                unique_key,
+        # Failed status for asterisk.
+        return Response('status=NAK')
+
+
+class IncomingGroupCallView(VialerAPIView):
+    """
+    View for asterisk to ring multiple sip accounts (eq. a hunt group) with a
+    single request.
+    """
+    serializer_class = IncomingGroupCallSerializer
+    renderer_classes = (PlainTextRenderer, )
+    timing_name = 'incoming-group-call'
+
+    def post(self, request):
+        """
+        Handle post requests on this view.
+
+        Args:
+            request (Request): Containing the post data.
+
+        Returns:
+            string: With status=ACK&accounts=<sip_user_ids> listing the
+                accounts that answered or status=NAK when no account answered.
+                In the first mode the loop stops at the first account that
+                answered and the other accounts are cancelled.
+        """
+        if is_draining():
+            self.timer.outcome = 'draining'
+            return Response('status=NAK', status=HTTP_503_SERVICE_UNAVAILABLE)
+
+        serialized_data = self._serialize_request(request)
+
+        sip_user_ids = serialized_data['sip_user_ids']
+        caller_id = serialized_data['caller_id']
+        phonenumber = serialized_data['phonenumber']
+        mode = serialized_data['mode']
+        unique_key = get_unique_key(serialized_data['call_id'])
+
+        self.timer.key = unique_key
+
+        logger.info('{0} | Incoming group call for SIP:{1} FROM:\'{2}/{3}\' (POST:{4})'.format(
+            unique_key,
+            ','.join(str(sip_user_id) for sip_user_id in sip_user_ids),
+            phonenumber,
+            caller_id,
+            json.dumps(request.POST, ensure_ascii=False))
+        )
+
+        # Find the devices of all accounts with a single query.
+        devices_by_account = {}
+        with self.timer.phase('device_lookup'):
+            devices = Device.objects.select_related('app').filter(
+                sip_user_id__in=[sip_user_id for sip_user_id in sip_user_ids if might_have_devices(sip_user_id)],
+            ).order_by('-last_seen')
+            for device in devices:
+                devices_by_account.setdefault(device.sip_user_id, []).append(device)
+
+        # Every account gets its own unique_key to respond to.
+        calls = []
+        for sip_user_id in sip_user_ids:
+            account_devices = devices_by_account.get(str(sip_user_id))
+            if not account_devices:
+                logger.warning('{0} | Failed to find a device for SIP_user_ID : {1}'.format(unique_key, sip_user_id))
+                log_call('{0}_{1}'.format(unique_key, sip_user_id), 'no-device')
+                continue
+            calls.append(IncomingCall(
+                '{0}_{1}'.format(unique_key, sip_user_id),
+                sip_user_id,
                 phonenumber,
                 caller_id,
-                attempt,
-            )
+                account_devices,
+                timer=self.timer,
+            ))
 
-            # Time related settings.
-            wait_interval = settings.APP_PUSH_ROUNDTRIP_WAIT / 1000
-            wait_until = time.time() + wait_interval
-            resend_interval = settings.APP_PUSH_RESEND_INTERVAL / 1000
-            next_resend_time = time.time() + resend_interval
+        if not calls:
+            self.timer.outcome = 'no-device'
+            return Response('status=NAK')
 
-            # Determine max possible attempts. Avoid sending a push
-            # close to the end of the loop.
-            max_attemps = int(wait_interval / resend_interval) - 1
+        # A group call holds a single worker.
+        with self.timer.phase('redis'):
+            admitted = admit_call(unique_key)
+        if not admitted:
+            self.timer.outcome = 'shed'
+            for call in calls:
+                log_call(call.unique_key, self.timer.outcome, devices=call.devices)
+            return Response(settings.LOAD_SHED_RESPONSE, status=HTTP_503_SERVICE_UNAVAILABLE)
 
-            cache_key = 'call_{0}'.format(unique_key)
-            redis_cache = RedisClusterCache()
-            # Create cache entry with device platform as placeholder for the
-            # available flag. Done for logging purposes.
-            redis_cache.set(cache_key, device.app.platform)
+        group = GroupCall(unique_key, calls, mode=mode, timer=self.timer)
+        try:
+            group.start()
+            try:
+                # We have to wait till the apps respond and set the available
+                # flags.
+                while not group.check():
+                    with self.timer.phase('wait'):
+                        time.sleep(.01)  # wait 10 ms
+            finally:
+                group.finish()
+        finally:
+            with self.timer.phase('redis'):
+                release_call(unique_key)
+
+        accounts = group.get_available()
+        if accounts:
+            self.timer.outcome = OUTCOME_ACK
+            return Response('status=ACK&accounts={0}'.format(','.join(str(account) for account in accounts)))
+
+        self.timer.outcome = 'NAK'
+        return Response('status=NAK')
 
-            logger.info('{0} | {1} Starting \'wait for it\' loop until {2} ({3}msec)'.format(
-                unique_key,
-                device.app.platform.upper(),
-                datetime.datetime.fromtimestamp(wait_until).strftime('%H:%M:%S.%f'),
-                settings.APP_PUSH_ROUNDTRIP_WAIT)
-            )
-            # We have to wait till the app responds and sets the cache value.
-            while time.time() < wait_until:
-                available = redis_cache.get(cache_key)
-                # Get on an empty key returns None so we need to check for
-                # True and False.
-                if available == 'True':
-                    logger.info('{0} | {1} Device checked in on time, sending ACK on {2}'.format(
-                        unique_key,
-                        device.app.platform.upper(),
-                        datetime.datetime.fromtimestamp(time.time()).strftime('%H:%M:%S.%f'))
-                    )
-                    # Succes status for asterisk.
-                    return Response('status=ACK')
-                elif available == 'False':
-                    logger.info('{0} | {1} Device not available, sending NAK on {2}'.format(
-                        unique_key,
-                        device.app.platform.upper(),
-                        datetime.datetime.fromtimestamp(time.time()).strftime('%H:%M:%S.%f'))
-                    )
-                    # App is not available.
-                    return Response('status=NAK')
-                else:
-                    # Try to resend the push message every X seconds or
-                    # after exceeding the max_attempts.
-                    if time.time() > next_resend_time and attempt < max_attemps:
-                        attempt += 1
-                        next_resend_time = time.time() + resend_interval
-                        task_incoming_call_notify(
-                            device,
-                            unique_key,
-                            phonenumber,
-                            caller_id,
-                            attempt,
-                        )
-
-                    time.sleep(.01)  # wait 10 ms
-
-            logger.info('{0} | {1} Device did NOT check in on time, sending NAK on {2}'.format(
-                unique_key,
-                device.app.platform.upper(),
-                datetime.datetime.fromtimestamp(time.time()).strftime('%H:%M:%S.%f'))
-            )
 
-        # Failed status for asterisk.
-        return Response('status=NAK')
+class CallCancelView(VialerAPIView):
+    """
+    View for asterisk to cancel a call that is still waiting for a device,
+    eq. when the caller hung up.
+    """
+    serializer_class = CallCancelSerializer
+    renderer_classes = (PlainTextRenderer, )
+    timing_name = 'call-cancel'
+
+    def post(self, request):
+        """
+        Handle post requests on this view.
+
+        Args:
+            request (Request): Containing the post data.
+
+        Returns:
+            string: With status=ACK when the call is cancelled or status=NAK
+                with status code 404 when there is no waiting call.
+        """
+        serialized_data = self._serialize_request(request)
+        unique_key = serialized_data['call_id']
+        notify = serialized_data['notify']
+
+        self.timer.key = unique_key
+
+        with self.timer.phase('redis'):
+            cancelled = cancel_call(unique_key, notify=notify)
+
+        if not cancelled:
+            logger.info('{0} | No waiting call to cancel'.format(unique_key))
+            self.timer.outcome = 'NAK'
+            return Response('status=NAK', status=HTTP_404_NOT_FOUND)
+
+        logger.info('{0} | Call cancelled (notify devices: {1})'.format(unique_key, notify))
+        self.timer.outcome = 'ACK'
+        return Response('status=ACK')
 
 
 class CallResponseView(VialerAPIView):
@@ -226,6 +416,8 @@ class CallResponseView(VialerAPIView):
     View called by the app when it wake's up and responds to a incoming call.
     """
     serializer_class = CallResponseSerializer
+    throttle_classes = (IPThrottle, )
+    timing_name = 'call-response'
 
     def post(self, request):
         """
@@ -238,36 +430,93 @@ class CallResponseView(VialerAPIView):
             json: Status key with OK value.
         """
         serialized_data = self._serialize_request(request)
-        unique_key = serialized_data['unique_key']
         message_start_time = serialized_data['message_start_time']
         available = serialized_data['available']
+        token = serialized_data['token']
+        response_time = time.time()
 
-        cache_key = 'call_{0}'.format(unique_key)
-
-        redis_cache = RedisClusterCache()
-
-        # Check if key exists to avoid endpoint probing spam.
-        if not redis_cache.exists(cache_key):
+        # Refuse keys we did not sign before any redis access, so endpoint
+        # probing spam only costs cpu.
+        try:
+            unique_key = unsign_unique_key(serialized_data['unique_key'])
+        except BadSignature:
+            self.timer.outcome = 'bad-signature'
             return Response('', status=HTTP_404_NOT_FOUND)
 
-        # Wait loop for asterisk sets the device platform as placeholder
-        # for the available flag.
-        platform = redis_cache.get(cache_key)
+        cache_key = get_call_cache_key(unique_key)
+        self.timer.key = unique_key
 
-        redis_cache.set(cache_key, available)
+        with self.timer.phase('redis'):
+            redis_cache = RedisClusterCache()
 
-        roundtrip = time.time() - float(message_start_time)
+            # Wait loop for asterisk sets the device platforms in the call
+            # state, a missing platform means the call does not exist. Check
+            # this for unsigned keys and calls that already ended.
+            state = redis_cache.hgetall(cache_key)
+            platform = state.get('platform')
+            device_platform = state.get('platform:{0}'.format(token))
+            devices = state.get('devices')
+            device = state.get('device')
+            callback_url = state.get('callback_url')
+            if platform is None:
+                return Response('', status=HTTP_404_NOT_FOUND)
+            platform = device_platform or platform
+            if device_platform:
+                device = token
+
+            answered = True
+            outcome = None
+            if available:
+                # The first available device gets the call.
+                if redis_cache.hsetnx(cache_key, 'answered_by', token):
+                    # A cancelled call can not be answered.
+                    answered = redis_cache.hsetnx(cache_key, 'available', True)
+                    outcome = OUTCOME_ACK if answered else None
+                else:
+                    # The device that answered may respond again, eq. to a
+                    # resent push message.
+                    answered_by, flag = redis_cache.hmget(cache_key, 'answered_by', 'available')
+                    answered = answered_by == token and flag == 'True'
+            elif not token or redis_cache.hsetnx(cache_key, 'declined:{0}'.format(token), True):
+                # Not available when all devices are not available. A device
+                # that declines the first and a resent push message counts
+                # once, apps without token can not be told apart.
+                declined = redis_cache.hincrby(cache_key, 'declined')
+                if declined >= int(devices or 1) and redis_cache.hsetnx(cache_key, 'available', False):
+                    outcome = OUTCOME_NAK
+
+            if callback_url and outcome:
+                # No request waits for a call in callback mode, tell asterisk
+                # at once.
+                send_callback(unique_key, callback_url, outcome)
+
+        # Time the response with the send times of the push messages, the
+        # message_start_time echoed by the device is only logged.
+        client_roundtrip = response_time - float(message_start_time)
+        timing = get_response_timing(state, response_time, serialized_data['attempt'])
+        if timing:
+            roundtrip, attempt, attempt_latency = timing
+        else:
+            roundtrip, attempt, attempt_latency = client_roundtrip, None, None
 
-        logger.info('{0} | Device responded. Message round trip-time: {1} sec'.format(
+        logger.info('{0} | Device responded to attempt {1}. Message round trip-time: {2} sec'.format(
             unique_key,
+            attempt,
             roundtrip)
         )
 
         # Threaded task to log information to the database.
-        log_to_db(platform, roundtrip, available)
-
-        # If device responded too late return 404 request (call) not found.
-        if (roundtrip > (settings.APP_PUSH_ROUNDTRIP_WAIT / 1000)):
+        with self.timer.phase('log'):
+            log_to_db(platform, roundtrip, available, attempt, attempt_latency, client_roundtrip)
+            if device and roundtrip <= settings.APP_PUSH_ROUNDTRIP_WAIT / 1000:
+                # Also when the call already ended, a device that responded
+                # in time counts as answered for its response time model.
+                # Devices that did not are counted by the wait loop.
+                record_call(device, True, roundtrip)
+
+        # If device responded too late or another device answered the call
+        # return 404 request (call) not found.
+        if (roundtrip > (settings.APP_PUSH_ROUNDTRIP_WAIT / 1000)) or not answered:
             return Response('', status=HTTP_404_NOT_FOUND)
 
         return Response('', status=HTTP_202_ACCEPTED)
@@ -279,6 +528,7 @@ class DeviceView(VialerAPIView):
     """
     serializer_class = DeviceSerializer
     authentication_classes = (VoipgridAuthentication, )
+    throttle_classes = (IPThrottle, SipUserIdThrottle)
 
     def post(self, request, platform):
         """
@@ -292,40 +542,48 @@ class DeviceView(VialerAPIView):
 
         app = get_object_or_404(App, app_id=app_id, platform=platform)
 
-        created = False
+        fields = {
+            'name': serialized_data.get('name', None),
+            'os_version': serialized_data.get('os_version', None),
+            'client_version': serialized_data.get('client_version', None),
+            'sandbox': serialized_data['sandbox'],
+            'app_id': app.id,
+        }
 
-        try:
-            device = Device.objects.get(sip_user_id=sip_user_id)
-        except Device.DoesNotExist:
-            device = Device.objects.create(
-                sip_user_id=sip_user_id,
-                app_id=app.id,
-                token=token,
-            )
-            created = True
+        devices = list(Device.objects.select_related('app').filter(sip_user_id=sip_user_id))
+        device = next((device for device in devices if device.token == token), None)
 
         # Track status.
         status = 'OK'
-
-        # Update token.
-        if device.token != token:
-            if not created:
-                task_notify_old_token(device, device.app)
-                status += ' updated and send notify to old token'
+        created = False
+        now = timezone.now()
+
+        if device is not None and all(getattr(device, name) == value for name, value in fields.items()):
+            # Apps register on every launch, only write last_seen when it
+            # is older than DEVICE_LAST_SEEN_INTERVAL.
+            last_seen_interval = datetime.timedelta(seconds=settings.DEVICE_LAST_SEEN_INTERVAL)
+            if device.last_seen is None or now - device.last_seen > last_seen_interval:
+                Device.objects.filter(pk=device.pk).update(last_seen=now)
             else:
-                status += ' and updated token'
-            device.token = token
-
-        # Update fields.
-        device.name = serialized_data.get('name', None)
-        device.os_version = serialized_data.get('os_version', None)
-        device.client_version = serialized_data.get('client_version', None)
-        device.last_seen = timezone.now()
-        device.sandbox = serialized_data['sandbox']
-
-        device.app = app
-
-        device.save()
+                status += ' unchanged'
+        else:
+            affected_rows = Device.objects.upsert(sip_user_id, token, last_seen=now, **fields)
+            # A concurrent registration may have created the device after
+            # the lookup, then the upsert updated it.
+            created = not devices and affected_rows == 1
+
+            if device is None:
+                add_device(sip_user_id)
+
+                # Replace the least recently seen devices when the account
+                # has too many devices.
+                devices.sort(key=lambda other: (other.last_seen is not None, other.last_seen or now))
+                replaced = devices[:max(len(devices) + 1 - settings.MAX_DEVICES_PER_ACCOUNT, 0)]
+                if replaced:
+                    Device.objects.filter(pk__in=[other.pk for other in replaced]).delete()
+                    for other in replaced:
+                        task_notify_old_token(other, other.app)
+                    status += ' updated and send notify to old token'
 
         status_code = HTTP_200_OK
         if created:
@@ -333,8 +591,8 @@ class DeviceView(VialerAPIView):
 
         logger.info('{0} {1} device:{2} registered for SIP_USER_ID: {3}. Status: {4}.'.format(
             app.app_id,
-            device.app.platform.upper(),
-            device.token,
+            app.platform.upper(),
+            token,
             sip_user_id,
             status)
         )
@@ -370,3 +628,53 @@ class DeviceView(VialerAPIView):
             raise
         logger.info('Unregistered device {0} for SIP_USER_ID {1}'.format(token, sip_user_id))
         return Response('', status=HTTP_200_OK)
+
+
+@method_decorator(never_cache, name='dispatch')
+class HealthView(views.APIView):
+    """
+    View for load balancers to check the health of this node. Staff users
+    also get the apps with missing push credentials.
+    """
+    authentication_classes = (SessionAuthentication, BasicAuthentication)
+
+    def get(self, request):
+        """
+        Handle get requests on this view.
+
+        Returns:
+            json: The latency and result per dependency. The status code is
+                503 when a dependency needed for calls is down.
+        """
+        health = get_health()
+
+        status_code = HTTP_200_OK
+        if not health['healthy']:
+            status_code = HTTP_503_SERVICE_UNAVAILABLE
+
+        if request.user.is_staff:
+            # Copy, the health result is cached for every request.
+            health = OrderedDict(health)
+            health['missing_push_credentials'] = get_missing_push_credentials()
+
+        return Response(health, status=status_code)
+
+
+@method_decorator(never_cache, name='dispatch')
+class InflightCallsView(views.APIView):
+    """
+    View with a summary of the calls that are waiting for a device, for staff
+    users only because it shows the nodes.
+    """
+    authentication_classes = (SessionAuthentication, BasicAuthentication)
+    permission_classes = (IsAdminUser, )
+
+    def get(self, request):
+        """
+        Handle get requests on this view.
+
+        Returns:
+            json: The amount of waiting calls in total, per platform and the
+                worker usage per node.
+        """
+        return Response(get_inflight_summary())
@@ -1,10 +1,16 @@
 import datetime
+import os
 
+from django.conf import settings
 from django.conf.urls import url
 from django.contrib import admin
+from django.http import HttpResponse, HttpResponseBadRequest
 from django.shortcuts import render
 
-from .models import App, Device, ResponseLog, APNS_PLATFORM, GCM_PLATFORM, ANDROID_PLATFORM
+from .models import App, CallLog, Device, ResponseLog, APNS_PLATFORM, GCM_PLATFORM, ANDROID_PLATFORM
+from .profiler import profiler, start_profiling
+from .registry import get_inflight_calls, get_inflight_summary
+from .timing import get_timing_aggregates
 from .utils import get_metrics
 
 
@@ -16,6 +22,11 @@ class AppAdmin(admin.ModelAdmin):
     pass
 
 
+class CallLogAdmin(admin.ModelAdmin):
+    list_display = ('date', 'unique_key', 'outcome', 'platform', 'app_id', 'client_version', 'pushes', 'wait_time')
+    list_filter = ('outcome', 'platform', 'app_id', 'client_version')
+
+
 class ResponseLogAdmin(admin.ModelAdmin):
     """
     Custom admin to introduce the metrics view.
@@ -28,11 +39,23 @@ class ResponseLogAdmin(admin.ModelAdmin):
         original_urls = super(ResponseLogAdmin, self).get_urls()
 
         metrics_view = getattr(self, 'view_metrics')
+        timings_view = getattr(self, 'view_timings')
+        profiler_view = getattr(self, 'view_profiler')
+        inflight_view = getattr(self, 'view_inflight')
 
         new_urls = [
             url(regex=r'%s' % '^metrics/$',
                 name='metrics',
                 view=self.admin_site.admin_view(metrics_view)),
+            url(regex=r'%s' % '^timings/$',
+                name='timings',
+                view=self.admin_site.admin_view(timings_view)),
+            url(regex=r'%s' % '^profiler/$',
+                name='profiler',
+                view=self.admin_site.admin_view(profiler_view)),
+            url(regex=r'%s' % '^inflight/$',
+                name='inflight',
+                view=self.admin_site.admin_view(inflight_view)),
         ]
         return new_urls + original_urls
 
@@ -72,7 +95,59 @@ class ResponseLogAdmin(admin.ModelAdmin):
 
         return render(request, 'app/metrics.html', context=context)
 
+    def view_timings(self, request, **kwargs):
+        """
+        View for the aggregated phase timings of the call views.
+        """
+        context = {
+            'timings': get_timing_aggregates(['incoming-call', 'call-response']),
+        }
+
+        return render(request, 'app/timings.html', context=context)
+
+    def view_profiler(self, request, **kwargs):
+        """
+        View to start the sampling profiler on the worker that handles the
+        request, eq. profiler/?seconds=30. Without seconds the status of the
+        profiler is shown. Seconds are capped at PROFILER_MAX_DURATION.
+        """
+        seconds = request.GET.get('seconds', None)
+
+        if seconds is not None:
+            try:
+                seconds = int(seconds)
+            except ValueError:
+                seconds = 0
+            if seconds < 1:
+                return HttpResponseBadRequest('seconds should be a positive number', content_type='text/plain')
+
+            output_file = start_profiling(min(seconds, settings.PROFILER_MAX_DURATION))
+            if output_file is None:
+                message = 'Worker {0} is already profiling to {1}'.format(os.getpid(), profiler.output_file)
+            else:
+                message = 'Profiling worker {0} to {1}'.format(os.getpid(), output_file)
+        elif profiler.running:
+            message = 'Worker {0} is profiling to {1}'.format(os.getpid(), profiler.output_file)
+        else:
+            message = 'Worker {0} is not profiling'.format(os.getpid())
+
+        return HttpResponse(message, content_type='text/plain')
+
+    def view_inflight(self, request, **kwargs):
+        """
+        View for the calls that are currently waiting for a device.
+        """
+        calls = get_inflight_calls()
+
+        context = {
+            'calls': calls,
+            'summary': get_inflight_summary(calls),
+        }
+
+        return render(request, 'app/inflight.html', context=context)
+
 
 admin.site.register(Device, DeviceAdmin)
 admin.site.register(App, AppAdmin)
 admin.site.register(ResponseLog, ResponseLogAdmin)
+admin.site.register(CallLog, CallLogAdmin)
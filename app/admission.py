@@ -0,0 +1,88 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .cache import RedisClusterCache
+from .registry import NODE, SHED_KEY
+
+logger = logging.getLogger('django')
+
+
+def _waiting_key():
+    """
+    Function to get the key of the sorted set with the calls that wait on this
+    node, scored by their start time.
+    """
+    return 'waiting_{0}'.format(NODE)
+
+
+def _member(unique_key, ident=None):
+    """
+    Function to get the member of a request in the sorted set, duplicate
+    requests for a call wait in their own worker. Requests are told apart by
+    their thread unless they pass an ident.
+    """
+    return '{0}:{1}:{2}'.format(unique_key, os.getpid(), ident or threading.get_ident())
+
+
+def admit_call(unique_key, ident=None):
+    """
+    Function to claim a place in the budget of waiting calls of this node.
+    Calls are admitted when redis fails, so redis problems do not refuse
+    every call.
+
+    Args:
+        unique_key (string): The unique_key of the call.
+        ident (string): Identifies the request when it is not handled by a
+            single thread, eq. an AGI session.
+
+    Returns:
+        bool: False when MAX_WAITING_CALLS calls are already waiting.
+    """
+    if not settings.MAX_WAITING_CALLS:
+        return True
+
+    key = _waiting_key()
+    now = time.time()
+    try:
+        redis_cache = RedisClusterCache()
+        pipe = redis_cache.pipeline()
+        # Remove calls of workers that were killed while waiting.
+        pipe.zremrangebyscore(key, '-inf', now - settings.APP_PUSH_ROUNDTRIP_WAIT / 1000 - settings.INFLIGHT_TTL_MARGIN)
+        pipe.zadd(key, now, _member(unique_key, ident))
+        pipe.zcard(key)
+        waiting = pipe.execute()[2]
+
+        if waiting <= settings.MAX_WAITING_CALLS:
+            return True
+
+        pipe = redis_cache.pipeline()
+        pipe.zrem(key, _member(unique_key, ident))
+        pipe.hincrby(SHED_KEY, NODE, 1)
+        pipe.execute()
+    except Exception:
+        logger.exception('{0} | Failed to check the waiting calls budget'.format(unique_key))
+        return True
+
+    logger.warning('{0} | Shed call, {1} calls are waiting on {2}'.format(unique_key, waiting - 1, NODE))
+    return False
+
+
+def release_call(unique_key, ident=None):
+    """
+    Function to free the place of a call in the budget of waiting calls.
+
+    Args:
+        unique_key (string): The unique_key of the call.
+        ident (string): The ident given to admit_call.
+    """
+    if not settings.MAX_WAITING_CALLS:
+        return
+
+    try:
+        RedisClusterCache().zrem(_waiting_key(), _member(unique_key, ident))
+    except Exception:
+        logger.exception('{0} | Failed to release the waiting calls budget'.format(unique_key))
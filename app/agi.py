@@ -0,0 +1,388 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import signal
+from urllib.parse import parse_qsl, urlparse
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .admission import admit_call, release_call
+from .cache import RedisClusterCache
+from .calllog import log_call
+from .calls import get_unique_key, IncomingCall, OUTCOME_ACK
+from .drain import drain
+from .membership import might_have_devices
+from .models import Device
+from .serializers import IncomingCallSerializer
+
+logger = logging.getLogger('django')
+
+# Channel variables set for the dialplan at the end of an AGI session.
+STATUS_VARIABLE = 'VIALER_STATUS'
+UNIQUE_KEY_VARIABLE = 'VIALER_UNIQUE_KEY'
+
+# Positional AGI arguments, eq. AGI(agi://host/incoming-call,<sip_user_id>,...).
+CALL_ARGUMENTS = ('sip_user_id', 'phonenumber', 'caller_id', 'call_id')
+
+
+@asyncio.coroutine
+def read_environment(reader):
+    """
+    Function to read the variables asterisk sends at the start of an AGI
+    session, they end with an empty line.
+
+    Args:
+        reader (StreamReader): Reader of the AGI connection.
+
+    Returns:
+        dict: The agi_* variables.
+    """
+    environment = {}
+    while True:
+        line = yield from reader.readline()
+        line = line.decode('utf-8').strip()
+        if not line:
+            return environment
+
+        name, _, value = line.partition(':')
+        environment[name.strip()] = value.strip()
+
+
+def get_call_data(environment):
+    """
+    Function to get the incoming call data of an AGI session, from the query
+    string of the script (agi://host/incoming-call?sip_user_id=...) or from
+    the positional arguments.
+
+    Args:
+        environment (dict): The agi_* variables of the session.
+
+    Returns:
+        dict: The data for the IncomingCallSerializer.
+    """
+    data = dict(parse_qsl(urlparse(environment.get('agi_network_script', '')).query))
+
+    for index, name in enumerate(CALL_ARGUMENTS, 1):
+        value = environment.get('agi_arg_{0}'.format(index))
+        if value:
+            data.setdefault(name, value)
+
+    return data
+
+
+def quote_value(value):
+    """
+    Function to quote the value of an AGI command. Quotes and backslashes are
+    escaped and line breaks removed, so a value (eq. a caller id) can not end
+    the command or start another one.
+
+    Args:
+        value (string): The value to quote.
+
+    Returns:
+        string: The value between double quotes.
+    """
+    value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    value = value.replace('\r', ' ').replace('\n', ' ')
+    return '"{0}"'.format(value)
+
+
+def find_devices(sip_user_id):
+    """
+    Function to get the devices of a sip account, most recently seen first.
+
+    Args:
+        sip_user_id (string): The sip account that is called.
+
+    Returns:
+        list: The devices.
+    """
+    close_old_connections()
+    # Skip the query for accounts that never registered a device.
+    if not might_have_devices(sip_user_id):
+        return []
+    return list(Device.objects.select_related('app').filter(sip_user_id=sip_user_id).order_by('-last_seen'))
+
+
+def check_calls(calls):
+    """
+    Function to check the available flags of the waiting calls with a single
+    redis round trip.
+
+    Args:
+        calls (list): The waiting IncomingCalls.
+
+    Returns:
+        list: The outcome of each call, None while waiting or the exception
+            raised while processing the call.
+    """
+    pipe = RedisClusterCache().pipeline()
+    for call in calls:
+        pipe.hget(call.cache_key, 'available')
+
+    outcomes = []
+    for call, available in zip(calls, pipe.execute()):
+        try:
+            outcomes.append(call.process(available))
+        except Exception as e:
+            outcomes.append(e)
+
+    return outcomes
+
+
+class CallPoller(object):
+    """
+    Class to poll the state of all waiting calls of the AGI server at once
+    instead of polling redis per call.
+    """
+    def __init__(self, loop, executor):
+        """
+        Args:
+            loop (BaseEventLoop): Event loop of the server.
+            executor (Executor): Executor for the blocking redis calls.
+        """
+        self.loop = loop
+        self.executor = executor
+        self.waiting = []
+
+    def wait(self, call):
+        """
+        Function to wait for the outcome of a call.
+
+        Args:
+            call (IncomingCall): A started call.
+
+        Returns:
+            Future: With the outcome of the call.
+        """
+        future = asyncio.Future(loop=self.loop)
+        self.waiting.append((call, future))
+        return future
+
+    @asyncio.coroutine
+    def run(self):
+        """
+        Coroutine to check the waiting calls every AGI_POLL_INTERVAL.
+        """
+        while True:
+            yield from asyncio.sleep(settings.AGI_POLL_INTERVAL / 1000, loop=self.loop)
+            if not self.waiting:
+                continue
+
+            waiting, self.waiting = self.waiting, []
+            try:
+                outcomes = yield from self.loop.run_in_executor(
+                    self.executor, check_calls, [call for call, future in waiting])
+            except Exception as e:
+                for call, future in waiting:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (call, future), outcome in zip(waiting, outcomes):
+                if future.done():
+                    continue
+                if isinstance(outcome, Exception):
+                    future.set_exception(outcome)
+                elif outcome is None:
+                    self.waiting.append((call, future))
+                else:
+                    future.set_result(outcome)
+
+
+class AGIServer(object):
+    """
+    FastAGI server for asterisk to initiate incoming calls, an alternative
+    to the incoming-call view that waits for all calls in one process.
+    """
+    def __init__(self, host, port, threads):
+        """
+        Args:
+            host (string): Address to listen on.
+            port (int): Port to listen on, 0 picks a free port.
+            threads (int): Threads for the blocking database and redis calls.
+        """
+        self.host = host
+        self.port = port
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(threads)
+        self.poller = CallPoller(self.loop, self.executor)
+        self.server = None
+        self.sessions = set()
+        self.stopped = asyncio.Future(loop=self.loop)
+
+    def _run_blocking(self, fn, *args):
+        """
+        Function to run a blocking function in the executor.
+
+        Returns:
+            Future: With the result of the function.
+        """
+        return self.loop.run_in_executor(self.executor, fn, *args)
+
+    @asyncio.coroutine
+    def start(self):
+        """
+        Coroutine to start listening and polling the waiting calls.
+        """
+        self.server = yield from asyncio.start_server(self._accept, self.host, self.port, loop=self.loop)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.loop.create_task(self.poller.run())
+        logger.info('AGI server listening on {0}:{1}'.format(self.host, self.port))
+
+    @asyncio.coroutine
+    def stop(self):
+        """
+        Coroutine to stop accepting sessions and wait for the running ones
+        like a draining worker.
+        """
+        if self.server is None:
+            return
+
+        self.server.close()
+        yield from self.server.wait_closed()
+        self.server = None
+
+        if self.sessions:
+            yield from asyncio.wait(
+                list(self.sessions),
+                timeout=settings.APP_PUSH_ROUNDTRIP_WAIT / 1000 + 1,
+                loop=self.loop,
+            )
+        yield from self._run_blocking(drain)
+
+        self.stopped.set_result(True)
+
+    def shutdown(self):
+        """
+        Function to stop the server from another thread.
+        """
+        self.loop.call_soon_threadsafe(lambda: self.loop.create_task(self.stop()))
+
+    def serve_forever(self, handle_signals=True):
+        """
+        Function to run the server until it is stopped.
+
+        Args:
+            handle_signals (bool): Stop on SIGTERM and SIGINT, only possible
+                in the main thread.
+        """
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.start())
+
+        if handle_signals:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                self.loop.add_signal_handler(signum, lambda: self.loop.create_task(self.stop()))
+
+        try:
+            self.loop.run_until_complete(self.stopped)
+        finally:
+            self.executor.shutdown(wait=False)
+            self.loop.close()
+
+    def _accept(self, reader, writer):
+        """
+        Function to handle a new connection in its own task.
+        """
+        task = self.loop.create_task(self.handle_session(reader, writer))
+        self.sessions.add(task)
+        task.add_done_callback(self.sessions.discard)
+
+    @asyncio.coroutine
+    def handle_session(self, reader, writer):
+        """
+        Coroutine to handle an AGI session and set the status of the call as
+        channel variable.
+
+        Args:
+            reader (StreamReader): Reader of the AGI connection.
+            writer (StreamWriter): Writer of the AGI connection.
+        """
+        try:
+            environment = yield from read_environment(reader)
+            unique_key, status = yield from self.handle_call(get_call_data(environment))
+
+            yield from self.set_variable(reader, writer, UNIQUE_KEY_VARIABLE, unique_key)
+            yield from self.set_variable(reader, writer, STATUS_VARIABLE, status)
+        except Exception:
+            logger.exception('Failed to handle AGI session')
+        finally:
+            writer.close()
+
+    @asyncio.coroutine
+    def handle_call(self, data):
+        """
+        Coroutine to send the push messages of an incoming call and wait for
+        a device to respond.
+
+        Args:
+            data (dict): The data of the incoming call.
+
+        Returns:
+            tuple: The unique_key and ACK or NAK.
+        """
+        serializer = IncomingCallSerializer(data=data)
+        if not serializer.is_valid():
+            logger.warning('Invalid AGI incoming call {0}: {1}'.format(data, serializer.errors))
+            return '', 'NAK'
+
+        sip_user_id = serializer.validated_data['sip_user_id']
+        caller_id = serializer.validated_data['caller_id']
+        phonenumber = serializer.validated_data['phonenumber']
+        unique_key = get_unique_key(serializer.validated_data['call_id'])
+
+        logger.info('{0} | Incoming call for SIP:{1} FROM:\'{2}/{3}\' (AGI)'.format(
+            unique_key,
+            sip_user_id,
+            phonenumber,
+            caller_id)
+        )
+
+        devices = yield from self._run_blocking(find_devices, sip_user_id)
+        if not devices:
+            logger.warning('{0} | Failed to find a device for SIP_user_ID : {1} sending NAK'.format(
+                unique_key,
+                sip_user_id)
+            )
+            log_call(unique_key, 'no-device')
+            return unique_key, 'NAK'
+
+        # The same budget of waiting calls as the incoming-call view. The
+        # blocking calls run in any thread of the executor, so the session
+        # has its own ident.
+        ident = uuid.uuid4().hex
+        admitted = yield from self._run_blocking(admit_call, unique_key, ident)
+        if not admitted:
+            log_call(unique_key, 'shed', devices=devices)
+            return unique_key, 'NAK'
+
+        try:
+            call = IncomingCall(unique_key, sip_user_id, phonenumber, caller_id, devices)
+            yield from self._run_blocking(call.start)
+
+            outcome = None
+            try:
+                outcome = yield from self.poller.wait(call)
+            finally:
+                yield from self._run_blocking(call.finish, outcome)
+        finally:
+            yield from self._run_blocking(release_call, unique_key, ident)
+
+        return unique_key, 'ACK' if outcome == OUTCOME_ACK else 'NAK'
+
+    @asyncio.coroutine
+    def set_variable(self, reader, writer, name, value):
+        """
+        Coroutine to set a channel variable and read the result.
+
+        Raises:
+            ValueError: When asterisk does not accept the command.
+        """
+        writer.write('SET VARIABLE {0} {1}\n'.format(name, quote_value(value)).encode('utf-8'))
+        yield from writer.drain()
+
+        result = yield from reader.readline()
+        if not result.startswith(b'200'):
+            raise ValueError('Failed to set {0}: {1}'.format(name, result.decode('utf-8').strip()))
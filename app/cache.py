@@ -1,15 +1,46 @@
+from threading import Lock
+
 from django.conf import settings
 from rediscluster import StrictRedisCluster
 
 DEFAULT_TIMEOUT = 300
 
+# Creating a client does the cluster slot discovery, so the client and its
+# connection pool are shared by all RedisClusterCache objects of a process.
+_client = None
+_client_lock = Lock()
+
+# Lua scripts by their source, registering a script hashes it.
+_scripts = {}
+
+
+def reset_client():
+    """
+    Function to drop the shared client, eq. after forking a worker so it does
+    not share connections with its parent.
+    """
+    global _client
+    with _client_lock:
+        _client = None
+
 
 class RedisClusterCache(object):
     """
     Class used for accessing the redis cluster used for caching.
     """
     def __init__(self):
-        self.client = self._create_client()
+        self.client = self._get_client()
+
+    def _get_client(self):
+        """
+        Function to get the shared client, creates it on first use.
+        """
+        global _client
+        if _client is None:
+            with _client_lock:
+                if _client is None:
+                    _client = self._create_client()
+        return _client
 
     def _create_client(self):
         """
@@ -26,6 +57,9 @@ class RedisClusterCache(object):
 
         return StrictRedisCluster(startup_nodes=nodes, decode_responses=True)
 
+    def ping(self):
+        return self.client.ping()
+
     def get(self, key):
         return self.client.get(key)
 
@@ -34,3 +68,63 @@ class RedisClusterCache(object):
 
     def set(self, key, value, timeout=DEFAULT_TIMEOUT):
         self.client.set(key, value, timeout)
+
+    def delete(self, key):
+        return self.client.delete(key)
+
+    def expire(self, key, timeout):
+        return self.client.expire(key, timeout)
+
+    def hset(self, key, field, value):
+        return self.client.hset(key, field, value)
+
+    def hget(self, key, field):
+        return self.client.hget(key, field)
+
+    def hmget(self, key, *fields):
+        return self.client.hmget(key, *fields)
+
+    def hmset(self, key, mapping, timeout=DEFAULT_TIMEOUT):
+        pipe = self.client.pipeline()
+        pipe.hmset(key, mapping)
+        pipe.expire(key, timeout)
+        pipe.execute()
+
+    def hsetnx(self, key, field, value):
+        return self.client.hsetnx(key, field, value)
+
+    def hdel(self, key, *fields):
+        return self.client.hdel(key, *fields)
+
+    def hincrby(self, key, field, amount=1):
+        return self.client.hincrby(key, field, amount)
+
+    def hgetall(self, key):
+        return self.client.hgetall(key)
+
+    def zadd(self, key, score, member):
+        return self.client.zadd(key, score, member)
+
+    def zrem(self, key, member):
+        return self.client.zrem(key, member)
+
+    def zscore(self, key, member):
+        return self.client.zscore(key, member)
+
+    def zrange(self, key, start, end, withscores=False):
+        return self.client.zrange(key, start, end, withscores=withscores)
+
+    def zrangebyscore(self, key, min_score, max_score, start=None, num=None):
+        return self.client.zrangebyscore(key, min_score, max_score, start=start, num=num)
+
+    def zremrangebyscore(self, key, min_score, max_score):
+        return self.client.zremrangebyscore(key, min_score, max_score)
+
+    def run_script(self, script, keys, args):
+        # Runs the script with EVALSHA and loads it when redis misses it.
+        if script not in _scripts:
+            _scripts[script] = self.client.register_script(script)
+        return _scripts[script](keys=keys, args=args, client=self.client)
+
+    def pipeline(self):
+        return self.client.pipeline()
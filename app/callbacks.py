@@ -0,0 +1,184 @@
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.db import connection
+import requests
+
+from .cache import RedisClusterCache
+from .calls import CALLBACK_CALLS_KEY, get_call_cache_key, IncomingCall, OUTCOME_ACK, OUTCOME_NAK
+from .decorators import threaded
+from .drain import is_draining
+
+logger = logging.getLogger('django')
+
+_stop = threading.Event()
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_allowed_hosts():
+    """
+    Returns:
+        list: The hosts callback urls may point to.
+    """
+    return [host for host in settings.CALLBACK_ALLOWED_HOSTS.replace(' ', '').split(',') if host]
+
+
+def is_allowed_url(url):
+    """
+    Function to check if a callback url points to an allowed host, so the
+    middleware can not be used to post to other hosts.
+
+    Args:
+        url (string): The callback url.
+
+    Returns:
+        bool: True when the url is allowed.
+    """
+    parsed = urlparse(url)
+    return parsed.scheme in ('http', 'https') and parsed.hostname in get_allowed_hosts()
+
+
+def send_callback(unique_key, callback_url, outcome):
+    """
+    Function to post the outcome of a call to its callback url. Only the
+    first caller for a call posts the outcome.
+
+    Args:
+        unique_key (string): The unique_key of the call.
+        callback_url (string): Url to post the outcome to.
+        outcome (string): The outcome of the call.
+    """
+    if not RedisClusterCache().hsetnx(get_call_cache_key(unique_key), 'callback_sent', 1):
+        return
+
+    task_post_callback(unique_key, callback_url, 'ACK' if outcome == OUTCOME_ACK else 'NAK')
+
+
+@threaded
+def task_post_callback(unique_key, callback_url, status):
+    """
+    Threaded task to post the status of a call to its callback url.
+    """
+    try:
+        response = requests.post(
+            callback_url,
+            data={'unique_key': unique_key, 'status': status},
+            timeout=settings.CALLBACK_TIMEOUT,
+        )
+        response.raise_for_status()
+    except Exception:
+        logger.exception('{0} | Failed to post status={1} to {2}'.format(unique_key, status, callback_url))
+    else:
+        logger.info('{0} | Posted status={1} to {2}'.format(unique_key, status, callback_url))
+
+
+def process_call(unique_key):
+    """
+    Function to resend the push messages of a call in callback mode or finish
+    it when it has an outcome.
+
+    Args:
+        unique_key (string): The unique_key of the call.
+    """
+    state = RedisClusterCache().hgetall(get_call_cache_key(unique_key))
+    if not state.get('callback_url'):
+        return
+
+    call = IncomingCall.restore(unique_key, state)
+    outcome = call.process(state.get('available'))
+    if outcome is None:
+        call.save_progress()
+        return
+
+    call.finish(outcome)
+    send_callback(unique_key, call.callback_url, outcome)
+
+
+def retry_call(unique_key):
+    """
+    Function to schedule a call that failed to process again after the retry
+    delay. A call past its deadline gets a NAK, so the PBX is never left
+    without an outcome.
+
+    Args:
+        unique_key (string): The unique_key of the call.
+    """
+    redis_cache = RedisClusterCache()
+    state = redis_cache.hgetall(get_call_cache_key(unique_key))
+    if not state.get('callback_url'):
+        return
+
+    retry_time = time.time() + settings.CALLBACK_RETRY_DELAY / 1000
+    if retry_time < float(state['wait_until']):
+        redis_cache.zadd(CALLBACK_CALLS_KEY, retry_time, unique_key)
+    else:
+        send_callback(unique_key, state['callback_url'], OUTCOME_NAK)
+
+
+def process_due_calls():
+    """
+    Function to process the calls in callback mode that have a resend or
+    deadline due. A call is claimed by removing it from the schedule, so only
+    one worker processes it.
+    """
+    redis_cache = RedisClusterCache()
+    unique_keys = redis_cache.zrangebyscore(CALLBACK_CALLS_KEY, '-inf', time.time(), start=0, num=100)
+
+    for unique_key in unique_keys:
+        if not redis_cache.zrem(CALLBACK_CALLS_KEY, unique_key):
+            continue
+        try:
+            process_call(unique_key)
+        except Exception:
+            logger.exception('{0} | Failed to process call in callback mode'.format(unique_key))
+            try:
+                retry_call(unique_key)
+            except Exception:
+                logger.exception('{0} | Failed to retry call in callback mode'.format(unique_key))
+
+
+def run_scheduler():
+    """
+    Function that processes the due calls until the worker drains.
+    """
+    while not _stop.is_set() and not is_draining():
+        try:
+            process_due_calls()
+        except Exception:
+            logger.exception('Failed to process calls in callback mode')
+        _stop.wait(settings.CALLBACK_SCHEDULER_INTERVAL / 1000)
+
+    connection.close()
+
+
+def start_scheduler():
+    """
+    Function to start the scheduler thread of this worker when callback mode
+    is enabled. Started by the warm up and again with a call in callback
+    mode, so due calls of other workers are processed on a quiet node.
+    """
+    global _scheduler
+
+    if not get_allowed_hosts() or (_scheduler is not None and _scheduler.is_alive()):
+        return
+
+    with _scheduler_lock:
+        if _scheduler is not None and _scheduler.is_alive():
+            return
+
+        _stop.clear()
+        _scheduler = threading.Thread(target=run_scheduler, name='callback-scheduler', daemon=True)
+        _scheduler.start()
+
+
+def stop_scheduler():
+    """
+    Function to stop the scheduler thread of this worker.
+    """
+    _stop.set()
+    if _scheduler is not None:
+        _scheduler.join()
@@ -0,0 +1,91 @@
+import logging
+from threading import Lock
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .decorators import threaded
+from .models import CallLog
+
+logger = logging.getLogger('django')
+
+# Call logs are buffered per worker and written with a single insert per
+# CALL_LOG_BATCH_SIZE calls or CALL_LOG_FLUSH_INTERVAL seconds.
+_pending = []
+_pending_lock = Lock()
+_last_flush = time.time()
+
+
+def log_call(unique_key, outcome, devices=(), pushes=0, push_latencies=(), wait_time=0):
+    """
+    Function to log the outcome of an incoming call.
+
+    Args:
+        unique_key (string): The unique_key of the call.
+        outcome (string): The outcome of the call.
+        devices (list): The devices of the call, most recently seen first.
+        pushes (int): Push messages sent to all devices together.
+        push_latencies (list): Seconds it took to send each push message.
+        wait_time (float): Seconds the call waited for the devices.
+    """
+    global _pending, _last_flush
+
+    device = devices[0] if devices else None
+    push_latencies = list(push_latencies)
+
+    call_log = CallLog(
+        unique_key=unique_key,
+        outcome=outcome,
+        platform=device.app.platform if device else None,
+        app_id=device.app.app_id if device else None,
+        client_version=device.client_version if device else None,
+        devices=len(devices),
+        pushes=pushes,
+        push_latency=sum(push_latencies) / len(push_latencies) if push_latencies else None,
+        wait_time=wait_time,
+    )
+
+    with _pending_lock:
+        _pending.append(call_log)
+        if (len(_pending) < settings.CALL_LOG_BATCH_SIZE and
+                time.time() - _last_flush < settings.CALL_LOG_FLUSH_INTERVAL):
+            return
+
+        pending = _pending
+        _pending = []
+        _last_flush = time.time()
+
+    write_call_logs(pending)
+
+
+def flush_pending_call_logs():
+    """
+    Function to write the buffered call logs of this worker without waiting
+    for the batch, eq. when the worker stops.
+    """
+    global _pending, _last_flush
+
+    with _pending_lock:
+        pending = _pending
+        _pending = []
+        _last_flush = time.time()
+
+    if pending:
+        write_call_logs(pending)
+
+
+@threaded
+def write_call_logs(call_logs):
+    """
+    Threaded task to write call logs to the database.
+
+    Args:
+        call_logs (list): Unsaved CallLog objects.
+    """
+    try:
+        CallLog.objects.bulk_create(call_logs)
+    except Exception:
+        logger.exception('Failed to write {0} call logs'.format(len(call_logs)))
+    finally:
+        connection.close()
@@ -0,0 +1,709 @@
+import datetime
+import logging
+import math
+import os
+import random
+import time
+
+from django.conf import settings
+
+from .cache import DEFAULT_TIMEOUT, RedisClusterCache
+from .calllog import log_call
+from .devicemodel import answer_probability, DeviceModel, get_model_key, record_call
+from .drain import finish_wait, start_wait
+from .models import Device
+from .registry import NODE, register_call, unregister_call, update_attempts
+from .resend import get_resend_interval
+from .signing import sign_unique_key
+from .tasks import task_cancel_call_notify, task_incoming_call_notify
+from .timing import PhaseTimer
+
+logger = logging.getLogger('django')
+
+OUTCOME_ACK = 'ACK'
+OUTCOME_NAK = 'NAK'
+OUTCOME_TIMEOUT = 'timeout'
+OUTCOME_CANCELLED = 'cancelled'
+OUTCOME_GIVE_UP = 'give-up'
+
+# Modes of a group call, end at the first available account or wait for
+# every account.
+GROUP_CALL_FIRST = 'first'
+GROUP_CALL_ALL = 'all'
+
+# Sorted set with the unique_key of the calls in callback mode, scored by the
+# time of their next resend or deadline, see app/callbacks.py.
+CALLBACK_CALLS_KEY = 'callback_calls'
+
+
+def get_call_cache_key(unique_key):
+    """
+    Function to get the key of the redis hash with the state of a call. When
+    the call finished the hash expires at wait_until. The hash has the
+    fields:
+        owner: Node and pid of the worker that handles the call.
+        wait_until: Timestamp at which the owner stops waiting.
+        platform: Platform of the most recently seen device, for logging.
+        platform:<token>: Platform per device.
+        device: Token of the device when there is only one.
+        callback_url: Url to post the outcome to in callback mode, with the
+            fields needed to resend the push messages without a waiting
+            request: sip_user_id, phonenumber, caller_id, start_time,
+            attempt, max_attempts, resend_interval and next_resend_time.
+        callback_sent: Set by the first to post the outcome.
+        devices: The amount of devices that got a push message.
+        sent:<attempt>: Timestamp at which the push messages of an attempt
+            were sent.
+        declined: The amount of devices that are not available.
+        declined:<token>: Set when a device is not available, so a device
+            counts once.
+        answered_by: Token of the device that answered first.
+        cancel_notify: Whether the devices get a cancel push message when
+            the call is cancelled.
+        available: Set once, to True by the first available device, to
+            False when all devices are not available or to Cancelled when
+            the call ended without waiting for the devices.
+    """
+    return 'call_{0}'.format(unique_key)
+
+
+def get_unique_key(call_id):
+    """
+    Function to get the unique_key the devices use to respond to a call.
+
+    Args:
+        call_id (string): Reference of the call given by asterisk, can be
+            empty.
+
+    Returns:
+        string: The call_id or a random key when there is no call_id.
+    """
+    if not call_id:
+        # Generate unique_key for reference on incoming call answer.
+        unique_key = random.getrandbits(128)
+        return '%032x' % unique_key
+
+    return call_id
+
+
+def get_response_timing(state, response_time, attempt=None):
+    """
+    Function to time a device response with the send times of the push
+    messages in the call state instead of the time echoed by the device.
+
+    Args:
+        state (dict): The call state from redis.
+        response_time (float): Timestamp of the response.
+        attempt (int): The attempt the device responded to, when it was
+            posted by the device.
+
+    Returns:
+        tuple: Seconds since the first push message, the attempt that woke
+            the device and seconds since the push message of that attempt.
+            None when the state has no send times.
+    """
+    sent = {}
+    for field, value in state.items():
+        if field.startswith('sent:'):
+            sent[int(field[5:])] = float(value)
+    if not sent:
+        return None
+
+    if attempt not in sent:
+        # Without an attempt from the device the last push message sent
+        # before the response woke it up.
+        attempt = max([number for number, sent_time in sent.items() if sent_time <= response_time] or [min(sent)])
+
+    return response_time - sent[min(sent)], attempt, response_time - sent[attempt]
+
+
+def cancel_call(unique_key, notify=True):
+    """
+    Function to cancel a call that is waiting for its devices, eq. when the
+    caller hung up. The wait loop stops at its next check.
+
+    Args:
+        unique_key (string): The unique_key of the call.
+        notify (bool): Send the devices a cancel push message.
+
+    Returns:
+        bool: True when the call was cancelled, False when it does not exist
+            or already has an outcome.
+    """
+    redis_cache = RedisClusterCache()
+    cache_key = get_call_cache_key(unique_key)
+
+    if not redis_cache.exists(cache_key):
+        return False
+
+    pipe = redis_cache.pipeline()
+    pipe.hset(cache_key, 'cancel_notify', notify)
+    pipe.hsetnx(cache_key, 'available', 'Cancelled')
+    return bool(pipe.execute()[1])
+
+
+def _format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime('%H:%M:%S.%f')
+
+
+class IncomingCall(object):
+    """
+    Class to wake up the devices of a sip account for an incoming call and
+    wait until one of them responds.
+    """
+    def __init__(self, unique_key, sip_user_id, phonenumber, caller_id, devices, timer=None, callback_url=None):
+        """
+        Args:
+            unique_key (string): The unique_key of the call.
+            sip_user_id (string): The sip account that is called.
+            phonenumber (string): Phonenumber of the caller.
+            caller_id (string): Name of the caller.
+            devices (list): The devices of the sip account, most recently
+                seen first.
+            timer (PhaseTimer): Timer of the request, timing is disabled when
+                omitted.
+            callback_url (string): Url to post the outcome to, no request
+                waits for the call when given.
+        """
+        self.unique_key = unique_key
+        self.sip_user_id = sip_user_id
+        self.phonenumber = phonenumber
+        self.caller_id = caller_id
+        self.devices = devices
+        self.platform = devices[0].app.platform if devices else None
+        self.timer = timer or PhaseTimer(None)
+        self.callback_url = callback_url
+
+        self.cache_key = get_call_cache_key(unique_key)
+        self.redis_cache = None
+        self.attempt = 0
+        self.duplicate = False
+        self.start_time = None
+        # Whether start counted the call as waiting for the drain.
+        self.waiting = False
+        self.models = []
+        # Seconds it took to send each push message that was sent.
+        self.push_latencies = []
+        # Only a call with a waiting request holds a worker and is registered
+        # as in-flight, a group call registers itself instead of its calls.
+        self.register = not callback_url
+        self.registered_node = None
+
+        # Time related settings.
+        self.wait_interval = settings.APP_PUSH_ROUNDTRIP_WAIT / 1000
+        self.wait_until = None
+        self.next_resend_time = None
+
+        # Determine max possible attempts. Avoid sending a push close to the
+        # end of the loop.
+        self.max_attempts = int(self.wait_interval / (settings.APP_PUSH_RESEND_INTERVAL / 1000)) - 1
+
+        # Resend when most devices of the platforms would have responded,
+        # learned from the round trip times.
+        self.resend_interval = min(
+            [get_resend_interval(device.app.platform) for device in devices] or
+            [settings.APP_PUSH_RESEND_INTERVAL / 1000]
+        )
+
+    @classmethod
+    def restore(cls, unique_key, state):
+        """
+        Function to create the call in callback mode from its state, to
+        continue it without the request that started it.
+
+        Args:
+            unique_key (string): The unique_key of the call.
+            state (dict): The call state from redis.
+
+        Returns:
+            IncomingCall: The call.
+        """
+        tokens = [field.split(':', 1)[1] for field in state if field.startswith('platform:')]
+        devices = list(Device.objects.select_related('app').filter(
+            sip_user_id=state['sip_user_id'],
+            token__in=tokens,
+        ))
+
+        call = cls(
+            unique_key,
+            state['sip_user_id'],
+            state['phonenumber'],
+            state['caller_id'],
+            devices,
+            callback_url=state['callback_url'],
+        )
+        call.redis_cache = RedisClusterCache()
+        call.platform = state['platform']
+        call.start_time = float(state['start_time'])
+        call.wait_until = float(state['wait_until'])
+        call.attempt = int(state['attempt'])
+        call.max_attempts = int(state['max_attempts'])
+        call.resend_interval = float(state['resend_interval'])
+        call.next_resend_time = float(state['next_resend_time'])
+
+        return call
+
+    @property
+    def response_key(self):
+        """
+        Returns:
+            string: The unique_key the devices respond with, signed when
+                UNIQUE_KEY_SIGNING is enabled.
+        """
+        return sign_unique_key(self.unique_key, self.wait_until)
+
+    def get_next_event_time(self):
+        """
+        Returns:
+            float: Timestamp of the next resend or the deadline.
+        """
+        if self.attempt < self.max_attempts:
+            return min(self.next_resend_time, self.wait_until)
+        return self.wait_until
+
+    def save_progress(self):
+        """
+        Function to store the resend progress of a call in callback mode and
+        schedule its next event.
+        """
+        pipe = self.redis_cache.pipeline()
+        pipe.hmset(self.cache_key, {'attempt': self.attempt, 'next_resend_time': self.next_resend_time})
+        pipe.zadd(CALLBACK_CALLS_KEY, self.get_next_event_time(), self.unique_key)
+        pipe.execute()
+
+    def _notify(self):
+        """
+        Send a push message to every device. Every push message is sent in
+        its own thread so more devices do not add latency.
+        """
+        self.attempt += 1
+        with self.timer.phase('push'):
+            for device in self.devices:
+                task_incoming_call_notify(
+                    device,
+                    self.response_key,
+                    self.phonenumber,
+                    self.caller_id,
+                    self.attempt,
+                    self.push_latencies,
+                )
+
+    def start(self):
+        """
+        Function to send the first push messages and create the call state
+        the devices respond to. A duplicate request for the same call (eq. a
+        retry by asterisk) does not send push messages but waits for the
+        outcome of the first request.
+        """
+        with self.timer.phase('redis'):
+            self.redis_cache = RedisClusterCache()
+            pipe = self.redis_cache.pipeline()
+            pipe.hsetnx(self.cache_key, 'owner', '{0}:{1}'.format(NODE, os.getpid()))
+            pipe.expire(self.cache_key, DEFAULT_TIMEOUT)
+            pipe.hget(self.cache_key, 'wait_until')
+            for device in self.devices:
+                pipe.hmget(get_model_key(device.token), 'latency', 'answer_rate', 'calls')
+            owner, _, wait_until, *models = pipe.execute()
+
+        if not owner:
+            self.duplicate = True
+            # The owner may not have stored its state yet.
+            self.wait_until = float(wait_until) if wait_until else time.time() + self.wait_interval
+            logger.info('{0} | Duplicate request, waiting for the outcome of the first request until {1}'.format(
+                self.unique_key,
+                _format_time(self.wait_until))
+            )
+            self._start_wait()
+            return
+
+        self.models = [DeviceModel(*values) for values in models]
+
+        now = time.time()
+        self.start_time = now
+        self.wait_until = now + self.wait_interval
+        self.next_resend_time = now + self.resend_interval
+
+        # Send push message to wake up app.
+        self._notify()
+        sent_time = time.time()
+
+        # The available flag is added to the state by the devices. The
+        # platforms are stored for logging purposes.
+        state = {
+            'wait_until': self.wait_until,
+            'platform': self.platform,
+            'devices': len(self.devices),
+            'sent:{0}'.format(self.attempt): sent_time,
+        }
+        for device in self.devices:
+            state['platform:{0}'.format(device.token)] = device.app.platform
+        if len(self.devices) == 1:
+            state['device'] = self.devices[0].token
+        if self.callback_url:
+            state.update({
+                'callback_url': self.callback_url,
+                'sip_user_id': self.sip_user_id,
+                'phonenumber': self.phonenumber,
+                'caller_id': self.caller_id,
+                'start_time': self.start_time,
+                'attempt': self.attempt,
+                'max_attempts': self.max_attempts,
+                'resend_interval': self.resend_interval,
+                'next_resend_time': self.next_resend_time,
+            })
+
+        with self.timer.phase('redis'):
+            self.redis_cache.hmset(self.cache_key, state)
+            if self.callback_url:
+                self.redis_cache.zadd(CALLBACK_CALLS_KEY, self.get_next_event_time(), self.unique_key)
+
+        logger.info('{0} | {1} Starting \'wait for it\' loop for {2} device(s) until {3} ({4}msec)'.format(
+            self.unique_key,
+            self.platform.upper(),
+            len(self.devices),
+            _format_time(self.wait_until),
+            settings.APP_PUSH_ROUNDTRIP_WAIT)
+        )
+        if self.register:
+            with self.timer.phase('redis'):
+                register_call(self.unique_key, self.sip_user_id, self.platform)
+            self.registered_node = NODE
+
+        self._start_wait()
+
+    def _start_wait(self):
+        """
+        Function to count the call as waiting, so a draining worker waits for
+        it. No request waits for a call in callback mode.
+        """
+        if not self.callback_url:
+            start_wait()
+            self.waiting = True
+
+    def check(self):
+        """
+        Function to check if a device responded and resend the push messages
+        every resend interval while waiting.
+
+        Returns:
+            string: The outcome of the call or None while still waiting.
+        """
+        with self.timer.phase('redis'):
+            available = self.redis_cache.hget(self.cache_key, 'available')
+
+        return self.process(available)
+
+    def process(self, available):
+        """
+        Function to handle the available flag of the call state.
+
+        Args:
+            available (string): The available flag, None when no device
+                responded yet.
+
+        Returns:
+            string: The outcome of the call or None while still waiting.
+        """
+        # Get on an empty field returns None so we need to check for True
+        # and False.
+        if available == 'True':
+            return OUTCOME_ACK
+        elif available == 'False':
+            return OUTCOME_NAK
+        elif available == 'Cancelled':
+            return OUTCOME_CANCELLED
+
+        now = time.time()
+        if now >= self.wait_until:
+            return OUTCOME_TIMEOUT
+
+        # Try to resend the push message every X seconds or after exceeding
+        # the max_attempts. Only the first request sends push messages and
+        # no push is sent when a device can not respond in time anymore.
+        if self.duplicate:
+            return None
+
+        if self.give_up(now):
+            return OUTCOME_GIVE_UP
+
+        if (now > self.next_resend_time and self.attempt < self.max_attempts and
+                self.wait_until - now >= self.resend_interval):
+            self.next_resend_time = now + self.resend_interval
+            self._notify()
+            with self.timer.phase('redis'):
+                self.redis_cache.hset(self.cache_key, 'sent:{0}'.format(self.attempt), time.time())
+                if self.registered_node:
+                    update_attempts(self.unique_key, self.attempt)
+
+        return None
+
+    def give_up(self, now):
+        """
+        Function to check if it is unlikely that one of the devices still
+        answers in time, based on their response time models.
+
+        Args:
+            now (float): The current timestamp.
+
+        Returns:
+            bool: True when the call can stop waiting.
+        """
+        if not settings.EARLY_GIVE_UP_THRESHOLD or not self.models or not all(
+                model.trained for model in self.models):
+            return False
+
+        probability = answer_probability(self.models, now - self.start_time, self.wait_interval)
+        if probability >= settings.EARLY_GIVE_UP_THRESHOLD:
+            return False
+
+        logger.info('{0} | Devices will probably not check in on time (p={1:.3f})'.format(
+            self.unique_key,
+            probability)
+        )
+        return True
+
+    def finish(self, outcome):
+        """
+        Function to log the outcome of the call and stop the other devices
+        from ringing when a device answered.
+
+        Args:
+            outcome (string): The outcome of the call, None when the wait
+                loop failed.
+        """
+        if self.waiting:
+            finish_wait()
+            self.waiting = False
+        if self.start_time is None and not self.duplicate:
+            # Start failed before the push messages were sent (eq. redis is
+            # down) or did not run, there is nothing to undo.
+            log_call(self.unique_key, 'error', devices=self.devices)
+            return
+        if not self.duplicate:
+            if self.registered_node:
+                with self.timer.phase('redis'):
+                    unregister_call(self.unique_key, self.registered_node)
+            log_call(
+                self.unique_key,
+                outcome or 'error',
+                devices=self.devices,
+                pushes=len(self.push_latencies),
+                push_latencies=self.push_latencies,
+                wait_time=time.time() - self.start_time,
+            )
+
+        if outcome == OUTCOME_ACK:
+            logger.info('{0} | {1} Device checked in on time, sending ACK on {2}'.format(
+                self.unique_key,
+                self.platform.upper(),
+                _format_time(time.time()))
+            )
+            if len(self.devices) > 1 and not self.duplicate:
+                self._cancel_others()
+        elif outcome == OUTCOME_NAK:
+            logger.info('{0} | {1} Device not available, sending NAK on {2}'.format(
+                self.unique_key,
+                self.platform.upper(),
+                _format_time(time.time()))
+            )
+        elif outcome == OUTCOME_TIMEOUT:
+            logger.info('{0} | {1} Device did NOT check in on time, sending NAK on {2}'.format(
+                self.unique_key,
+                self.platform.upper(),
+                _format_time(time.time()))
+            )
+            if not self.duplicate:
+                self._record_misses()
+        elif outcome == OUTCOME_GIVE_UP:
+            logger.info('{0} | {1} Gave up waiting for device, sending NAK on {2}'.format(
+                self.unique_key,
+                self.platform.upper(),
+                _format_time(time.time()))
+            )
+            if not self.duplicate:
+                self._record_misses()
+            # Stop the devices from ringing for a call asterisk refused.
+            self.cancel()
+        elif outcome == OUTCOME_CANCELLED:
+            logger.info('{0} | {1} Call cancelled, sending NAK on {2}'.format(
+                self.unique_key,
+                self.platform.upper(),
+                _format_time(time.time()))
+            )
+            with self.timer.phase('redis'):
+                notify = self.redis_cache.hget(self.cache_key, 'cancel_notify')
+            if notify == 'True' and not self.duplicate:
+                self._notify_cancel()
+
+        if not self.duplicate:
+            # Keep the state while the devices can still respond in time, a
+            # retry of the call id after that starts a new call instead of
+            # getting the outcome of this one.
+            with self.timer.phase('redis'):
+                self.redis_cache.expire(self.cache_key, max(1, math.ceil(self.wait_until - time.time())))
+
+    def _record_misses(self):
+        """
+        Function to count the call as missed in the response time model of
+        every device that did not respond. Devices that responded in time are
+        counted by the call-response view. Apps that do not send their token
+        can not be told apart, then every device misses.
+        """
+        with self.timer.phase('redis'):
+            state = self.redis_cache.hgetall(self.cache_key)
+
+        responded = {field.split(':', 1)[1] for field in state if field.startswith('declined:')}
+        if state.get('answered_by'):
+            responded.add(state['answered_by'])
+
+        for device in self.devices:
+            if device.token not in responded:
+                record_call(device.token, False)
+
+    def cancel(self, notify=True):
+        """
+        Function to end the call without waiting for the devices, later
+        responses of the devices are refused.
+
+        Args:
+            notify (bool): Send the devices a cancel push message.
+        """
+        with self.timer.phase('redis'):
+            self.redis_cache.hsetnx(self.cache_key, 'available', 'Cancelled')
+
+        if notify and not self.duplicate:
+            self._notify_cancel()
+
+    def _notify_cancel(self):
+        """
+        Send a cancel push message to every device.
+        """
+        with self.timer.phase('push'):
+            for device in self.devices:
+                task_cancel_call_notify(device, self.response_key)
+
+    def _cancel_others(self):
+        """
+        Send a cancel push message to the devices that did not answer. Apps
+        that do not send their token with the response can not be told apart,
+        then no device is cancelled.
+        """
+        with self.timer.phase('redis'):
+            answered_by = self.redis_cache.hget(self.cache_key, 'answered_by')
+
+        if not answered_by or answered_by not in [device.token for device in self.devices]:
+            return
+
+        with self.timer.phase('push'):
+            for device in self.devices:
+                if device.token != answered_by:
+                    task_cancel_call_notify(device, self.response_key)
+
+
+class GroupCall(object):
+    """
+    Class to ring the devices of multiple sip accounts (eq. a hunt group) in
+    a single wait loop.
+    """
+    def __init__(self, unique_key, calls, mode=GROUP_CALL_FIRST, timer=None):
+        """
+        Args:
+            unique_key (string): The unique_key of the group call, used to
+                cancel all accounts at once.
+            calls (list): An IncomingCall per sip account.
+            mode (string): GROUP_CALL_FIRST to stop at the first available
+                account or GROUP_CALL_ALL to wait for every account.
+            timer (PhaseTimer): Timer of the request, timing is disabled when
+                omitted.
+        """
+        self.unique_key = unique_key
+        self.calls = calls
+        self.mode = mode
+        self.timer = timer or PhaseTimer(None)
+        self.outcomes = {}
+        self.attempt = 1
+
+        # The group holds a single worker, it is registered as one in-flight
+        # call.
+        for call in calls:
+            call.register = False
+
+        # The group has its own call state without platform, so devices can
+        # not respond to it, that can be cancelled.
+        self.cache_key = get_call_cache_key(unique_key)
+
+    def start(self):
+        """
+        Function to send the first push messages for every account.
+        """
+        with self.timer.phase('redis'):
+            RedisClusterCache().hmset(self.cache_key, {'accounts': len(self.calls)})
+
+        for call in self.calls:
+            call.start()
+
+        with self.timer.phase('redis'):
+            register_call(self.unique_key, ','.join(str(call.sip_user_id) for call in self.calls), 'group')
+
+    def check(self):
+        """
+        Function to check all accounts that are still waiting with a single
+        redis pipeline.
+
+        Returns:
+            bool: True when the wait loop is done.
+        """
+        pending = [call for call in self.calls if call.unique_key not in self.outcomes]
+
+        with self.timer.phase('redis'):
+            pipe = RedisClusterCache().pipeline()
+            pipe.hmget(self.cache_key, 'available', 'cancel_notify')
+            for call in pending:
+                pipe.hget(call.cache_key, 'available')
+            (group_available, notify), *flags = pipe.execute()
+
+        if group_available == 'Cancelled':
+            # Cancel the accounts so their devices can not respond anymore.
+            for call in pending:
+                call.cancel(notify=notify == 'True')
+                self.outcomes[call.unique_key] = OUTCOME_CANCELLED
+            return True
+
+        for call, available in zip(pending, flags):
+            outcome = call.process(available)
+            if outcome is not None:
+                self.outcomes[call.unique_key] = outcome
+
+        attempt = max(call.attempt for call in self.calls)
+        if attempt > self.attempt:
+            self.attempt = attempt
+            with self.timer.phase('redis'):
+                update_attempts(self.unique_key, attempt)
+
+        if self.mode == GROUP_CALL_FIRST and self.get_available():
+            return True
+
+        return len(self.outcomes) == len(self.calls)
+
+    def get_available(self):
+        """
+        Returns:
+            list: The sip_user_id of every account that answered.
+        """
+        return [call.sip_user_id for call in self.calls if self.outcomes.get(call.unique_key) == OUTCOME_ACK]
+
+    def finish(self):
+        """
+        Function to finish the call of every account, accounts that are still
+        waiting are cancelled.
+        """
+        for call in self.calls:
+            outcome = self.outcomes.get(call.unique_key)
+            if outcome is None and self.get_available():
+                call.cancel()
+            call.finish(outcome)
+
+        # The group state only exists to cancel the group while it waits.
+        with self.timer.phase('redis'):
+            RedisClusterCache().delete(self.cache_key)
+            unregister_call(self.unique_key)
@@ -1,4 +1,11 @@
-from threading import Thread
+from threading import Lock, Thread
+import time
+from weakref import WeakSet
+
+# Threads started by threaded functions, used to wait for them when the
+# worker stops.
+_threads = WeakSet()
+_threads_lock = Lock()
 
 
 def threaded(fn):
@@ -6,5 +13,29 @@ def threaded(fn):
     Decorator to make a function run in his own thread.
     """
     def wrapper(*args, **kwargs):
-        Thread(target=fn, args=args, kwargs=kwargs).start()
+        thread = Thread(target=fn, args=args, kwargs=kwargs)
+        with _threads_lock:
+            _threads.add(thread)
+        thread.start()
     return wrapper
+
+
+def join_threads(timeout):
+    """
+    Function to wait for the threads started by threaded functions.
+
+    Args:
+        timeout (float): Maximum seconds to wait for all threads.
+
+    Returns:
+        int: The amount of threads still running after the timeout.
+    """
+    deadline = time.time() + timeout
+
+    with _threads_lock:
+        threads = list(_threads)
+
+    for thread in threads:
+        thread.join(max(deadline - time.time(), 0))
+
+    return len([thread for thread in threads if thread.is_alive()])
@@ -0,0 +1,120 @@
+import logging
+import math
+
+from django.conf import settings
+
+from .cache import RedisClusterCache
+from .decorators import threaded
+
+logger = logging.getLogger('django')
+
+# Seconds the model of a device is kept without calls.
+MODEL_TIMEOUT = 30 * 24 * 3600
+
+
+def get_model_key(token):
+    """
+    Function to get the key of the redis hash with the model of a device. The
+    hash has the fields latency (moving average of the round trip time in
+    seconds), answer_rate (moving average of responses in time) and calls.
+    """
+    return 'device_model_{0}'.format(token)
+
+
+class DeviceModel(object):
+    """
+    Class for the response time model of a device. The response time of a
+    device that answers is assumed to be exponentially distributed.
+    """
+    def __init__(self, latency=None, answer_rate=None, calls=None):
+        """
+        Args:
+            latency (string): Moving average of the round trip time.
+            answer_rate (string): Moving average of responses in time.
+            calls (string): Amount of calls in the model.
+        """
+        self.latency = float(latency) if latency else None
+        self.answer_rate = float(answer_rate) if answer_rate else None
+        self.calls = int(calls or 0)
+
+    @property
+    def trained(self):
+        return (
+            self.calls >= settings.EARLY_GIVE_UP_MIN_CALLS and
+            self.latency is not None and
+            self.answer_rate is not None
+        )
+
+    def answer_probability(self, elapsed, deadline):
+        """
+        Function to get the probability the device still answers in time.
+
+        Args:
+            elapsed (float): Seconds since the first push message.
+            deadline (float): Seconds after the first push message at which
+                the call stops waiting.
+
+        Returns:
+            float: The probability the device answers between elapsed and
+                deadline, given it did not answer yet.
+        """
+        if not self.trained:
+            return 1.0
+
+        latency = max(self.latency, 0.001)
+        not_yet = math.exp(-elapsed / latency)
+        in_time = self.answer_rate * (not_yet - math.exp(-deadline / latency))
+        # Either the device will not answer or it answers later.
+        no_answer_yet = 1 - self.answer_rate + self.answer_rate * not_yet
+
+        return in_time / no_answer_yet if no_answer_yet > 0 else 0.0
+
+
+def answer_probability(models, elapsed, deadline):
+    """
+    Function to get the probability one of the devices still answers in time.
+
+    Args:
+        models (list): A DeviceModel per device.
+        elapsed (float): Seconds since the first push message.
+        deadline (float): Seconds after the first push message at which the
+            call stops waiting.
+
+    Returns:
+        float: The probability.
+    """
+    no_answer = 1.0
+    for model in models:
+        no_answer *= 1 - model.answer_probability(elapsed, deadline)
+
+    return 1 - no_answer
+
+
+@threaded
+def record_call(token, answered, latency=None):
+    """
+    Threaded task to add a call to the model of a device.
+
+    Args:
+        token (string): Push token of the device.
+        answered (bool): Whether the device responded in time.
+        latency (float): Round trip time in seconds when the device
+            responded.
+    """
+    try:
+        redis_cache = RedisClusterCache()
+        key = get_model_key(token)
+        model = DeviceModel(*redis_cache.hmget(key, 'latency', 'answer_rate', 'calls'))
+
+        alpha = settings.DEVICE_MODEL_ALPHA
+        values = {
+            'calls': model.calls + 1,
+            'answer_rate': float(answered) if model.answer_rate is None else
+            model.answer_rate + alpha * (float(answered) - model.answer_rate),
+        }
+        if latency is not None:
+            values['latency'] = latency if model.latency is None else model.latency + alpha * (latency - model.latency)
+
+        redis_cache.hmset(key, values, timeout=MODEL_TIMEOUT)
+    except Exception:
+        logger.exception('Failed to update the model of device {0}'.format(token))
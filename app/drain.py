@@ -0,0 +1,94 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .calllog import flush_pending_call_logs
+from .decorators import join_threads
+from .timing import flush_pending_aggregates
+
+logger = logging.getLogger('django')
+
+_draining = threading.Event()
+_active_waits = 0
+_active_waits_condition = threading.Condition()
+
+
+def is_draining():
+    return _draining.is_set()
+
+
+def start_draining():
+    """
+    Function to refuse new incoming calls and fail the health check, while
+    the worker still serves requests so the load balancer and asterisk move
+    calls to other nodes.
+    """
+    if _draining.is_set():
+        return
+
+    _draining.set()
+    logger.info('Draining worker {0}'.format(os.getpid()))
+
+
+def prepare_drain_file():
+    """
+    Function to create DRAIN_FILE, uwsgi monitors it and makes the workers
+    start draining when it is touched (eq. by deploy/run.sh on SIGTERM).
+    """
+    with open(settings.DRAIN_FILE, 'a'):
+        pass
+
+
+def start_wait():
+    """
+    Function to count a call that is waiting for a device, so a draining
+    worker can wait for it.
+    """
+    global _active_waits
+
+    with _active_waits_condition:
+        _active_waits += 1
+
+
+def finish_wait():
+    """
+    Function to count a call that stopped waiting for a device.
+    """
+    global _active_waits
+
+    with _active_waits_condition:
+        _active_waits -= 1
+        _active_waits_condition.notify_all()
+
+
+def drain():
+    """
+    Function to stop a worker gracefully. New incoming calls are refused,
+    waiting calls get at most APP_PUSH_ROUNDTRIP_WAIT to finish, buffered logs
+    are flushed and background tasks (push messages, logging) get
+    DRAIN_TASK_TIMEOUT seconds more.
+    """
+    start_draining()
+    start = time.time()
+
+    deadline = start + settings.APP_PUSH_ROUNDTRIP_WAIT / 1000
+    with _active_waits_condition:
+        while _active_waits and time.time() < deadline:
+            _active_waits_condition.wait(deadline - time.time())
+        unfinished_waits = _active_waits
+
+    flush_pending_aggregates()
+    flush_pending_call_logs()
+    unfinished_tasks = join_threads(settings.DRAIN_TASK_TIMEOUT)
+
+    if unfinished_waits or unfinished_tasks:
+        logger.warning('Worker {0} stopped with {1} waiting calls and {2} background tasks running'.format(
+            os.getpid(),
+            unfinished_waits,
+            unfinished_tasks,
+        ))
+    else:
+        logger.info('Drained worker {0} in {1:.3f} sec'.format(os.getpid(), time.time() - start))
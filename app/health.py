@@ -0,0 +1,183 @@
+from collections import OrderedDict
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .cache import RedisClusterCache
+from .drain import is_draining
+from .models import App, APNS_PLATFORM
+from .warmup import get_warm_up_time, is_warming_up
+
+logger = logging.getLogger('django')
+
+# Results are cached per worker for HEALTH_CACHE_TIMEOUT so load balancer
+# probes do not hit the database and redis on every request.
+_cached_health = None
+_cached_at = 0
+_health_lock = threading.Lock()
+
+
+def check_warm_up():
+    """
+    Function to check if the worker finished warming up.
+
+    Raises:
+        ValueError: When the worker is still warming up.
+    """
+    if is_warming_up():
+        raise ValueError('Worker is warming up')
+
+    if get_warm_up_time() is None:
+        return 'Worker did not warm up'
+
+    return 'Warmed up in {0:.3f} sec'.format(get_warm_up_time())
+
+
+def check_drain():
+    """
+    Function to check if the worker is not draining.
+
+    Raises:
+        ValueError: When the worker is draining.
+    """
+    if is_draining():
+        raise ValueError('Worker is draining')
+
+
+def check_database():
+    """
+    Function to check the database connection.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def check_redis():
+    """
+    Function to check every redis cluster node through the client shared by
+    the worker, so the probe uses the connection pool the calls use.
+
+    Returns:
+        string: The amount of nodes that responded.
+
+    Raises:
+        ValueError: When a node did not respond with PONG.
+    """
+    # The cluster client sends PING to every node.
+    result = RedisClusterCache().ping()
+    failed = [node for node, ok in result.items() if not ok]
+    if failed:
+        raise ValueError('No PONG from: {0}'.format(', '.join(sorted(failed))))
+
+    return '{0} nodes'.format(len(result))
+
+
+def get_missing_push_credentials():
+    """
+    Function to get the apps of which the push credentials are missing.
+
+    Returns:
+        list: The names of the apps.
+    """
+    missing = []
+    for app in App.objects.all():
+        if not app.push_key:
+            missing.append(str(app))
+        elif app.platform == APNS_PLATFORM and not os.path.isfile(os.path.join(settings.CERT_DIR, app.push_key)):
+            missing.append(str(app))
+
+    return missing
+
+
+def check_push_credentials():
+    """
+    Function to check if the push credentials of every app are present. Only
+    the amount of apps is reported because the health check is public.
+
+    Raises:
+        ValueError: When an app has missing credentials.
+    """
+    missing = get_missing_push_credentials()
+    if missing:
+        raise ValueError('Missing push credentials for {0} apps'.format(len(missing)))
+
+
+def check_background_threads():
+    """
+    Function to check if the threads running background tasks (push
+    messages and logging) are not piling up.
+
+    Returns:
+        string: The amount of active threads.
+
+    Raises:
+        ValueError: When there are more threads than HEALTH_MAX_THREADS.
+    """
+    active = threading.active_count()
+    if active > settings.HEALTH_MAX_THREADS:
+        raise ValueError('{0} active threads, maximum is {1}'.format(active, settings.HEALTH_MAX_THREADS))
+
+    return '{0} active threads'.format(active)
+
+
+def _probe(check, *args):
+    """
+    Function to run a check and time it.
+
+    Returns:
+        dict: With the keys ok, latency_ms and detail.
+    """
+    start = time.perf_counter()
+    try:
+        detail = check(*args)
+        ok = True
+    except Exception as e:
+        detail = str(e)
+        ok = False
+
+    return OrderedDict([
+        ('ok', ok),
+        ('latency_ms', round((time.perf_counter() - start) * 1000, 3)),
+        ('detail', detail),
+    ])
+
+
+def get_health():
+    """
+    Function to check all dependencies of the middleware. Push credentials
+    are reported but do not make the node unhealthy because they are the
+    same for every node.
+
+    Returns:
+        dict: With the key healthy and the result per check.
+    """
+    global _cached_health, _cached_at
+
+    with _health_lock:
+        if _cached_health is not None and time.time() - _cached_at < settings.HEALTH_CACHE_TIMEOUT:
+            return _cached_health
+
+        checks = OrderedDict()
+        critical = ['warm_up', 'drain', 'database', 'redis', 'background_threads']
+
+        checks['warm_up'] = _probe(check_warm_up)
+        checks['drain'] = _probe(check_drain)
+        checks['database'] = _probe(check_database)
+        checks['redis'] = _probe(check_redis)
+
+        checks['push_credentials'] = _probe(check_push_credentials)
+        checks['background_threads'] = _probe(check_background_threads)
+
+        healthy = all(checks[name]['ok'] for name in critical)
+        if not healthy:
+            logger.warning('Health check failed: {0}'.format(
+                ', '.join(name for name in critical if not checks[name]['ok'])))
+
+        _cached_health = OrderedDict([('healthy', healthy), ('checks', checks)])
+        _cached_at = time.time()
+
+    return _cached_health
@@ -0,0 +1,293 @@
+import bisect
+from collections import namedtuple, OrderedDict
+import datetime
+import gzip
+import heapq
+import re
+import time
+
+# Lines of middleware.log, eq. 'INFO web-app 2017-01-02 12:00:00,123 <message>'.
+LINE_RE = re.compile(
+    r'^(?P<level>[A-Z]+) (?P<source>\S+) (?P<date>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}) (?P<message>.*)$')
+MESSAGE_RE = re.compile(r'^(?P<unique_key>\S+) \| (?P<text>.*)$')
+# Push messages are logged with the signed unique_key.
+SIGNED_KEY_RE = re.compile(r'^(?P<unique_key>.+):\d+:[\w-]{27}$')
+
+EVENT_RECEIVED = 'received'
+EVENT_WAIT = 'wait'
+EVENT_PUSH = 'push'
+EVENT_RESPONSE = 'response'
+EVENT_OUTCOME = 'outcome'
+
+# Patterns of the logged events of a call with the event they belong to.
+PATTERNS = (
+    (EVENT_RECEIVED, re.compile(
+        r"^Incoming call for SIP:(?P<sip_user_id>\S+) FROM:'(?P<phonenumber>[^/]*)/(?P<caller_id>.*)' "
+        r"\((?P<via>POST|AGI)")),
+    (EVENT_WAIT, re.compile(r"^(?P<platform>\w+) Starting 'wait for it' loop for (?P<devices>\d+) device")),
+    (EVENT_PUSH, re.compile(r"^Sending (?P<service>APNS) '(?P<type>\w+)' message")),
+    (EVENT_PUSH, re.compile(r"^(?P<service>FCM|GCM) '(?P<type>\w+)' message sent")),
+    (EVENT_RESPONSE, re.compile(
+        r'^Device responded(?: to attempt (?P<attempt>\w+))?\. Message round trip-time: (?P<roundtrip>\S+) sec')),
+)
+
+# Phrases of the logged outcomes.
+OUTCOMES = (
+    ('sending ACK', 'ACK'),
+    ('Device not available, sending NAK', 'NAK'),
+    ('did NOT check in on time', 'timeout'),
+    ('Gave up waiting for device', 'give-up'),
+    ('Call cancelled, sending NAK', 'cancelled'),
+    ('Failed to find a device', 'no-device'),
+    ('Shed call', 'shed'),
+)
+
+LogEvent = namedtuple('LogEvent', ['time', 'unique_key', 'kind', 'fields'])
+
+
+class Call(object):
+    """
+    Class with the events of a single call from the log.
+    """
+    def __init__(self, unique_key, start):
+        """
+        Args:
+            unique_key (string): The unique_key of the call.
+            start (float): Timestamp of the first event of the call.
+        """
+        self.unique_key = unique_key
+        self.start = start
+        self.end = None
+        self.sip_user_id = None
+        self.phonenumber = None
+        self.caller_id = None
+        self.platform = None
+        self.devices = None
+        self.pushes = []
+        self.responses = []
+        self.outcome = None
+
+    @property
+    def response_delay(self):
+        """
+        Returns:
+            float: Seconds from receiving the call to the first device
+                response or None without response.
+        """
+        if not self.responses:
+            return None
+        return self.responses[0][0] - self.start
+
+    def add(self, event):
+        """
+        Function to add an event of the call.
+
+        Args:
+            event (LogEvent): The event.
+        """
+        if event.kind == EVENT_RECEIVED:
+            self.sip_user_id = event.fields['sip_user_id']
+            self.phonenumber = event.fields['phonenumber']
+            self.caller_id = event.fields['caller_id']
+        elif event.kind == EVENT_WAIT:
+            self.platform = event.fields['platform'].lower()
+            self.devices = int(event.fields['devices'])
+        elif event.kind == EVENT_PUSH:
+            if event.fields['type'] == 'call':
+                self.pushes.append(event.time)
+        elif event.kind == EVENT_RESPONSE:
+            self.responses.append((event.time, event.fields['attempt'], float(event.fields['roundtrip'])))
+        elif event.kind == EVENT_OUTCOME and self.outcome is None:
+            self.outcome = event.fields['outcome']
+            self.end = event.time
+
+
+def parse_time(value):
+    """
+    Function to parse the time of a log line.
+
+    Args:
+        value (string): The time, eq. '2017-01-02 12:00:00,123'.
+
+    Returns:
+        float: The timestamp.
+    """
+    date = datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S,%f')
+    return time.mktime(date.timetuple()) + date.microsecond / 1e6
+
+
+def parse_line(line):
+    """
+    Function to parse a log line into a call event.
+
+    Args:
+        line (string): Line of middleware.log.
+
+    Returns:
+        LogEvent: The event or None when the line is not a call event.
+    """
+    match = LINE_RE.match(line)
+    if not match:
+        return None
+
+    message = MESSAGE_RE.match(match.group('message'))
+    if not message:
+        return None
+
+    unique_key = message.group('unique_key')
+    signed = SIGNED_KEY_RE.match(unique_key)
+    if signed:
+        unique_key = signed.group('unique_key')
+
+    text = message.group('text')
+    for kind, pattern in PATTERNS:
+        event = pattern.match(text)
+        if event:
+            return LogEvent(parse_time(match.group('date')), unique_key, kind, event.groupdict())
+
+    for phrase, outcome in OUTCOMES:
+        if phrase in text:
+            return LogEvent(parse_time(match.group('date')), unique_key, EVENT_OUTCOME, {'outcome': outcome})
+
+    return None
+
+
+def open_log(path):
+    """
+    Function to open a log file, rotated files may be gzipped.
+
+    Args:
+        path (string): Path of the log file.
+
+    Returns:
+        file: The file opened for reading text.
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+
+def read_file_events(path):
+    """
+    Function to read the call events of a log file.
+
+    Args:
+        path (string): Path of the log file.
+
+    Yields:
+        tuple: The time, the path, the line number and the LogEvent so
+            events of several files can be merged.
+    """
+    with open_log(path) as log_file:
+        for number, line in enumerate(log_file):
+            event = parse_line(line.rstrip('\n'))
+            if event:
+                yield event.time, path, number, event
+
+
+def read_events(paths):
+    """
+    Function to read the call events of several log files (eq. of several
+    nodes) in order of time. Only one line per file is in memory.
+
+    Args:
+        paths (list): Paths of the log files, each in order of time.
+
+    Yields:
+        LogEvent: The events.
+    """
+    for _, _, _, event in heapq.merge(*[read_file_events(path) for path in paths]):
+        yield event
+
+
+def read_calls(events, timeout):
+    """
+    Function to group events by call. A call is done at its outcome or when
+    it had no events for timeout seconds, so only running calls are kept in
+    memory.
+
+    Args:
+        events (iterable): LogEvents in order of time.
+        timeout (float): Seconds after which a call without outcome is done.
+
+    Yields:
+        Call: The calls in the order they are done.
+    """
+    calls = OrderedDict()
+    for event in events:
+        # Calls are ordered by their last event, so the oldest are first.
+        while calls:
+            unique_key, (call, last_time) = next(iter(calls.items()))
+            if event.time - last_time < timeout:
+                break
+            del calls[unique_key]
+            yield call
+
+        call, _ = calls.pop(event.unique_key, (None, None))
+        if call is None:
+            call = Call(event.unique_key, event.time)
+        call.add(event)
+
+        if call.outcome is not None:
+            yield call
+        else:
+            calls[event.unique_key] = (call, event.time)
+
+    for call, _ in calls.values():
+        yield call
+
+
+class Histogram(object):
+    """
+    Class to count values in buckets that grow by 10%, so the distribution
+    of any number of values takes constant memory. Percentiles are accurate
+    to a bucket.
+    """
+    def __init__(self, minimum=0.001, maximum=3600, factor=1.1):
+        """
+        Args:
+            minimum (float): Upper bound of the first bucket.
+            maximum (float): Values above go in the last bucket.
+            factor (float): Growth of the buckets.
+        """
+        self.bounds = [minimum]
+        while self.bounds[-1] < maximum:
+            self.bounds.append(self.bounds[-1] * factor)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = None
+
+    def add(self, value):
+        """
+        Function to count a value.
+
+        Args:
+            value (float): The value.
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def percentile(self, percentile):
+        """
+        Function to get the upper bound of the bucket of a percentile.
+
+        Args:
+            percentile (int): Percentile between 0 and 100.
+
+        Returns:
+            float: The value at the percentile or None without values.
+        """
+        if not self.count:
+            return None
+
+        rank = max(int(round(percentile / 100 * self.count)), 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if index < len(self.bounds):
+                    return min(self.bounds[index], self.maximum)
+                return self.maximum
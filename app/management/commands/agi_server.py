@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.agi import AGIServer
+from app.warmup import warm_up
+
+
+class Command(BaseCommand):
+    """
+    Command to run the FastAGI server for incoming calls from asterisk.
+    """
+    help = 'Run a FastAGI server that handles incoming calls from asterisk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=settings.AGI_SERVER_HOST,
+                            help='Address to listen on.')
+        parser.add_argument('--port', type=int, default=settings.AGI_SERVER_PORT,
+                            help='Port to listen on.')
+        parser.add_argument('--threads', type=int, default=settings.AGI_SERVER_THREADS,
+                            help='Threads for the database and redis calls.')
+
+    def handle(self, *args, **options):
+        warm_up()
+
+        server = AGIServer(options['host'], options['port'], options['threads'])
+        server.serve_forever()
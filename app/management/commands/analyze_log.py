@@ -0,0 +1,146 @@
+from collections import Counter, OrderedDict
+
+from django.core.management.base import BaseCommand
+
+from app.logparse import Histogram, read_calls, read_events
+
+METRICS = OrderedDict([
+    ('first_push', 'Received to first push'),
+    ('response', 'Received to device response'),
+    ('total', 'Received to outcome'),
+])
+
+
+class Command(BaseCommand):
+    """
+    Command to reconstruct the timeline of the calls in middleware.log and
+    report the latency distributions, in constant memory.
+    """
+    help = 'Analyze the call timelines of one or more middleware.log files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+',
+                            help='Log files to analyze (eq. of every node), rotated files may be gzipped.')
+        parser.add_argument('--unique-key', action='append', dest='unique_keys', default=[],
+                            help='Only show the timeline of this call, can be repeated.')
+        parser.add_argument('--calls', action='store_true',
+                            help='Write a latency breakdown per call.')
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Seconds after which a call without outcome is done.')
+
+    def handle(self, *args, **options):
+        outcomes = Counter()
+        pushes = Counter()
+        histograms = {}
+
+        for call in read_calls(read_events(options['paths']), options['timeout']):
+            # Skip events of calls that already ended, eq. late responses.
+            if call.sip_user_id is None:
+                continue
+
+            if options['unique_keys']:
+                if call.unique_key in options['unique_keys']:
+                    self._write_timeline(call)
+                continue
+
+            breakdown = self._get_breakdown(call)
+            if options['calls']:
+                self._write_breakdown(call, breakdown)
+
+            outcomes[call.outcome or 'unknown'] += 1
+            pushes[len(call.pushes)] += 1
+            for metric, value in breakdown.items():
+                if value is not None:
+                    histograms.setdefault((call.platform, metric), Histogram()).add(value)
+
+        if not options['unique_keys']:
+            self._write_report(outcomes, pushes, histograms)
+
+    def _get_breakdown(self, call):
+        """
+        Function to get the latencies of a call.
+
+        Returns:
+            OrderedDict: Seconds by metric, None when the call has no such
+                event.
+        """
+        return OrderedDict([
+            ('first_push', call.pushes[0] - call.start if call.pushes else None),
+            ('response', call.response_delay),
+            ('total', call.end - call.start if call.end else None),
+        ])
+
+    def _write_breakdown(self, call, breakdown):
+        """
+        Function to write a line with the latencies of a call.
+        """
+        self.stdout.write('{0} {1} {2} pushes:{3} {4}'.format(
+            call.unique_key,
+            call.outcome or 'unknown',
+            call.platform or '-',
+            len(call.pushes),
+            ' '.join('{0}:{1}'.format(metric, _format_ms(value)) for metric, value in breakdown.items()),
+        ))
+
+    def _write_timeline(self, call):
+        """
+        Function to write the events of a call relative to its start.
+        """
+        self.stdout.write('{0} SIP:{1} FROM:{2} {3} device(s):{4}'.format(
+            call.unique_key,
+            call.sip_user_id,
+            call.phonenumber,
+            call.platform or '-',
+            call.devices or '-',
+        ))
+
+        events = [(call.start, 'received')]
+        events.extend((push_time, 'push {0}'.format(number)) for number, push_time in enumerate(call.pushes, 1))
+        events.extend(
+            (response_time, 'response to attempt {0}, round trip {1}'.format(attempt or '-', _format_ms(roundtrip)))
+            for response_time, attempt, roundtrip in call.responses
+        )
+        if call.end:
+            events.append((call.end, call.outcome))
+
+        for event_time, description in sorted(events, key=lambda event: event[0]):
+            self.stdout.write('  +{0} {1}'.format(_format_ms(event_time - call.start), description))
+
+    def _write_report(self, outcomes, pushes, histograms):
+        """
+        Function to write the outcomes and the latency distributions per
+        platform.
+        """
+        self.stdout.write('Calls: {0}'.format(sum(outcomes.values())))
+        for outcome, count in outcomes.most_common():
+            self.stdout.write('  {0}: {1}'.format(outcome, count))
+
+        self.stdout.write('Push messages per call:')
+        for count, calls in sorted(pushes.items()):
+            self.stdout.write('  {0}: {1}'.format(count, calls))
+
+        for platform in sorted(set(platform for platform, _ in histograms), key=str):
+            self.stdout.write('Platform {0}:'.format(platform or '-'))
+            for metric, title in METRICS.items():
+                histogram = histograms.get((platform, metric))
+                if not histogram:
+                    continue
+                self.stdout.write('  {0}: count {1} avg {2} p50 {3} p90 {4} p99 {5} max {6}'.format(
+                    title,
+                    histogram.count,
+                    _format_ms(histogram.total / histogram.count),
+                    _format_ms(histogram.percentile(50)),
+                    _format_ms(histogram.percentile(90)),
+                    _format_ms(histogram.percentile(99)),
+                    _format_ms(histogram.maximum),
+                ))
+
+
+def _format_ms(value):
+    """
+    Returns:
+        string: Seconds as msec or - for None.
+    """
+    if value is None:
+        return '-'
+    return '{0:.0f}ms'.format(value * 1000)
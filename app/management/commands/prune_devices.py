@@ -0,0 +1,102 @@
+from collections import Counter
+import datetime
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from app.models import Device
+
+
+class Command(BaseCommand):
+    """
+    Command to delete devices that were not seen for a period, in small
+    batches so the device table stays available for incoming calls.
+    """
+    help = 'Delete devices that did not register for a number of days.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.DEVICE_PRUNE_DAYS,
+                            help='Delete devices not seen for this many days.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Amount of devices deleted per batch.')
+        parser.add_argument('--sleep', type=float, default=0.5,
+                            help='Seconds to sleep between batches.')
+        parser.add_argument('--include-never-seen', action='store_true',
+                            help='Also delete devices without last_seen.')
+        parser.add_argument('--archive',
+                            help='File to append the deleted devices to as json lines.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the devices that would be deleted.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+
+        stale = Q(last_seen__lt=cutoff)
+        if options['include_never_seen']:
+            stale |= Q(last_seen__isnull=True)
+
+        if options['dry_run']:
+            counts = Counter()
+            for row in Device.objects.filter(stale).values('app__app_id', 'app__platform').annotate(count=Count('id')):
+                counts['{0} for {1}'.format(row['app__app_id'], row['app__platform'])] = row['count']
+            self._report(counts, 'Would delete')
+            return
+
+        counts = Counter()
+        last_pk = 0
+        while True:
+            # Lock the batch so a device that registers while the batch is
+            # handled is neither archived nor deleted, and delete exactly
+            # the devices that were archived.
+            with transaction.atomic():
+                batch = list(Device.objects.filter(stale, pk__gt=last_pk).select_related('app').order_by('pk')
+                             .select_for_update()[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                if options['archive']:
+                    self._archive(options['archive'], batch)
+
+                apps = {}
+                for device in batch:
+                    apps.setdefault(device.app, []).append(device.pk)
+
+                for app, pks in apps.items():
+                    deleted, _ = Device.objects.filter(pk__in=pks).delete()
+                    counts[str(app)] += deleted
+
+            time.sleep(options['sleep'])
+
+        self._report(counts, 'Deleted')
+
+    def _archive(self, path, devices):
+        """
+        Function to append devices to the archive file.
+        """
+        with open(path, 'a') as archive_file:
+            for device in devices:
+                archive_file.write(json.dumps({
+                    'sip_user_id': device.sip_user_id,
+                    'name': device.name,
+                    'os_version': device.os_version,
+                    'client_version': device.client_version,
+                    'token': device.token,
+                    'sandbox': device.sandbox,
+                    'last_seen': device.last_seen.isoformat() if device.last_seen else None,
+                    'app': device.app.app_id,
+                    'platform': device.app.platform,
+                }) + '\n')
+
+    def _report(self, counts, action):
+        """
+        Function to write the counts per app.
+        """
+        for app, count in sorted(counts.items()):
+            self.stdout.write('{0} {1} devices of {2}'.format(action, count, app))
+        self.stdout.write('{0} {1} devices in total'.format(action, sum(counts.values())))
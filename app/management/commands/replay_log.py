@@ -0,0 +1,170 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import threading
+import time
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import requests
+
+from app.logparse import read_calls, read_events
+from app.resend import get_percentile
+from app.signing import sign_unique_key
+
+
+class Command(BaseCommand):
+    """
+    Command to replay the incoming calls of middleware.log against a test
+    instance, with devices that respond after the recorded delay.
+    """
+    help = 'Replay the incoming calls of middleware.log against a test instance.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+',
+                            help='Log files to replay, rotated files may be gzipped.')
+        parser.add_argument('--url', default='http://127.0.0.1:8000/',
+                            help='Base url of the test instance.')
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help='Speed up the arrival of the calls, the device responses keep their delay.')
+        parser.add_argument('--limit', type=int,
+                            help='Replay at most this many calls.')
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Seconds after which a logged call without outcome is done.')
+        parser.add_argument('--concurrency', type=int, default=200,
+                            help='Maximum number of calls replayed at the same time.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the calls that would be replayed.')
+
+    def handle(self, *args, **options):
+        self.incoming_url = urljoin(options['url'], 'api/incoming-call/')
+        self.response_url = urljoin(options['url'], 'api/call-response/')
+        self.run_id = int(time.time())
+
+        self.results = Counter()
+        self.durations = []
+        self.lock = threading.Lock()
+
+        first_start = None
+        replay_start = time.time()
+
+        # Calls beyond the concurrency wait in the queue of the pool, the
+        # pool only holds the calls that did not finish yet.
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for call in self._read_calls(options):
+                if first_start is None:
+                    first_start = call.start
+
+                if options['dry_run']:
+                    self.results[call.outcome] += 1
+                    continue
+
+                # Keep the arrival times of the log, sped up.
+                delay = replay_start + (call.start - first_start) / options['speed'] - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+                pool.submit(self._replay_call, call)
+
+        self._report(time.time() - replay_start)
+
+    def _read_calls(self, options):
+        """
+        Function to get the logged calls in order of arrival.
+
+        Yields:
+            Call: Calls with their incoming call request.
+        """
+        count = 0
+        latest = 0
+        pending = []
+        for number, call in enumerate(read_calls(read_events(options['paths']), options['timeout'])):
+            # Calls without the incoming call line, eq. late responses.
+            if call.sip_user_id is None:
+                continue
+
+            # Calls are done in order of their outcome, replay them in order
+            # of arrival. A call is done within the timeout after it arrived.
+            heapq.heappush(pending, (call.start, number, call))
+            latest = max(latest, call.start)
+            while pending and latest - pending[0][0] >= options['timeout']:
+                yield heapq.heappop(pending)[2]
+                count += 1
+                if options['limit'] and count >= options['limit']:
+                    return
+
+        while pending and not (options['limit'] and count >= options['limit']):
+            yield heapq.heappop(pending)[2]
+            count += 1
+
+    def _replay_call(self, call):
+        """
+        Function to post the incoming call and the device response.
+
+        Args:
+            call (Call): The logged call.
+        """
+        call_id = '{0}-replay-{1}'.format(call.unique_key, self.run_id)
+        start = time.time()
+
+        device = None
+        if call.response_delay is not None and call.outcome in ('ACK', 'NAK'):
+            # The key in the push message is signed with the time the call
+            # stops waiting, the margin covers the difference with start.
+            unique_key = sign_unique_key(call_id, start + settings.APP_PUSH_ROUNDTRIP_WAIT / 1000)
+            device = threading.Timer(call.response_delay, self._respond, args=(unique_key, call.outcome == 'ACK'))
+            device.start()
+
+        try:
+            response = requests.post(self.incoming_url, data={
+                'sip_user_id': call.sip_user_id,
+                'phonenumber': call.phonenumber,
+                'caller_id': call.caller_id,
+                'call_id': call_id,
+            })
+            result = response.text
+        except requests.RequestException as e:
+            result = type(e).__name__
+        duration = time.time() - start
+
+        if device:
+            device.cancel()
+
+        with self.lock:
+            self.results['{0} -> {1}'.format(call.outcome, result)] += 1
+            self.durations.append(duration)
+
+    def _respond(self, unique_key, available):
+        """
+        Function to respond to the call like a device.
+
+        Args:
+            unique_key (string): The unique_key of the push message.
+            available (bool): Whether the device accepts the call.
+        """
+        try:
+            requests.post(self.response_url, data={
+                'unique_key': unique_key,
+                'message_start_time': time.time(),
+                'available': available,
+            })
+        except requests.RequestException:
+            pass
+
+    def _report(self, run_time):
+        """
+        Function to write the logged outcome against the replayed result and
+        the duration of the incoming call requests.
+        """
+        for result, count in sorted(self.results.items()):
+            self.stdout.write('{0}: {1}'.format(result, count))
+
+        durations = sorted(self.durations)
+        self.stdout.write('Replayed {0} calls in {1:.1f} sec'.format(sum(self.results.values()), run_time))
+        if durations:
+            self.stdout.write('Incoming call duration p50: {0:.3f} p95: {1:.3f} max: {2:.3f} sec'.format(
+                get_percentile(durations, 50),
+                get_percentile(durations, 95),
+                durations[-1],
+            ))
@@ -0,0 +1,177 @@
+import hashlib
+import logging
+import math
+from threading import Lock
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .cache import RedisClusterCache
+from .decorators import threaded
+from .models import Device
+
+logger = logging.getLogger('django')
+
+# Sorted set with the sip accounts that registered a device, scored by the
+# registration time. Covers the accounts registered after a worker built its
+# filter.
+RECENT_DEVICES_KEY = 'recent_devices'
+
+_filter = None
+_built_at = 0
+_rebuild_started_at = 0
+_build_lock = Lock()
+
+
+class BloomFilter(object):
+    """
+    Class for a bloom filter, a set that can tell for sure that a value was
+    never added but may give false positives.
+    """
+    def __init__(self, capacity, error_rate):
+        """
+        Args:
+            capacity (int): Expected amount of values.
+            error_rate (float): Expected rate of false positives at capacity.
+        """
+        capacity = max(capacity, 1)
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        """
+        Get the bit positions of a value with double hashing of its md5.
+        """
+        digest = hashlib.md5(str(value).encode('utf-8')).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, value):
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(value))
+
+
+def build_filter():
+    """
+    Function to build the filter of this worker from the database.
+    """
+    global _filter, _built_at
+
+    with _build_lock:
+        started_at = time.time()
+        sip_user_ids = list(Device.objects.values_list('sip_user_id', flat=True).distinct())
+
+        # Leave room for the accounts registered until the next rebuild.
+        membership = BloomFilter(int(len(sip_user_ids) * 1.25) + 1000, settings.MEMBERSHIP_FILTER_ERROR_RATE)
+        for sip_user_id in sip_user_ids:
+            membership.add(sip_user_id)
+
+        _filter = membership
+        _built_at = started_at
+
+    # Registrations older than two rebuilds are in every filter.
+    RedisClusterCache().zremrangebyscore(
+        RECENT_DEVICES_KEY,
+        '-inf',
+        started_at - 2 * settings.MEMBERSHIP_FILTER_REBUILD_INTERVAL,
+    )
+
+    logger.info('Built membership filter of {0} sip accounts in {1:.3f} sec'.format(
+        len(sip_user_ids),
+        time.time() - started_at,
+    ))
+
+
+@threaded
+def rebuild_filter():
+    """
+    Threaded task to rebuild the filter, so deleted devices are removed.
+    """
+    try:
+        build_filter()
+    except Exception:
+        logger.exception('Failed to rebuild membership filter')
+    finally:
+        connection.close()
+
+
+def add_device(sip_user_id):
+    """
+    Function to add a sip account that registered a device to the filter of
+    every worker.
+
+    Args:
+        sip_user_id (string): The sip account of the device.
+    """
+    sip_user_id = str(sip_user_id)
+    try:
+        RedisClusterCache().zadd(RECENT_DEVICES_KEY, time.time(), sip_user_id)
+    except Exception:
+        logger.exception('Failed to add SIP_USER_ID {0} to recent devices'.format(sip_user_id))
+
+    if _filter is not None:
+        _filter.add(sip_user_id)
+
+
+def might_have_devices(sip_user_id):
+    """
+    Function to check if a sip account may have devices. Accounts that are
+    not in the filter are checked in redis, for accounts registered after the
+    filter was built. Without a filter or with a filter older than the
+    registrations kept in redis every account may have devices.
+
+    Args:
+        sip_user_id (string): The sip account.
+
+    Returns:
+        bool: False when the account has no devices for sure.
+    """
+    global _rebuild_started_at
+
+    if not settings.MEMBERSHIP_FILTER_ENABLED or _filter is None:
+        return True
+
+    now = time.time()
+    interval = settings.MEMBERSHIP_FILTER_REBUILD_INTERVAL
+    if now - _built_at > interval and now - _rebuild_started_at > interval:
+        # Start a single rebuild, the current filter is used meanwhile.
+        _rebuild_started_at = now
+        rebuild_filter()
+
+    if now - _built_at > 2 * interval:
+        # Other workers trim the registrations older than two rebuilds, an
+        # account registered since this filter was built may be missing
+        # from both.
+        return True
+
+    sip_user_id = str(sip_user_id)
+    if sip_user_id in _filter:
+        return True
+
+    try:
+        registered = RedisClusterCache().zscore(RECENT_DEVICES_KEY, sip_user_id) is not None
+    except Exception:
+        logger.exception('Failed to check recent devices for SIP_USER_ID {0}'.format(sip_user_id))
+        return True
+
+    if registered:
+        _filter.add(sip_user_id)
+
+    return registered
+
+
+def reset_filter():
+    """
+    Function to drop the filter of this worker, every account may have
+    devices until it is built again.
+    """
+    global _filter, _built_at, _rebuild_started_at
+    _filter = None
+    _built_at = 0
+    _rebuild_started_at = 0
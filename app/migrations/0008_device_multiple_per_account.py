@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def set_token_hash(apps, schema_editor):
+    """
+    Fill the token_hash of the existing devices, see app.models.get_token_hash.
+    """
+    Device = apps.get_model('app', 'Device')
+    for device in Device.objects.all():
+        device.token_hash = hashlib.sha256(
+            '{0}:{1}'.format(device.sip_user_id, device.token).encode('utf-8')).hexdigest()
+        device.save(update_fields=['token_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_squashed_0007_auto_20160701_0926'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='device',
+            name='sip_user_id',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='token_hash',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(set_token_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='device',
+            name='token_hash',
+            field=models.CharField(editable=False, max_length=64, unique=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_device_multiple_per_account'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='responselog',
+            name='attempt',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='responselog',
+            name='attempt_latency',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='responselog',
+            name='client_roundtrip_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_responselog_attempt_timing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallLog',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unique_key', models.CharField(max_length=255)),
+                ('outcome', models.CharField(db_index=True, max_length=16)),
+                ('platform', models.CharField(blank=True, choices=[('apns', 'Apple Push Notifications'), ('gcm', 'Google Cloud Messaging'), ('android', 'Android')], max_length=10, null=True)),
+                ('app_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('client_version', models.CharField(blank=True, max_length=255, null=True)),
+                ('devices', models.PositiveSmallIntegerField(default=0)),
+                ('pushes', models.PositiveSmallIntegerField(default=0)),
+                ('push_latency', models.FloatField(blank=True, null=True)),
+                ('wait_time', models.FloatField(default=0)),
+                ('date', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
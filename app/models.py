@@ -1,4 +1,6 @@
-from django.db import models
+import hashlib
+
+from django.db import connections, models
 
 APNS_PLATFORM = 'apns'
 GCM_PLATFORM = 'gcm'
@@ -26,28 +28,133 @@ class App(models.Model):
         unique_together = ('app_id', 'platform')
 
 
+def get_token_hash(sip_user_id, token):
+    """
+    Function to get the hash of the sip_user_id and token of a device. A
+    unique index on both columns is too long for InnoDB (767 bytes), so the
+    hash is unique instead.
+
+    Args:
+        sip_user_id (string): The sip_user_id of the device.
+        token (string): The push token of the device.
+
+    Returns:
+        string: The sha256 hex digest.
+    """
+    return hashlib.sha256('{0}:{1}'.format(sip_user_id, token).encode('utf-8')).hexdigest()
+
+
+class DeviceManager(models.Manager):
+    """
+    Manager for the Device model.
+    """
+    def upsert(self, sip_user_id, token, **fields):
+        """
+        Function to create the device of a sip_user_id and token or update it
+        when it exists, in a single atomic statement so concurrent
+        registrations do not fail on the unique sip_user_id and token.
+
+        Args:
+            sip_user_id (string): The sip_user_id of the device.
+            token (string): The push token of the device.
+            **fields: Values by field attname (eq. app_id) to store.
+
+        Returns:
+            int: The affected rows, on MySQL 1 for an insert and 2 for an
+                update.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+
+        fields['sip_user_id'] = sip_user_id
+        fields['token'] = token
+        fields['token_hash'] = get_token_hash(sip_user_id, token)
+        names = sorted(fields)
+        columns = [opts.get_field(name).column for name in names]
+        values = [opts.get_field(name).get_db_prep_save(fields[name], connection) for name in names]
+
+        update_columns = [column for column in columns if column not in ('sip_user_id', 'token', 'token_hash')]
+        if connection.vendor == 'mysql':
+            update = 'ON DUPLICATE KEY UPDATE {0}'.format(
+                ', '.join('{0} = VALUES({0})'.format(qn(column)) for column in update_columns))
+        else:
+            update = 'ON CONFLICT ({0}) DO UPDATE SET {1}'.format(
+                qn('token_hash'),
+                ', '.join('{0} = excluded.{0}'.format(qn(column)) for column in update_columns))
+
+        sql = 'INSERT INTO {0} ({1}) VALUES ({2}) {3}'.format(
+            qn(opts.db_table),
+            ', '.join(qn(column) for column in columns),
+            ', '.join(['%s'] * len(columns)),
+            update,
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, values)
+            return cursor.rowcount
+
+
 class Device(models.Model):
     """
-    Model for all device who register at the middleware.
+    Model for all device who register at the middleware. A sip account can
+    have up to MAX_DEVICES_PER_ACCOUNT devices.
     """
     name = models.CharField(max_length=255, blank=True, null=True)
-    sip_user_id = models.CharField(max_length=255, unique=True)
+    sip_user_id = models.CharField(max_length=255, db_index=True)
     os_version = models.CharField(max_length=255, blank=True, null=True)
     client_version = models.CharField(max_length=255, blank=True, null=True)
     token = models.CharField(max_length=250)
+    # Unique per sip_user_id and token, see get_token_hash.
+    token_hash = models.CharField(max_length=64, unique=True, editable=False)
     sandbox = models.BooleanField(default=False)
     last_seen = models.DateTimeField(blank=True, null=True)
     app = models.ForeignKey(App)
 
+    objects = DeviceManager()
+
     def __str__(self):
         return '{0} - {1}'.format(self.sip_user_id, self.name)
 
+    def save(self, *args, **kwargs):
+        self.token_hash = get_token_hash(self.sip_user_id, self.token)
+        super(Device, self).save(*args, **kwargs)
+
 
 class ResponseLog(models.Model):
     """
     Model for logging info about the device response.
     """
     platform = models.CharField(choices=PLATFORM_CHOICES, max_length=10)
+    # Seconds from the first push message to the response.
     roundtrip_time = models.FloatField()
     available = models.BooleanField()
     date = models.DateTimeField(auto_now_add=True)
+    # Push attempt that woke the device and seconds from its push message to
+    # the response.
+    attempt = models.PositiveSmallIntegerField(null=True, blank=True)
+    attempt_latency = models.FloatField(null=True, blank=True)
+    # Round trip time based on the message_start_time echoed by the device.
+    client_roundtrip_time = models.FloatField(null=True, blank=True)
+
+
+class CallLog(models.Model):
+    """
+    Model for logging the outcome of every incoming call, also when no
+    device responded.
+    """
+    unique_key = models.CharField(max_length=255)
+    # ACK, NAK, timeout, cancelled, give-up, no-device, shed or error.
+    outcome = models.CharField(max_length=16, db_index=True)
+    # Platform, app and client version of the most recently seen device.
+    platform = models.CharField(choices=PLATFORM_CHOICES, max_length=10, null=True, blank=True)
+    app_id = models.CharField(max_length=255, null=True, blank=True)
+    client_version = models.CharField(max_length=255, null=True, blank=True)
+    devices = models.PositiveSmallIntegerField(default=0)
+    # Push messages sent to all devices together.
+    pushes = models.PositiveSmallIntegerField(default=0)
+    # Average seconds it took to hand a push message to the push service.
+    push_latency = models.FloatField(null=True, blank=True)
+    # Seconds the call waited for the devices.
+    wait_time = models.FloatField(default=0)
+    date = models.DateTimeField(auto_now_add=True, db_index=True)
@@ -0,0 +1,148 @@
+from collections import Counter
+import datetime
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger('django')
+
+
+class SamplingProfiler(object):
+    """
+    Class that samples the stacks of all threads of this worker for a
+    period of time. Nothing runs until a profile is started, so the
+    profiler costs nothing when it is not used.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.output_file = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, duration):
+        """
+        Function to start sampling in a background thread.
+
+        Args:
+            duration (int): Seconds to sample.
+
+        Returns:
+            string: Path of the output file or None when already running.
+        """
+        with self.lock:
+            if self.running:
+                return None
+
+            self.output_file = os.path.join(settings.LOGGING_DIR, 'profile-{0}-{1}.folded'.format(
+                os.getpid(),
+                datetime.datetime.now().strftime('%Y%m%d-%H%M%S'),
+            ))
+            self.thread = threading.Thread(target=self._run, args=(duration, self.output_file), name='profiler')
+            self.thread.daemon = True
+            self.thread.start()
+
+        logger.info('Started profiling worker {0} for {1} sec'.format(os.getpid(), duration))
+        return self.output_file
+
+    def _run(self, duration, output_file):
+        """
+        Function to collect stack samples and write them in the collapsed
+        stack format used by flamegraph.pl and speedscope.
+        """
+        interval = settings.PROFILER_INTERVAL / 1000
+        own_ident = threading.get_ident()
+        stacks = Counter()
+        thread_names = {}
+
+        stop_time = time.time() + duration
+        while time.time() < stop_time:
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append('{0} ({1}:{2})'.format(code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+
+                if ident not in thread_names:
+                    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(thread_names.get(ident, str(ident)))
+
+                stacks[';'.join(reversed(stack))] += 1
+
+            time.sleep(interval)
+
+        try:
+            with open(output_file, 'w') as profile_file:
+                for stack, count in stacks.most_common():
+                    profile_file.write('{0} {1}\n'.format(stack, count))
+        except Exception:
+            logger.exception('Failed to write profile to {0}'.format(output_file))
+        else:
+            logger.info('Wrote {0} samples of worker {1} to {2}'.format(
+                sum(stacks.values()),
+                os.getpid(),
+                output_file,
+            ))
+
+
+profiler = SamplingProfiler()
+
+# Set by the signal handler. The handler runs in the thread it interrupted,
+# so it can not take the lock of the profiler, another thread starts it.
+_profile_requested = threading.Event()
+
+
+def start_profiling(duration=None):
+    """
+    Function to start the profiler of this worker.
+
+    Args:
+        duration (int): Seconds to sample, capped at PROFILER_MAX_DURATION.
+
+    Returns:
+        string: Path of the output file or None when already running.
+    """
+    if duration is None:
+        duration = settings.PROFILER_DURATION
+
+    return profiler.start(min(duration, settings.PROFILER_MAX_DURATION))
+
+
+def _wait_for_signal():
+    """
+    Function to start the profiler every time PROFILER_SIGNAL is received.
+    """
+    while True:
+        _profile_requested.wait()
+        _profile_requested.clear()
+        try:
+            start_profiling()
+        except Exception:
+            logger.exception('Failed to start profiling worker {0}'.format(os.getpid()))
+
+
+def install_signal_handler():
+    """
+    Function to start the profiler when the worker receives PROFILER_SIGNAL,
+    eq. `kill -USR2 <worker pid>`. Threads do not survive a fork, so this
+    runs in every worker after it is forked.
+    """
+    if not settings.PROFILER_SIGNAL:
+        return
+
+    thread = threading.Thread(target=_wait_for_signal, name='profiler-signal')
+    thread.daemon = True
+    thread.start()
+
+    signal.signal(getattr(signal, settings.PROFILER_SIGNAL), lambda signum, frame: _profile_requested.set())
@@ -18,6 +18,7 @@ logger = logging.getLogger('django')
 
 TYPE_CALL = 'call'
 TYPE_MESSAGE = 'message'
+TYPE_CANCEL = 'cancel'
 
 
 def send_call_message(device, unique_key, phonenumber, caller_id, attempt):
@@ -30,6 +31,9 @@ def send_call_message(device, unique_key, phonenumber, caller_id, attempt):
         phonenumber (string): Phonenumber that is calling.
         caller_id (string): ID of the caller.
         attempt (int): The amount of attempts made.
+
+    Returns:
+        bool: True when the push service accepted the message.
     """
     data = {
         'unique_key': unique_key,
@@ -38,13 +42,35 @@ def send_call_message(device, unique_key, phonenumber, caller_id, attempt):
         'attempt': attempt,
     }
     if device.app.platform == APNS_PLATFORM:
-        send_apns_message(device, device.app, TYPE_CALL, data)
+        return send_apns_message(device, device.app, TYPE_CALL, data)
+    elif device.app.platform == GCM_PLATFORM:
+        return send_gcm_message(device, device.app, TYPE_CALL, data)
+    elif device.app.platform == ANDROID_PLATFORM:
+        return send_fcm_message(device, device.app, TYPE_CALL, data)
+
+    logger.warning('{0} | Trying to sent \'call\' notification to unknown platform:{1} device:{2}'.format(
+        unique_key, device.app.platform, device.token))
+    return False
+
+
+def send_cancel_message(device, unique_key):
+    """
+    Function to send the push notification that tells a device to stop
+    ringing, eq. when another device answered the call.
+
+    Args:
+        device (Device): A Device object.
+        unique_key (string): String with the unique_key of the call.
+    """
+    data = {'unique_key': unique_key}
+    if device.app.platform == APNS_PLATFORM:
+        send_apns_message(device, device.app, TYPE_CANCEL, data)
     elif device.app.platform == GCM_PLATFORM:
-        send_gcm_message(device, device.app, TYPE_CALL, data)
+        send_gcm_message(device, device.app, TYPE_CANCEL, data)
     elif device.app.platform == ANDROID_PLATFORM:
-        send_fcm_message(device, device.app, TYPE_CALL, data)
+        send_fcm_message(device, device.app, TYPE_CANCEL, data)
     else:
-        logger.warning('{0} | Trying to sent \'call\' notification to unknown platform:{1} device:{2}'.format(
+        logger.warning('{0} | Trying to sent \'cancel\' notification to unknown platform:{1} device:{2}'.format(
             unique_key, device.app.platform, device.token))
 
 
@@ -100,6 +126,25 @@ def get_call_push_payload(unique_key, phonenumber, caller_id, attempt):
     return payload
 
 
+def get_cancel_push_payload(unique_key):
+    """
+    Function to create a dict used in the cancel push notification.
+
+    Args:
+        unique_key (string): The unique_key of the cancelled call.
+
+    Returns:
+        dict: A dictionary with the following keys:
+                type
+                unique_key
+    """
+    payload = {
+        'type': TYPE_CANCEL,
+        'unique_key': unique_key,
+    }
+    return payload
+
+
 def get_message_push_payload(message):
     """
     Function to create a dict used in the message push notification.
@@ -122,6 +167,9 @@ def get_message_push_payload(message):
 def send_apns_message(device, app, message_type, data=None):
     """
     Send an Apple Push Notification message.
+
+    Returns:
+        bool: True when APNS accepted the message.
     """
     token_list = [device.token]
     unique_key = device.token
@@ -136,6 +184,9 @@ def send_apns_message(device, app, message_type, data=None):
         ))
     elif message_type == TYPE_MESSAGE:
         message = Message(token_list, payload=get_message_push_payload(data['message']))
+    elif message_type == TYPE_CANCEL:
+        unique_key = data['unique_key']
+        message = Message(token_list, payload=get_cancel_push_payload(unique_key))
     else:
         logger.warning('{0} | TRYING TO SENT MESSAGE OF UNKNOWN TYPE: {1}', unique_key, message_type)
 
@@ -180,10 +231,17 @@ def send_apns_message(device, app, message_type, data=None):
             # Repeat with retry_message or reschedule your task.
             res.retry()
 
+        return device.token not in res.failed and not res.errors
+
+    return False
+
 
 def send_fcm_message(device, app, message_type, data=None):
     """
     Function for sending a push message using firebase.
+
+    Returns:
+        bool: True when firebase accepted the message.
     """
     registration_id = device.token
     unique_key = device.token
@@ -197,6 +255,9 @@ def send_fcm_message(device, app, message_type, data=None):
         )
     elif message_type == TYPE_MESSAGE:
         message = get_message_push_payload(data['message'])
+    elif message_type == TYPE_CANCEL:
+        unique_key = data['unique_key']
+        message = get_cancel_push_payload(unique_key)
     else:
         logger.warning('{0} | Trying to sent message of unknown type: {1}'.format(unique_key, message_type))
 
@@ -227,10 +288,17 @@ def send_fcm_message(device, app, message_type, data=None):
         if result.get('canonical_ids'):
             logger.warning('%s | Should replace device token %s' % (unique_key, registration_id))
 
+        return bool(result.get('success'))
+
+    return False
+
 
 def send_gcm_message(device, app, message_type, data=None):
     """
     Send a Google Cloud Messaging message.
+
+    Returns:
+        bool: True when GCM accepted the message.
     """
     token_list = [device.token, ]
     unique_key = device.token
@@ -246,6 +314,9 @@ def send_gcm_message(device, app, message_type, data=None):
         )
     elif message_type == TYPE_MESSAGE:
         message = get_message_push_payload(data['message'])
+    elif message_type == TYPE_CANCEL:
+        unique_key = data['unique_key']
+        message = get_cancel_push_payload(unique_key)
     else:
         logger.warning('{0} | Trying to sent message of unknown type: {1}'.format(unique_key, message_type))
 
@@ -284,6 +355,8 @@ def send_gcm_message(device, app, message_type, data=None):
                 logger.warning(
                     '%s | Should remove %s because %s' % (unique_key, reg_id, err_code))
 
+        return bool(success)
+
     except GCMAuthenticationException:
         # Stop and fix your settings.
         logger.error('{0} | Our Google API key was rejected!!!'.format(unique_key))
@@ -293,3 +366,5 @@ def send_gcm_message(device, app, message_type, data=None):
         logger.error('{0} | Invalid message/option or invalid GCM response'.format(unique_key))
     except Exception:
         logger.exception('{0} | Error sending GCM message'.format(unique_key))
+
+    return False
@@ -0,0 +1,206 @@
+from collections import OrderedDict
+import logging
+import os
+import socket
+import time
+
+from django.conf import settings
+
+from .cache import RedisClusterCache
+
+logger = logging.getLogger('django')
+
+# Hash with the nodes that registered calls, with the last time a worker of
+# the node added it. The calls of a node are in their own sorted set, see
+# _node_key, so registering a call does not hit a single redis cluster slot.
+INFLIGHT_NODES_KEY = 'inflight_nodes'
+
+# Nodes without calls for this many ttls are removed from INFLIGHT_NODES_KEY.
+INFLIGHT_NODE_TIMEOUT = 10
+
+# Hash with the amount of calls shed per node, see app/admission.py.
+SHED_KEY = 'shed_calls'
+
+NODE = socket.gethostname()
+
+# Time this worker last added its node to INFLIGHT_NODES_KEY.
+_node_added_at = 0
+
+
+def _call_key(unique_key):
+    return 'inflight_{0}'.format(unique_key)
+
+
+def _node_key(node):
+    """
+    Function to get the key of the sorted set with the unique_key of every
+    call in a wait loop on a node, scored by the start time of the call. The
+    details are stored in a hash per call.
+    """
+    return 'inflight_calls_{0}'.format(node)
+
+
+def _ttl():
+    """
+    Function to get the time a call stays in the registry when it is not
+    removed, eq. when a worker is killed during the wait loop.
+    """
+    return int(settings.APP_PUSH_ROUNDTRIP_WAIT / 1000 + settings.INFLIGHT_TTL_MARGIN)
+
+
+def register_call(unique_key, sip_user_id, platform):
+    """
+    Function to add a call to the in-flight registry when it enters the wait
+    loop. Only register requests that hold a worker, once per request, so
+    the calls of a node are its busy workers.
+
+    Args:
+        unique_key (string): The unique_key of the call.
+        sip_user_id (string): The sip account that is called.
+        platform (string): Platform of the device.
+    """
+    global _node_added_at
+
+    now = time.time()
+    # The list of nodes is shared by all nodes, write it once per ttl.
+    add_node = now - _node_added_at > _ttl()
+    try:
+        pipe = RedisClusterCache().pipeline()
+        pipe.hmset(_call_key(unique_key), {
+            'sip_user_id': sip_user_id,
+            'platform': platform,
+            'start_time': now,
+            'attempts': 1,
+            'node': NODE,
+            'pid': os.getpid(),
+        })
+        pipe.expire(_call_key(unique_key), _ttl())
+        pipe.zadd(_node_key(NODE), now, unique_key)
+        if add_node:
+            pipe.hset(INFLIGHT_NODES_KEY, NODE, now)
+        pipe.execute()
+        if add_node:
+            _node_added_at = now
+    except Exception:
+        logger.exception('{0} | Failed to register in-flight call'.format(unique_key))
+
+
+def update_attempts(unique_key, attempt):
+    """
+    Function to update the amount of push attempts of a call.
+
+    Args:
+        unique_key (string): The unique_key of the call.
+        attempt (int): The amount of attempts made.
+    """
+    try:
+        RedisClusterCache().hset(_call_key(unique_key), 'attempts', attempt)
+    except Exception:
+        logger.exception('{0} | Failed to update in-flight call'.format(unique_key))
+
+
+def unregister_call(unique_key, node=None):
+    """
+    Function to remove a call from the in-flight registry when it leaves the
+    wait loop.
+
+    Args:
+        unique_key (string): The unique_key of the call.
+        node (string): The node that registered the call, this node when
+            omitted.
+    """
+    try:
+        pipe = RedisClusterCache().pipeline()
+        pipe.zrem(_node_key(node or NODE), unique_key)
+        pipe.delete(_call_key(unique_key))
+        pipe.execute()
+    except Exception:
+        logger.exception('{0} | Failed to unregister in-flight call'.format(unique_key))
+
+
+def get_inflight_calls():
+    """
+    Function to get all calls that are currently in a wait loop on any node.
+    Calls older than the ttl are removed from the registry first, nodes
+    without calls for INFLIGHT_NODE_TIMEOUT ttls are forgotten.
+
+    Returns:
+        list: A dict with the details per call, oldest call first.
+    """
+    redis_cache = RedisClusterCache()
+    now = time.time()
+
+    nodes = redis_cache.hgetall(INFLIGHT_NODES_KEY)
+
+    pipe = redis_cache.pipeline()
+    for node in nodes:
+        pipe.zremrangebyscore(_node_key(node), '-inf', now - _ttl())
+        pipe.zrange(_node_key(node), 0, -1, withscores=True)
+    results = pipe.execute() if nodes else []
+
+    members = []
+    for (node, added_at), node_calls in zip(nodes.items(), results[1::2]):
+        if not node_calls and now - float(added_at) > INFLIGHT_NODE_TIMEOUT * _ttl():
+            redis_cache.hdel(INFLIGHT_NODES_KEY, node)
+        members.extend(node_calls)
+    unique_keys = [unique_key for unique_key, _ in sorted(members, key=lambda member: member[1])]
+
+    pipe = redis_cache.pipeline()
+    for unique_key in unique_keys:
+        pipe.hgetall(_call_key(unique_key))
+
+    calls = []
+    for unique_key, details in zip(unique_keys, pipe.execute() if unique_keys else []):
+        if not details:
+            continue
+        calls.append({
+            'unique_key': unique_key,
+            'sip_user_id': details.get('sip_user_id'),
+            'platform': details.get('platform'),
+            'start_time': float(details.get('start_time', now)),
+            'age': now - float(details.get('start_time', now)),
+            'attempts': int(details.get('attempts', 1)),
+            'node': details.get('node'),
+            'pid': details.get('pid'),
+        })
+
+    return calls
+
+
+def get_inflight_summary(calls=None):
+    """
+    Function to summarise the in-flight calls per platform and per node,
+    with the calls shed per node.
+
+    Args:
+        calls (list): Calls from get_inflight_calls, fetched when omitted.
+
+    Returns:
+        dict: Totals, counts per platform and the worker usage per node.
+    """
+    if calls is None:
+        calls = get_inflight_calls()
+
+    platforms = {}
+    nodes = {}
+    for call in calls:
+        platforms[call['platform']] = platforms.get(call['platform'], 0) + 1
+        nodes[call['node']] = nodes.get(call['node'], 0) + 1
+
+    shed = {node: int(count) for node, count in RedisClusterCache().hgetall(SHED_KEY).items()}
+    for node in shed:
+        nodes.setdefault(node, 0)
+
+    return OrderedDict([
+        ('total', len(calls)),
+        ('oldest_age', max([call['age'] for call in calls]) if calls else None),
+        ('platforms', platforms),
+        ('nodes', OrderedDict(
+            (node, {
+                'waiting': count,
+                'workers': settings.WORKERS_PER_NODE,
+                'usage': count / settings.WORKERS_PER_NODE,
+                'shed': shed.get(node, 0),
+            }) for node, count in sorted(nodes.items())
+        )),
+    ])
@@ -0,0 +1,149 @@
+import datetime
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import RedisClusterCache
+from .decorators import threaded
+from .models import PLATFORM_CHOICES, ResponseLog
+
+logger = logging.getLogger('django')
+
+# Hash with the resend interval in seconds per platform, shared by the
+# workers so only one of them queries the response log per refresh.
+RESEND_INTERVALS_KEY = 'resend_intervals'
+
+_intervals = {}
+_refreshed_at = 0
+
+
+def get_percentile(values, percentile):
+    """
+    Function to get a percentile with the nearest rank method.
+
+    Args:
+        values (list): Sorted values.
+        percentile (int): Percentile between 0 and 100.
+
+    Returns:
+        float: The value at the percentile or None without values.
+    """
+    if not values:
+        return None
+
+    rank = max(int(round(percentile / 100 * len(values))), 1)
+    return values[rank - 1]
+
+
+def calculate_resend_interval(platform):
+    """
+    Function to calculate the resend interval of a platform from the recent
+    round trip times in the response log. A push message is resent when most
+    devices (ADAPTIVE_RESEND_PERCENTILE) would have responded to it, so the
+    time from the push message that woke the device is used. Responses to a
+    resend would otherwise count the resend interval as well. Only devices
+    that answered in time are counted.
+
+    Args:
+        platform (string): Platform of the devices.
+
+    Returns:
+        float: The resend interval in seconds or None when there are not
+            enough responses.
+    """
+    since = timezone.now() - datetime.timedelta(seconds=settings.ADAPTIVE_RESEND_WINDOW)
+    # Responses logged without send times only have the round trip time of
+    # the message echoed by the device. Declines and late responses do not
+    # tell when a resend would have woken a device that answers in time.
+    roundtrip_times = sorted(ResponseLog.objects.filter(
+        platform=platform,
+        date__gte=since,
+        available=True,
+        roundtrip_time__lte=settings.APP_PUSH_ROUNDTRIP_WAIT / 1000,
+    ).annotate(
+        latency=Coalesce('attempt_latency', 'roundtrip_time'),
+    ).order_by('-date').values_list('latency', flat=True)[:settings.ADAPTIVE_RESEND_MAX_SAMPLES])
+
+    if len(roundtrip_times) < settings.ADAPTIVE_RESEND_MIN_SAMPLES:
+        return None
+
+    interval = get_percentile(roundtrip_times, settings.ADAPTIVE_RESEND_PERCENTILE)
+
+    # Keep room for at least one resend in the wait loop.
+    return min(
+        max(interval, settings.ADAPTIVE_RESEND_MIN_INTERVAL / 1000),
+        settings.APP_PUSH_ROUNDTRIP_WAIT / 2000,
+    )
+
+
+def refresh_intervals():
+    """
+    Function to refresh the resend intervals of this worker. The intervals
+    are calculated and shared in redis when no worker did that since the
+    last refresh interval.
+    """
+    global _intervals
+
+    redis_cache = RedisClusterCache()
+    intervals = redis_cache.hgetall(RESEND_INTERVALS_KEY)
+
+    if not intervals:
+        for platform, name in PLATFORM_CHOICES:
+            interval = calculate_resend_interval(platform)
+            if interval is not None:
+                intervals[platform] = interval
+
+        # Store a placeholder without enough responses so the other workers
+        # do not query again.
+        redis_cache.hmset(
+            RESEND_INTERVALS_KEY,
+            intervals or {'': ''},
+            timeout=settings.ADAPTIVE_RESEND_REFRESH_INTERVAL,
+        )
+        logger.info('Calculated resend intervals: {0}'.format(intervals))
+
+    _intervals = {platform: float(interval) for platform, interval in intervals.items() if platform}
+
+
+@threaded
+def task_refresh_intervals():
+    """
+    Threaded task to refresh the resend intervals off the request path.
+    """
+    try:
+        refresh_intervals()
+    except Exception:
+        logger.exception('Failed to refresh resend intervals')
+    finally:
+        connection.close()
+
+
+def get_resend_interval(platform):
+    """
+    Function to get the resend interval of a platform. The intervals are
+    refreshed in the background every ADAPTIVE_RESEND_REFRESH_INTERVAL.
+
+    Args:
+        platform (string): Platform of the devices.
+
+    Returns:
+        float: The resend interval in seconds, APP_PUSH_RESEND_INTERVAL when
+            adaptive resending is disabled or there are not enough
+            responses.
+    """
+    global _refreshed_at
+
+    default = settings.APP_PUSH_RESEND_INTERVAL / 1000
+    if not settings.ADAPTIVE_RESEND_ENABLED:
+        return default
+
+    if time.time() - _refreshed_at > settings.ADAPTIVE_RESEND_REFRESH_INTERVAL:
+        # Start a single refresh, the current intervals are used meanwhile.
+        _refreshed_at = time.time()
+        task_refresh_intervals()
+
+    return _intervals.get(platform, default)
@@ -0,0 +1,39 @@
+from rest_framework import serializers
+
+from .callbacks import is_allowed_url
+from .validators import phone_number_validator
+
+
+def get_sip_user_id_field():
+    return serializers.IntegerField(max_value=999999999, min_value=int(1e8))
+
+
+class SipUserIdSerializer(serializers.Serializer):
+    """
+    Base serializer for the sip_user_id field.
+    """
+    sip_user_id = get_sip_user_id_field()
+
+
+class CallerSerializer(serializers.Serializer):
+    """
+    Base serializer for the caller fields of an incoming call.
+    """
+    caller_id = serializers.CharField(max_length=255, default='', allow_blank=True)
+    phonenumber = serializers.CharField(max_length=32, validators=[phone_number_validator])
+    call_id = serializers.CharField(max_length=255, default=None, allow_blank=True)
+
+
+class IncomingCallSerializer(SipUserIdSerializer, CallerSerializer):
+    """
+    Serializer for the incoming call view and the AGI server.
+    """
+    callback_url = serializers.URLField(max_length=255, default='', allow_blank=True)
+
+    def validate_callback_url(self, value):
+        """
+        Only allow callback urls to the hosts in CALLBACK_ALLOWED_HOSTS.
+        """
+        if value and not is_allowed_url(value):
+            raise serializers.ValidationError('Callback url not allowed.')
+        return value
@@ -0,0 +1,55 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.signing import BadSignature, SignatureExpired, Signer
+
+SALT = 'app.signing.unique_key'
+
+
+def sign_unique_key(unique_key, wait_until):
+    """
+    Function to sign the unique_key sent to the devices with an expiry, so
+    responses for calls that do not exist can be refused without redis.
+
+    Args:
+        unique_key (string): The unique_key of the call.
+        wait_until (float): Timestamp at which the call stops waiting.
+
+    Returns:
+        string: The signed unique_key or the unique_key when signing is
+            disabled.
+    """
+    if not settings.UNIQUE_KEY_SIGNING:
+        return unique_key
+
+    # The expiry is derived from the call state so every push message of a
+    # call has the same key.
+    expires = math.ceil(wait_until) + settings.UNIQUE_KEY_SIGNING_MARGIN
+    return Signer(salt=SALT).sign('{0}:{1}'.format(unique_key, expires))
+
+
+def unsign_unique_key(signed_key):
+    """
+    Function to get the unique_key from a key signed by sign_unique_key.
+
+    Args:
+        signed_key (string): The unique_key posted by a device.
+
+    Returns:
+        string: The unique_key.
+
+    Raises:
+        BadSignature: When the key is not signed by us.
+        SignatureExpired: When the key expired.
+    """
+    if not settings.UNIQUE_KEY_SIGNING:
+        return signed_key
+
+    unique_key, _, expires = Signer(salt=SALT).unsign(signed_key).rpartition(':')
+    if not expires.isdigit():
+        raise BadSignature('Missing expiry')
+    if int(expires) < time.time():
+        raise SignatureExpired('Key expired at {0}'.format(expires))
+
+    return unique_key
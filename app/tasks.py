@@ -1,14 +1,28 @@
+import time
+
 from .decorators import threaded
 from .models import ResponseLog
-from .push import send_call_message, send_text_message
+from .push import send_call_message, send_cancel_message, send_text_message
+
+
+@threaded
+def task_incoming_call_notify(device, unique_key, phonenumber, caller_id, attempt, latencies=None):
+    """
+    Threaded task to send a call push notification. The seconds it took are
+    added to latencies when given and the message was sent.
+    """
+    start = time.time()
+    sent = send_call_message(device, unique_key, phonenumber, caller_id, attempt)
+    if latencies is not None and sent:
+        latencies.append(time.time() - start)
 
 
 @threaded
-def task_incoming_call_notify(device, unique_key, phonenumber, caller_id, attempt):
+def task_cancel_call_notify(device, unique_key):
     """
-    Threaded task to send a call push notification.
+    Threaded task to send a push notification to stop ringing.
     """
-    send_call_message(device, unique_key, phonenumber, caller_id, attempt)
+    send_cancel_message(device, unique_key)
 
 
 @threaded
@@ -21,7 +35,7 @@ def task_notify_old_token(device, app):
 
 
 @threaded
-def log_to_db(platform, roundtrip_time, available):
+def log_to_db(platform, roundtrip_time, available, attempt=None, attempt_latency=None, client_roundtrip_time=None):
     """
     Log the info in a seperate thread to the DB to make sure the log write
     does not block the api requests.
@@ -30,4 +44,7 @@ def log_to_db(platform, roundtrip_time, available):
         platform=platform,
         roundtrip_time=roundtrip_time,
         available=available,
+        attempt=attempt,
+        attempt_latency=attempt_latency,
+        client_roundtrip_time=client_roundtrip_time,
     )
@@ -0,0 +1,58 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import override_settings, TestCase
+
+
+class ProfilerViewTestCase(TestCase):
+    """
+    Tests for the profiler view of the admin.
+    """
+    def setUp(self):
+        super(ProfilerViewTestCase, self).setUp()
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        self.url = reverse('admin:profiler')
+
+    @mock.patch('app.admin.start_profiling', return_value='/tmp/profile.folded')
+    def test_start_profiling(self, mock_start_profiling):
+        """
+        Test that the profiler is started for the given seconds.
+        """
+        response = self.client.get(self.url, {'seconds': '30'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'/tmp/profile.folded', response.content)
+        mock_start_profiling.assert_called_once_with(30)
+
+    @override_settings(PROFILER_MAX_DURATION=300)
+    @mock.patch('app.admin.start_profiling', return_value='/tmp/profile.folded')
+    def test_clamp_seconds(self, mock_start_profiling):
+        """
+        Test that the seconds are capped at PROFILER_MAX_DURATION.
+        """
+        response = self.client.get(self.url, {'seconds': '100000'})
+
+        self.assertEqual(response.status_code, 200)
+        mock_start_profiling.assert_called_once_with(300)
+
+    @mock.patch('app.admin.start_profiling')
+    def test_invalid_seconds(self, mock_start_profiling):
+        """
+        Test that invalid seconds are refused without starting the profiler.
+        """
+        for seconds in ('', 'abc', '0', '-5', '1.5'):
+            response = self.client.get(self.url, {'seconds': seconds})
+            self.assertEqual(response.status_code, 400, seconds)
+
+        self.assertFalse(mock_start_profiling.called)
+
+    def test_status(self):
+        """
+        Test that the status is shown without seconds.
+        """
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'not profiling', response.content)
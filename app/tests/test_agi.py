@@ -0,0 +1,112 @@
+import socket
+from threading import Thread
+import time
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from ..agi import AGIServer, get_call_data, quote_value
+from ..cache import RedisClusterCache
+from ..calls import get_call_cache_key
+from ..models import App, Device
+
+
+class GetCallDataTestCase(TestCase):
+    """
+    Tests for reading the incoming call from the AGI variables.
+    """
+    def test_query_string(self):
+        data = get_call_data({
+            'agi_network_script': 'incoming-call?sip_user_id=123456789&phonenumber=0123456789&call_id=abc',
+        })
+        self.assertEqual(data, {'sip_user_id': '123456789', 'phonenumber': '0123456789', 'call_id': 'abc'})
+
+    def test_arguments(self):
+        data = get_call_data({
+            'agi_network_script': 'incoming-call',
+            'agi_arg_1': '123456789',
+            'agi_arg_2': '0123456789',
+            'agi_arg_3': 'Test name',
+        })
+        self.assertEqual(data, {'sip_user_id': '123456789', 'phonenumber': '0123456789', 'caller_id': 'Test name'})
+
+    def test_quote_value(self):
+        self.assertEqual(quote_value('abc'), '"abc"')
+        self.assertEqual(quote_value('a"b\\c'), '"a\\"b\\\\c"')
+        self.assertEqual(quote_value('abc"\nEXEC Hangup'), '"abc\\" EXEC Hangup"')
+
+
+@mock.patch('app.agi.drain')
+class AGIServerTestCase(TransactionTestCase):
+    """
+    Tests for AGI sessions of incoming calls.
+    """
+    def setUp(self):
+        super(AGIServerTestCase, self).setUp()
+        # Do not handle the call as a duplicate of the call of an earlier test.
+        RedisClusterCache().delete(get_call_cache_key('sduiqayduiryqwuioeryqwer76789'))
+
+        app = App.objects.create(platform='apns', app_id='com.voipgrid.vialer')
+        Device.objects.create(
+            token='a652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='123456789',
+            app=app,
+        )
+
+        self.server = AGIServer('127.0.0.1', 0, 2)
+        self.thread = Thread(target=self.server.serve_forever, kwargs={'handle_signals': False})
+        self.thread.start()
+        while self.server.server is None:
+            time.sleep(0.01)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join(5)
+        super(AGIServerTestCase, self).tearDown()
+
+    def _session(self, sip_user_id, call_id):
+        """
+        Function to run an AGI session like asterisk does.
+
+        Returns:
+            dict: The channel variables set by the server.
+        """
+        variables = {}
+        with socket.create_connection(('127.0.0.1', self.server.port), timeout=10) as connection:
+            stream = connection.makefile('rwb')
+            stream.write('agi_network_script: incoming-call\nagi_arg_1: {0}\nagi_arg_2: 0123456789\n'
+                         'agi_arg_3: Test name\nagi_arg_4: {1}\n\n'.format(sip_user_id, call_id).encode('utf-8'))
+            stream.flush()
+
+            for line in stream:
+                _, _, name, value = line.decode('utf-8').split(' ', 3)
+                variables[name] = value.strip().strip('"')
+                stream.write(b'200 result=1\n')
+                stream.flush()
+
+        return variables
+
+    def test_no_device(self, *mocks):
+        variables = self._session('987654321', 'sduiqayduiryqwuioeryqwer76789')
+        self.assertEqual(variables['VIALER_STATUS'], 'NAK')
+
+    @mock.patch('app.push.send_apns_message')
+    def test_answered_call(self, *mocks):
+        def respond():
+            time.sleep(0.5)
+            APIClient().post('/api/call-response/', {
+                'unique_key': 'sduiqayduiryqwuioeryqwer76789',
+                'message_start_time': time.time(),
+            })
+        Thread(target=respond).start()
+
+        variables = self._session('123456789', 'sduiqayduiryqwuioeryqwer76789')
+        self.assertEqual(variables, {'VIALER_UNIQUE_KEY': 'sduiqayduiryqwuioeryqwer76789', 'VIALER_STATUS': 'ACK'})
+
+    @mock.patch('app.agi.admit_call', return_value=False)
+    @mock.patch('app.push.send_apns_message')
+    def test_shed_call(self, mock_send_apns_message, mock_admit_call):
+        variables = self._session('123456789', 'sduiqayduiryqwuioeryqwer76789')
+        self.assertEqual(variables['VIALER_STATUS'], 'NAK')
+        self.assertFalse(mock_send_apns_message.called)
@@ -0,0 +1,60 @@
+import time
+from unittest import mock
+
+from django.test import override_settings, TestCase
+
+from ..cache import RedisClusterCache
+from ..callbacks import process_due_calls
+from ..calls import CALLBACK_CALLS_KEY, get_call_cache_key
+
+
+@override_settings(CALLBACK_RETRY_DELAY=500)
+@mock.patch('app.callbacks.process_call', side_effect=ConnectionError('Connection refused'))
+class ProcessDueCallsTestCase(TestCase):
+    """
+    Tests for processing the due calls in callback mode.
+    """
+    def setUp(self):
+        super(ProcessDueCallsTestCase, self).setUp()
+        self.redis_cache = RedisClusterCache()
+        self.unique_key = 'callbacks-call-1'
+        self.cache_key = get_call_cache_key(self.unique_key)
+
+    def tearDown(self):
+        self.redis_cache.zrem(CALLBACK_CALLS_KEY, self.unique_key)
+        self.redis_cache.delete(self.cache_key)
+        super(ProcessDueCallsTestCase, self).tearDown()
+
+    def _schedule(self, wait_until):
+        self.redis_cache.hmset(self.cache_key, {
+            'callback_url': 'http://127.0.0.1/callback',
+            'wait_until': wait_until,
+        })
+        self.redis_cache.zadd(CALLBACK_CALLS_KEY, time.time() - 1, self.unique_key)
+
+    @mock.patch('app.callbacks.send_callback')
+    def test_retry_failed_call(self, mock_send_callback, *mocks):
+        """
+        Test that a call that failed to process is scheduled again.
+        """
+        self._schedule(time.time() + 10)
+
+        process_due_calls()
+
+        retry_time = self.redis_cache.zscore(CALLBACK_CALLS_KEY, self.unique_key)
+        self.assertIsNotNone(retry_time)
+        self.assertGreater(retry_time, time.time())
+        self.assertFalse(mock_send_callback.called)
+
+    @mock.patch('app.callbacks.send_callback')
+    def test_nak_failed_call(self, mock_send_callback, *mocks):
+        """
+        Test that a call that failed to process after its deadline gets a
+        NAK.
+        """
+        self._schedule(time.time())
+
+        process_due_calls()
+
+        self.assertIsNone(self.redis_cache.zscore(CALLBACK_CALLS_KEY, self.unique_key))
+        mock_send_callback.assert_called_once_with(self.unique_key, 'http://127.0.0.1/callback', 'NAK')
@@ -0,0 +1,52 @@
+import time
+
+from django.test import override_settings, TransactionTestCase
+
+from ..calllog import flush_pending_call_logs, log_call
+from ..models import App, CallLog, Device
+
+
+@override_settings(CALL_LOG_BATCH_SIZE=3, CALL_LOG_FLUSH_INTERVAL=60)
+class CallLogTestCase(TransactionTestCase):
+    """
+    Tests for the batched call log.
+    """
+    def setUp(self):
+        super(CallLogTestCase, self).setUp()
+        flush_pending_call_logs()
+
+        app = App.objects.create(platform='apns', app_id='com.voipgrid.vialer')
+        self.device = Device.objects.create(
+            token='a652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='123456789',
+            client_version='1.0',
+            app=app,
+        )
+
+    def test_batch(self):
+        log_call('key1', 'ACK', devices=[self.device], pushes=2, push_latencies=[0.1, 0.3], wait_time=1.5)
+        log_call('key2', 'no-device')
+        time.sleep(0.5)
+        self.assertEqual(CallLog.objects.count(), 0)
+
+        log_call('key3', 'timeout', devices=[self.device], pushes=5, wait_time=30)
+        time.sleep(0.5)
+        self.assertEqual(CallLog.objects.count(), 3)
+
+        call_log = CallLog.objects.get(unique_key='key1')
+        self.assertEqual(call_log.platform, 'apns')
+        self.assertEqual(call_log.app_id, 'com.voipgrid.vialer')
+        self.assertEqual(call_log.client_version, '1.0')
+        self.assertEqual(call_log.devices, 1)
+        self.assertEqual(call_log.pushes, 2)
+        self.assertAlmostEqual(call_log.push_latency, 0.2)
+
+        call_log = CallLog.objects.get(unique_key='key2')
+        self.assertIsNone(call_log.platform)
+        self.assertIsNone(call_log.push_latency)
+
+    def test_flush(self):
+        log_call('key1', 'ACK', devices=[self.device], pushes=1, wait_time=1)
+        flush_pending_call_logs()
+        time.sleep(0.5)
+        self.assertEqual(CallLog.objects.count(), 1)
@@ -0,0 +1,137 @@
+import time
+from unittest import mock
+
+from django.test import TestCase
+
+from .. import drain
+from ..calls import GroupCall, IncomingCall, OUTCOME_GIVE_UP, OUTCOME_TIMEOUT
+from ..models import App, Device
+
+
+@mock.patch('app.calls.get_resend_interval', return_value=1.0)
+class IncomingCallTestCase(TestCase):
+    """
+    Tests for the IncomingCall class.
+    """
+    def setUp(self):
+        super(IncomingCallTestCase, self).setUp()
+        app = App.objects.create(platform='apns', app_id='com.voipgrid.vialer')
+        self.device = Device.objects.create(
+            token='a652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='123456789',
+            app=app,
+        )
+        self.other_device = Device.objects.create(
+            token='b652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='123456789',
+            app=app,
+        )
+
+    @mock.patch('app.calls.log_call')
+    @mock.patch('app.calls.task_incoming_call_notify')
+    @mock.patch('app.cache.RedisClusterCache.pipeline', side_effect=ConnectionError('Connection refused'))
+    def test_start_failed(self, mock_pipeline, mock_notify, mock_log_call, *mocks):
+        """
+        Test that finishing a call that failed to start does not change the
+        waiting calls of the drain and does not hide the error.
+        """
+        call = IncomingCall('sduiqayduiryqwuioeryqwer76789', '123456789', '0123456789', 'Test name', [self.device])
+        active_waits = drain._active_waits
+
+        with self.assertRaises(ConnectionError):
+            try:
+                call.start()
+            finally:
+                call.finish(None)
+
+        self.assertEqual(drain._active_waits, active_waits)
+        self.assertFalse(mock_notify.called)
+        mock_log_call.assert_called_once_with('sduiqayduiryqwuioeryqwer76789', 'error', devices=[self.device])
+
+    @mock.patch('app.calls.record_call')
+    @mock.patch('app.calls.task_cancel_call_notify')
+    @mock.patch('app.calls.unregister_call')
+    @mock.patch('app.calls.log_call')
+    def test_record_misses(self, mock_log_call, mock_unregister_call, mock_cancel_notify, mock_record_call, *mocks):
+        """
+        Test that the devices that did not respond miss the call when the
+        call times out or is given up.
+        """
+        for outcome in (OUTCOME_TIMEOUT, OUTCOME_GIVE_UP):
+            mock_record_call.reset_mock()
+
+            call = IncomingCall(
+                'sduiqayduiryqwuioeryqwer76789',
+                '123456789',
+                '0123456789',
+                'Test name',
+                [self.device, self.other_device],
+            )
+            call.start_time = 0
+            call.wait_until = time.time()
+            call.redis_cache = mock.Mock()
+            call.redis_cache.hgetall.return_value = {
+                'declined:{0}'.format(self.device.token): 'True',
+                'declined': '1',
+            }
+
+            call.finish(outcome)
+
+            mock_record_call.assert_called_once_with(self.other_device.token, False)
+
+    @mock.patch('app.calls.unregister_call')
+    @mock.patch('app.calls.log_call')
+    def test_finish_expires_state(self, *mocks):
+        """
+        Test that the state of a finished call expires when the devices can
+        not respond in time anymore, so a retry of the call id is a new call.
+        """
+        call = IncomingCall('sduiqayduiryqwuioeryqwer76789', '123456789', '0123456789', 'Test name', [self.device])
+        call.start_time = time.time()
+        call.wait_until = call.start_time + 2.5
+        call.redis_cache = mock.Mock()
+
+        call.finish('ACK')
+
+        call.redis_cache.expire.assert_called_once_with('call_sduiqayduiryqwuioeryqwer76789', 3)
+
+    @mock.patch('app.calls.register_call')
+    @mock.patch('app.calls.IncomingCall.start')
+    @mock.patch('app.cache.RedisClusterCache.hmset')
+    def test_register_group_call(self, mock_hmset, mock_start, mock_register_call, *mocks):
+        """
+        Test that a group call is registered as a single in-flight call and
+        a call in callback mode is not registered.
+        """
+        calls = [
+            IncomingCall('sduiqayduiryqwuioeryqwer76789_123456789', '123456789', '0123456789', 'Test name',
+                         [self.device]),
+            IncomingCall('sduiqayduiryqwuioeryqwer76789_234567890', '234567890', '0123456789', 'Test name',
+                         [self.other_device]),
+        ]
+        group = GroupCall('sduiqayduiryqwuioeryqwer76789', calls)
+        group.start()
+
+        mock_register_call.assert_called_once_with('sduiqayduiryqwuioeryqwer76789', '123456789,234567890', 'group')
+        self.assertFalse(any(call.register for call in calls))
+
+        call = IncomingCall('sduiqayduiryqwuioeryqwer76789', '123456789', '0123456789', 'Test name', [self.device],
+                            callback_url='http://127.0.0.1/callback')
+        self.assertFalse(call.register)
+
+    @mock.patch('app.calls.log_call')
+    def test_log_sent_pushes(self, mock_log_call, *mocks):
+        """
+        Test that only the push messages that were sent are logged.
+        """
+        call = IncomingCall('sduiqayduiryqwuioeryqwer76789', '123456789', '0123456789', 'Test name',
+                            [self.device, self.other_device])
+        call.start_time = time.time()
+        call.wait_until = call.start_time + 2
+        call.attempt = 2
+        call.push_latencies = [0.1, 0.2, 0.1]
+        call.redis_cache = mock.Mock()
+
+        call.finish('NAK')
+
+        self.assertEqual(mock_log_call.call_args[1]['pushes'], 3)
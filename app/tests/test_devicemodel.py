@@ -0,0 +1,40 @@
+from django.test import override_settings, TestCase
+
+from ..devicemodel import answer_probability, DeviceModel
+
+
+@override_settings(EARLY_GIVE_UP_MIN_CALLS=10)
+class DeviceModelTestCase(TestCase):
+    """
+    Tests for the response time model of devices.
+    """
+    def test_untrained(self):
+        """
+        Test that devices with too few calls are always waited for.
+        """
+        model = DeviceModel('0.5', '0.01', '9')
+
+        self.assertFalse(model.trained)
+        self.assertEqual(model.answer_probability(3.9, 4.0), 1.0)
+        self.assertFalse(DeviceModel().trained)
+
+    def test_answer_probability(self):
+        """
+        Test that the probability drops while the device does not answer.
+        """
+        model = DeviceModel('0.5', '0.9', '20')
+
+        start = model.answer_probability(0, 4.0)
+        later = model.answer_probability(3.0, 4.0)
+
+        self.assertAlmostEqual(start, 0.9 * (1 - 2.718281828 ** -8), places=4)
+        self.assertLess(later, 0.05)
+        self.assertEqual(model.answer_probability(4.0, 4.0), 0.0)
+
+    def test_multiple_devices(self):
+        """
+        Test that any device answering counts.
+        """
+        models = [DeviceModel('0.5', '0.5', '20'), DeviceModel('0.5', '0.5', '20')]
+
+        self.assertGreater(answer_probability(models, 0, 4.0), models[0].answer_probability(0, 4.0))
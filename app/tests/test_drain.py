@@ -0,0 +1,81 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.test import override_settings, TestCase
+
+from .. import drain
+from ..health import check_drain
+
+
+class DrainTestCase(TestCase):
+    """
+    Tests for draining a worker.
+    """
+    def tearDown(self):
+        drain._draining.clear()
+        super(DrainTestCase, self).tearDown()
+
+    def test_start_draining(self):
+        """
+        Test that a draining worker fails the health check.
+        """
+        self.assertFalse(drain.is_draining())
+        check_drain()
+
+        drain.start_draining()
+
+        self.assertTrue(drain.is_draining())
+        with self.assertRaises(ValueError):
+            check_drain()
+
+    @override_settings(APP_PUSH_ROUNDTRIP_WAIT=5000, DRAIN_TASK_TIMEOUT=1)
+    def test_drain_waits_for_calls(self):
+        """
+        Test that drain waits for the calls in the wait loop.
+        """
+        drain.start_wait()
+
+        thread = threading.Thread(target=drain.drain)
+        thread.start()
+        time.sleep(0.1)
+
+        self.assertTrue(drain.is_draining())
+        self.assertTrue(thread.is_alive())
+
+        drain.finish_wait()
+        thread.join(1)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(drain._active_waits, 0)
+
+    @override_settings(APP_PUSH_ROUNDTRIP_WAIT=200, DRAIN_TASK_TIMEOUT=0)
+    @mock.patch('app.drain.logger')
+    def test_drain_timeout(self, mock_logger):
+        """
+        Test that drain stops waiting for calls after the wait loop time.
+        """
+        drain.start_wait()
+        try:
+            start = time.time()
+            drain.drain()
+
+            self.assertLess(time.time() - start, 1)
+            self.assertTrue(mock_logger.warning.called)
+        finally:
+            drain.finish_wait()
+
+    def test_prepare_drain_file(self):
+        """
+        Test that the drain file is created and kept when it exists.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'drain')
+            with override_settings(DRAIN_FILE=path):
+                drain.prepare_drain_file()
+                self.assertTrue(os.path.isfile(path))
+
+                drain.prepare_drain_file()
+                self.assertTrue(os.path.isfile(path))
@@ -0,0 +1,115 @@
+import gzip
+from io import StringIO
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from ..logparse import EVENT_OUTCOME, EVENT_PUSH, Histogram, parse_line, read_calls, read_events
+
+NODE1_LOG = """INFO web-app 2017-01-02 12:00:00,000 abc | Incoming call for SIP:123456789 FROM:'0123456789/Test name' (POST:{})
+INFO web-app 2017-01-02 12:00:00,010 abc | Sending APNS 'call' message at time:12:00:00.010000 to token Data:{}
+INFO web-app 2017-01-02 12:00:00,020 abc | APNS Starting 'wait for it' loop for 1 device(s) until 12:00:30.000000 (30000msec)
+INFO web-app 2017-01-02 12:00:01,010 abc | Sending APNS 'call' message at time:12:00:01.010000 to token Data:{}
+INFO web-app 2017-01-02 12:00:01,510 abc | APNS Device checked in on time, sending ACK on 12:00:01.510000
+"""
+
+NODE2_LOG = """INFO web-app 2017-01-02 12:00:00,500 def | Incoming call for SIP:234567890 FROM:'0123456789/' (POST:{})
+INFO web-app 2017-01-02 12:00:00,510 def | Failed to find a device for SIP_user_ID : 234567890 sending NAK
+INFO web-app 2017-01-02 12:00:01,500 abc | Device responded to attempt 2. Message round trip-time: 1.49 sec
+"""
+
+
+class LogParseTestCase(SimpleTestCase):
+    """
+    Tests for parsing calls from middleware.log.
+    """
+    def setUp(self):
+        super(LogParseTestCase, self).setUp()
+        self.log_dir = tempfile.mkdtemp()
+
+        self.node1_path = os.path.join(self.log_dir, 'node1.log')
+        with open(self.node1_path, 'w') as log_file:
+            log_file.write(NODE1_LOG)
+
+        # Rotated logs are gzipped.
+        self.node2_path = os.path.join(self.log_dir, 'node2.log.1.gz')
+        with gzip.open(self.node2_path, 'wt') as log_file:
+            log_file.write(NODE2_LOG)
+
+    def tearDown(self):
+        shutil.rmtree(self.log_dir)
+        super(LogParseTestCase, self).tearDown()
+
+    def test_parse_line(self):
+        event = parse_line(
+            "INFO web-app 2017-01-02 12:00:00,010 abc:1483358430:AbCdEfGhIjKlMnOpQrStUvWxYz0 | "
+            "Sending APNS 'call' message at time:12:00:00.010000 to token Data:{}")
+        self.assertEqual(event.unique_key, 'abc')
+        self.assertEqual(event.kind, EVENT_PUSH)
+
+        event = parse_line('INFO web-app 2017-01-02 12:00:01,510 abc | Shed call, 5 calls are waiting on node1')
+        self.assertEqual(event.kind, EVENT_OUTCOME)
+        self.assertEqual(event.fields, {'outcome': 'shed'})
+
+        self.assertIsNone(parse_line('INFO web-app 2017-01-02 12:00:01,510 Worker 1 warmed up in 0.1 sec'))
+        self.assertIsNone(parse_line('Traceback (most recent call last):'))
+
+    def test_read_calls(self):
+        calls = list(read_calls(read_events([self.node1_path, self.node2_path]), 60))
+        self.assertEqual([call.unique_key for call in calls], ['def', 'abc'])
+
+        call = calls[1]
+        self.assertEqual(call.sip_user_id, '123456789')
+        self.assertEqual(call.caller_id, 'Test name')
+        self.assertEqual(call.platform, 'apns')
+        self.assertEqual(call.outcome, 'ACK')
+        self.assertEqual(len(call.pushes), 2)
+        self.assertAlmostEqual(call.response_delay, 1.5)
+        self.assertAlmostEqual(call.end - call.start, 1.51)
+
+        self.assertEqual(calls[0].outcome, 'no-device')
+
+    def test_read_calls_timeout(self):
+        calls = list(read_calls(read_events([self.node1_path]), 0.5))
+
+        # The call had no events for longer than the timeout after the first
+        # and second push message.
+        self.assertEqual([call.outcome for call in calls], [None, None, 'ACK'])
+
+    def test_histogram(self):
+        histogram = Histogram()
+        for value in range(1, 101):
+            histogram.add(value / 100)
+
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.total, 50.5)
+        self.assertEqual(histogram.maximum, 1)
+        # Percentiles are accurate to a bucket of 10%.
+        self.assertAlmostEqual(histogram.percentile(50), 0.5, delta=0.05)
+        self.assertAlmostEqual(histogram.percentile(90), 0.9, delta=0.09)
+        self.assertEqual(histogram.percentile(100), 1)
+        self.assertIsNone(Histogram().percentile(50))
+
+    def test_analyze_log(self):
+        out = StringIO()
+        call_command('analyze_log', self.node1_path, self.node2_path, calls=True, stdout=out)
+        output = out.getvalue()
+
+        self.assertIn('abc ACK apns pushes:2 first_push:10ms response:1500ms total:1510ms', output)
+        self.assertIn('Calls: 2', output)
+        self.assertIn('no-device: 1', output)
+
+    def test_analyze_log_timeline(self):
+        out = StringIO()
+        call_command('analyze_log', self.node1_path, self.node2_path, unique_keys=['abc'], stdout=out)
+
+        self.assertEqual(out.getvalue().splitlines()[1:], [
+            '  +0ms received',
+            '  +10ms push 1',
+            '  +1010ms push 2',
+            '  +1500ms response to attempt 2, round trip 1490ms',
+            '  +1510ms ACK',
+        ])
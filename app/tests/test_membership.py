@@ -0,0 +1,80 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase
+
+from ..membership import add_device, BloomFilter, build_filter, might_have_devices, reset_filter
+from ..models import App, Device
+
+
+class BloomFilterTestCase(TestCase):
+    """
+    Tests for the BloomFilter class.
+    """
+    def test_membership(self):
+        """
+        Test that added values are always found and the false positive rate
+        stays near the error rate.
+        """
+        membership = BloomFilter(1000, 0.01)
+        for sip_user_id in range(100000000, 100001000):
+            membership.add(sip_user_id)
+
+        for sip_user_id in range(100000000, 100001000):
+            self.assertIn(sip_user_id, membership)
+
+        false_positives = sum(1 for sip_user_id in range(200000000, 200010000) if sip_user_id in membership)
+        self.assertLess(false_positives, 300)
+
+
+class MembershipTestCase(TestCase):
+    """
+    Tests for the membership filter of a worker.
+    """
+    def setUp(self):
+        super(MembershipTestCase, self).setUp()
+        app = App.objects.create(platform='apns', app_id='com.voipgrid.vialer')
+        Device.objects.create(
+            token='a652aee84bdec6c2859eec89a6e5b1a42c400fba43070f404148f27b502610b6',
+            sip_user_id='123456789',
+            app=app,
+        )
+
+    def tearDown(self):
+        reset_filter()
+        super(MembershipTestCase, self).tearDown()
+
+    def test_might_have_devices(self):
+        """
+        Test that accounts without devices are refused once the filter is
+        built and registered accounts are added.
+        """
+        self.assertTrue(might_have_devices('987654321'))
+
+        build_filter()
+
+        self.assertTrue(might_have_devices('123456789'))
+        self.assertFalse(might_have_devices('987654321'))
+
+        add_device('987654321')
+
+        self.assertTrue(might_have_devices('987654321'))
+
+    @mock.patch('app.membership.rebuild_filter')
+    def test_stale_filter(self, mock_rebuild_filter):
+        """
+        Test that a filter older than the registrations kept in redis does
+        not refuse accounts while it is rebuilt.
+        """
+        build_filter()
+        self.assertFalse(might_have_devices('555444333'))
+
+        # The worker got no calls for more than two rebuild intervals.
+        stale_time = time.time() + 2 * settings.MEMBERSHIP_FILTER_REBUILD_INTERVAL + 1
+        with mock.patch('app.membership.time.time', return_value=stale_time):
+            self.assertTrue(might_have_devices('555444333'))
+            self.assertTrue(might_have_devices('555444333'))
+
+        # A single rebuild is started.
+        self.assertEqual(mock_rebuild_filter.call_count, 1)
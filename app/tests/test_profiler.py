@@ -0,0 +1,37 @@
+import os
+import signal
+import time
+from unittest import mock
+
+from django.test import override_settings, TestCase
+
+from ..profiler import install_signal_handler
+
+
+class ProfilerSignalTestCase(TestCase):
+    """
+    Tests for starting the profiler with a signal.
+    """
+    def setUp(self):
+        super(ProfilerSignalTestCase, self).setUp()
+        self.handler = signal.getsignal(signal.SIGUSR2)
+
+    def tearDown(self):
+        signal.signal(signal.SIGUSR2, self.handler)
+        super(ProfilerSignalTestCase, self).tearDown()
+
+    @override_settings(PROFILER_SIGNAL='SIGUSR2')
+    @mock.patch('app.profiler.start_profiling')
+    def test_signal(self, mock_start_profiling):
+        """
+        Test that the profiler is started outside the signal handler.
+        """
+        install_signal_handler()
+
+        os.kill(os.getpid(), signal.SIGUSR2)
+        for i in range(100):
+            if mock_start_profiling.called:
+                break
+            time.sleep(0.01)
+
+        mock_start_profiling.assert_called_once_with()
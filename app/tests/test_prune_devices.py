@@ -0,0 +1,83 @@
+import datetime
+from io import StringIO
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import App, Device
+
+
+class PruneDevicesTestCase(TestCase):
+    """
+    Tests for the prune_devices command.
+    """
+    def setUp(self):
+        """
+        Setup an app with a recent, a stale and a never seen device.
+        """
+        super(PruneDevicesTestCase, self).setUp()
+
+        app = App.objects.create(platform='apns', app_id='com.voipgrid.vialer')
+        now = timezone.now()
+
+        for sip_user_id, last_seen in (
+                ('123456789', now),
+                ('234567890', now - datetime.timedelta(days=200)),
+                ('345678901', None)):
+            Device.objects.create(
+                sip_user_id=sip_user_id,
+                token='token{0}'.format(sip_user_id),
+                last_seen=last_seen,
+                app=app,
+            )
+
+    def test_prune(self):
+        """
+        Test that only the stale device is deleted.
+        """
+        out = StringIO()
+        call_command('prune_devices', days=90, sleep=0, stdout=out)
+
+        self.assertEqual(
+            sorted(Device.objects.values_list('sip_user_id', flat=True)),
+            ['123456789', '345678901'],
+        )
+        self.assertIn('Deleted 1 devices of com.voipgrid.vialer for apns', out.getvalue())
+
+    def test_prune_include_never_seen(self):
+        """
+        Test that devices without last_seen are deleted when asked for.
+        """
+        call_command('prune_devices', days=90, sleep=0, include_never_seen=True, stdout=StringIO())
+
+        self.assertEqual(list(Device.objects.values_list('sip_user_id', flat=True)), ['123456789'])
+
+    def test_dry_run(self):
+        """
+        Test that a dry run does not delete devices.
+        """
+        out = StringIO()
+        call_command('prune_devices', days=90, dry_run=True, stdout=out)
+
+        self.assertEqual(Device.objects.count(), 3)
+        self.assertIn('Would delete 1 devices in total', out.getvalue())
+
+    def test_archive(self):
+        """
+        Test that the archived devices are the deleted devices.
+        """
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        call_command('prune_devices', days=90, sleep=0, include_never_seen=True, archive=path, stdout=StringIO())
+
+        with open(path) as archive_file:
+            archived = sorted(json.loads(line)['sip_user_id'] for line in archive_file)
+
+        self.assertEqual(archived, ['234567890', '345678901'])
+        self.assertEqual(list(Device.objects.values_list('sip_user_id', flat=True)), ['123456789'])
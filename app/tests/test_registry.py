@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.test import override_settings, TestCase
+
+from ..cache import RedisClusterCache
+from ..registry import (_call_key, _node_key, get_inflight_calls, get_inflight_summary, INFLIGHT_NODES_KEY,
+                        register_call, unregister_call, update_attempts)
+
+
+@override_settings(APP_PUSH_ROUNDTRIP_WAIT=10000, INFLIGHT_TTL_MARGIN=5, WORKERS_PER_NODE=4)
+@mock.patch('app.registry._node_added_at', 0)
+@mock.patch('app.registry.NODE', 'registry-test-node')
+class RegistryTestCase(TestCase):
+    """
+    Tests for the in-flight call registry.
+    """
+    def setUp(self):
+        super(RegistryTestCase, self).setUp()
+        self.redis_cache = RedisClusterCache()
+
+    def tearDown(self):
+        for node in ('registry-test-node', 'registry-other-node'):
+            self.redis_cache.delete(_node_key(node))
+            self.redis_cache.hdel(INFLIGHT_NODES_KEY, node)
+        for unique_key in ('registry-call-1', 'registry-call-2', 'registry-call-3'):
+            self.redis_cache.delete(_call_key(unique_key))
+        super(RegistryTestCase, self).tearDown()
+
+    def _get_calls(self):
+        return [call for call in get_inflight_calls() if call['unique_key'].startswith('registry-call')]
+
+    def test_register_call(self):
+        """
+        Test that a registered call is listed with its details until it is
+        unregistered.
+        """
+        register_call('registry-call-1', '123456789', 'apns')
+        update_attempts('registry-call-1', 2)
+
+        calls = self._get_calls()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0]['sip_user_id'], '123456789')
+        self.assertEqual(calls[0]['platform'], 'apns')
+        self.assertEqual(calls[0]['attempts'], 2)
+        self.assertEqual(calls[0]['node'], 'registry-test-node')
+
+        unregister_call('registry-call-1')
+
+        self.assertEqual(self._get_calls(), [])
+        self.assertFalse(self.redis_cache.exists(_call_key('registry-call-1')))
+
+    def test_calls_per_node(self):
+        """
+        Test that calls are stored per node and listed for all nodes, oldest
+        call first.
+        """
+        register_call('registry-call-1', '123456789', 'apns')
+        with mock.patch('app.registry.NODE', 'registry-other-node'), mock.patch('app.registry._node_added_at', 0):
+            register_call('registry-call-2', '987654321', 'android')
+        register_call('registry-call-3', '123456789', 'apns')
+
+        self.assertEqual(self.redis_cache.zrange(_node_key('registry-test-node'), 0, -1),
+                         ['registry-call-1', 'registry-call-3'])
+        self.assertEqual(self.redis_cache.zrange(_node_key('registry-other-node'), 0, -1), ['registry-call-2'])
+
+        calls = self._get_calls()
+        self.assertEqual([call['unique_key'] for call in calls],
+                         ['registry-call-1', 'registry-call-2', 'registry-call-3'])
+
+        summary = get_inflight_summary(calls)
+        self.assertEqual(summary['total'], 3)
+        self.assertEqual(summary['platforms'], {'apns': 2, 'android': 1})
+        self.assertEqual(summary['nodes']['registry-test-node']['waiting'], 2)
+        self.assertEqual(summary['nodes']['registry-test-node']['usage'], 0.5)
+        self.assertEqual(summary['nodes']['registry-other-node']['waiting'], 1)
+
+    def test_unregister_other_node(self):
+        """
+        Test that a call is removed from the node that registered it.
+        """
+        with mock.patch('app.registry.NODE', 'registry-other-node'), mock.patch('app.registry._node_added_at', 0):
+            register_call('registry-call-2', '987654321', 'android')
+
+        unregister_call('registry-call-2', 'registry-other-node')
+
+        self.assertEqual(self._get_calls(), [])
+        self.assertEqual(self.redis_cache.zrange(_node_key('registry-other-node'), 0, -1), [])
+
+    def test_expired_calls(self):
+        """
+        Test that calls older than the ttl are removed and idle nodes are
+        forgotten.
+        """
+        with mock.patch('app.registry.time.time', return_value=1000):
+            register_call('registry-call-1', '123456789', 'apns')
+
+        self.assertEqual(self._get_calls(), [])
+        self.assertEqual(self.redis_cache.zrange(_node_key('registry-test-node'), 0, -1), [])
+        self.assertNotIn('registry-test-node', self.redis_cache.hgetall(INFLIGHT_NODES_KEY))
+
+    @mock.patch('app.cache.RedisClusterCache.pipeline', side_effect=ConnectionError('Connection refused'))
+    def test_redis_unavailable(self, *mocks):
+        """
+        Test that registering does not fail the call when redis is down.
+        """
+        register_call('registry-call-1', '123456789', 'apns')
+        update_attempts('registry-call-1', 2)
+        unregister_call('registry-call-1')
@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.test import override_settings, TestCase
+
+from .. import resend
+from ..cache import RedisClusterCache
+from ..models import ResponseLog
+from ..resend import calculate_resend_interval, get_percentile, get_resend_interval, RESEND_INTERVALS_KEY
+
+
+@override_settings(ADAPTIVE_RESEND_ENABLED=True)
+class ResendIntervalTestCase(TestCase):
+    """
+    Tests for the adaptive resend interval.
+    """
+    def setUp(self):
+        super(ResendIntervalTestCase, self).setUp()
+        self._reset_intervals()
+
+    def tearDown(self):
+        self._reset_intervals()
+        super(ResendIntervalTestCase, self).tearDown()
+
+    def _reset_intervals(self):
+        """
+        Forget the intervals learned by this worker and shared in redis.
+        """
+        resend._intervals = {}
+        resend._refreshed_at = 0
+        RedisClusterCache().delete(RESEND_INTERVALS_KEY)
+
+    def test_get_percentile(self):
+        """
+        Test the nearest rank percentile.
+        """
+        values = [0.1 * i for i in range(1, 11)]
+
+        self.assertIsNone(get_percentile([], 80))
+        self.assertAlmostEqual(get_percentile(values, 80), 0.8)
+        self.assertAlmostEqual(get_percentile(values, 100), 1.0)
+        self.assertAlmostEqual(get_percentile(values, 0), 0.1)
+
+    @override_settings(ADAPTIVE_RESEND_MIN_SAMPLES=10, ADAPTIVE_RESEND_MIN_INTERVAL=500, APP_PUSH_ROUNDTRIP_WAIT=4000)
+    def test_calculate_resend_interval(self):
+        """
+        Test that the interval follows the round trip times within the
+        bounds.
+        """
+        self.assertIsNone(calculate_resend_interval('apns'))
+
+        for i in range(1, 11):
+            ResponseLog.objects.create(platform='apns', roundtrip_time=0.1 * i + 0.5, available=True)
+            ResponseLog.objects.create(platform='android', roundtrip_time=0.1 * i, available=True)
+            ResponseLog.objects.create(platform='gcm', roundtrip_time=i, available=True)
+
+        self.assertAlmostEqual(calculate_resend_interval('apns'), 1.3)
+        self.assertAlmostEqual(calculate_resend_interval('android'), 0.5)
+        self.assertAlmostEqual(calculate_resend_interval('gcm'), 2.0)
+
+    @override_settings(ADAPTIVE_RESEND_MIN_SAMPLES=10, ADAPTIVE_RESEND_MIN_INTERVAL=500, APP_PUSH_ROUNDTRIP_WAIT=4000)
+    def test_resend_latency(self):
+        """
+        Test that responses to a resend count from the push message of their
+        attempt, not from the first push message.
+        """
+        for i in range(1, 11):
+            ResponseLog.objects.create(
+                platform='apns',
+                roundtrip_time=1.5 + 0.1 * i,
+                available=True,
+                attempt=2,
+                attempt_latency=0.1 * i + 0.5,
+            )
+
+        self.assertAlmostEqual(calculate_resend_interval('apns'), 1.3)
+
+    @override_settings(ADAPTIVE_RESEND_MIN_SAMPLES=10, ADAPTIVE_RESEND_MIN_INTERVAL=500, APP_PUSH_ROUNDTRIP_WAIT=4000)
+    def test_only_answered_in_time(self):
+        """
+        Test that declines and late responses are not counted.
+        """
+        for i in range(1, 11):
+            ResponseLog.objects.create(platform='apns', roundtrip_time=0.1 * i + 0.5, available=True)
+            ResponseLog.objects.create(platform='apns', roundtrip_time=3.5, available=False)
+            ResponseLog.objects.create(platform='apns', roundtrip_time=4.5, available=True)
+
+        self.assertAlmostEqual(calculate_resend_interval('apns'), 1.3)
+
+    @override_settings(ADAPTIVE_RESEND_MIN_SAMPLES=10, ADAPTIVE_RESEND_MIN_INTERVAL=500, APP_PUSH_ROUNDTRIP_WAIT=4000,
+                       APP_PUSH_RESEND_INTERVAL=1000)
+    @mock.patch('app.resend.task_refresh_intervals', side_effect=lambda: resend.refresh_intervals())
+    def test_get_resend_interval(self, *mocks):
+        """
+        Test that the learned interval is used and the default without
+        enough responses or when adaptive resending is disabled.
+        """
+        self.assertEqual(get_resend_interval('apns'), 1.0)
+        self._reset_intervals()
+
+        for i in range(1, 11):
+            ResponseLog.objects.create(platform='apns', roundtrip_time=0.1 * i + 0.5, available=True)
+
+        get_resend_interval('apns')
+        self.assertAlmostEqual(get_resend_interval('apns'), 1.3)
+        self.assertEqual(get_resend_interval('android'), 1.0)
+
+        with override_settings(ADAPTIVE_RESEND_ENABLED=False):
+            self.assertEqual(get_resend_interval('apns'), 1.0)
@@ -0,0 +1,39 @@
+import time
+
+from django.core.signing import BadSignature, SignatureExpired
+from django.test import override_settings, TestCase
+
+from ..signing import sign_unique_key, unsign_unique_key
+
+
+@override_settings(UNIQUE_KEY_SIGNING=True, UNIQUE_KEY_SIGNING_MARGIN=0)
+class SigningTestCase(TestCase):
+    """
+    Tests for signing the unique_key of a call.
+    """
+    def test_sign(self):
+        wait_until = time.time() + 30
+        signed_key = sign_unique_key('abc:123', wait_until)
+
+        self.assertTrue(signed_key.startswith('abc:123:'))
+        self.assertEqual(signed_key, sign_unique_key('abc:123', wait_until))
+        self.assertEqual(unsign_unique_key(signed_key), 'abc:123')
+
+    def test_bad_signature(self):
+        signed_key = sign_unique_key('abc', time.time() + 30)
+
+        with self.assertRaises(BadSignature):
+            unsign_unique_key('abd' + signed_key[3:])
+        with self.assertRaises(BadSignature):
+            unsign_unique_key('abc')
+
+    def test_expired(self):
+        signed_key = sign_unique_key('abc', time.time() - 2)
+
+        with self.assertRaises(SignatureExpired):
+            unsign_unique_key(signed_key)
+
+    @override_settings(UNIQUE_KEY_SIGNING=False)
+    def test_disabled(self):
+        self.assertEqual(sign_unique_key('abc', time.time()), 'abc')
+        self.assertEqual(unsign_unique_key('abc'), 'abc')
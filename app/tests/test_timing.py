@@ -0,0 +1,45 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from ..timing import PhaseTimer
+
+
+class PhaseTimerTestCase(TestCase):
+    """
+    Tests for the PhaseTimer class.
+    """
+    @mock.patch('app.timing.record_aggregate')
+    def test_phases(self, mock_record_aggregate):
+        """
+        Test that time in the same phase is added up and emitted.
+        """
+        timer = PhaseTimer('incoming-call')
+        timer.key = 'sduiqayduiryqwuioeryqwer76789'
+
+        with timer.phase('redis'):
+            pass
+        timer.add('redis', 0.5)
+        timer.add('wait', 1.0)
+
+        self.assertEqual(list(timer.phases), ['redis', 'wait'])
+        self.assertGreaterEqual(timer.phases['redis'], 0.5)
+        self.assertEqual(timer.phases['wait'], 1.0)
+
+        timer.emit(200)
+
+        self.assertTrue(mock_record_aggregate.called)
+
+    @mock.patch('app.timing.record_aggregate')
+    def test_disabled(self, mock_record_aggregate):
+        """
+        Test that a timer without name does not record anything.
+        """
+        timer = PhaseTimer(None)
+
+        with timer.phase('serialize'):
+            pass
+        timer.emit(200)
+
+        self.assertEqual(timer.phases, {})
+        self.assertFalse(mock_record_aggregate.called)
@@ -0,0 +1,186 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import logging
+from threading import Lock
+import time
+
+from django.conf import settings
+
+from .cache import RedisClusterCache
+from .decorators import threaded
+
+logger = logging.getLogger('django')
+
+# Timings are summed per worker and flushed to redis every
+# PHASE_TIMING_FLUSH_INTERVAL so the request path stays free of extra
+# redis calls.
+_aggregates = {}
+_aggregates_lock = Lock()
+_last_flush = time.time()
+
+
+class PhaseTimer(object):
+    """
+    Class to keep track of the time spent in the phases of a request.
+    """
+    def __init__(self, name):
+        """
+        Args:
+            name (string): Name of the timed request, timing is disabled
+                when there is no name.
+        """
+        self.name = name
+        self.enabled = bool(name) and settings.PHASE_TIMING_ENABLED
+        self.key = None
+        self.outcome = None
+        self.phases = OrderedDict()
+        self.start_time = time.perf_counter()
+
+    @contextmanager
+    def phase(self, phase):
+        """
+        Context manager to time a phase. Time spent in the same phase
+        multiple times is added up.
+
+        Args:
+            phase (string): Name of the phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def add(self, phase, duration):
+        """
+        Function to add time to a phase.
+
+        Args:
+            phase (string): Name of the phase.
+            duration (float): Time spent in seconds.
+        """
+        if self.enabled:
+            self.phases[phase] = self.phases.get(phase, 0.0) + duration
+
+    def emit(self, status_code):
+        """
+        Function to log the timings of the request as a single json record
+        and add them to the aggregates.
+
+        Args:
+            status_code (int): HTTP status code of the response.
+        """
+        if not self.enabled:
+            return
+
+        total = time.perf_counter() - self.start_time
+
+        record = OrderedDict([
+            ('name', self.name),
+            ('status_code', status_code),
+            ('outcome', self.outcome),
+            ('total_ms', round(total * 1000, 3)),
+            ('phases_ms', OrderedDict((phase, round(duration * 1000, 3)) for phase, duration in self.phases.items())),
+        ])
+        logger.info('{0} | Timings {1}'.format(self.key, json.dumps(record)))
+
+        record_aggregate(self.name, total, self.phases)
+
+
+def record_aggregate(name, total, phases):
+    """
+    Function to add the timings of a request to the aggregates of this worker
+    and flush them to redis when the flush interval passed.
+
+    Args:
+        name (string): Name of the timed request.
+        total (float): Total time of the request in seconds.
+        phases (dict): Time in seconds by phase.
+    """
+    global _aggregates, _last_flush
+
+    with _aggregates_lock:
+        for phase, duration in list(phases.items()) + [('total', total)]:
+            count_and_sum = _aggregates.setdefault((name, phase), [0, 0.0])
+            count_and_sum[0] += 1
+            count_and_sum[1] += duration
+
+        if time.time() - _last_flush < settings.PHASE_TIMING_FLUSH_INTERVAL:
+            return
+
+        pending = _aggregates
+        _aggregates = {}
+        _last_flush = time.time()
+
+    flush_aggregates(pending)
+
+
+def flush_pending_aggregates():
+    """
+    Function to flush the aggregates of this worker without waiting for the
+    flush interval, eq. when the worker stops.
+    """
+    global _aggregates, _last_flush
+
+    with _aggregates_lock:
+        pending = _aggregates
+        _aggregates = {}
+        _last_flush = time.time()
+
+    if pending:
+        flush_aggregates(pending)
+
+
+@threaded
+def flush_aggregates(pending):
+    """
+    Threaded task to add the aggregates of this worker to the totals in redis.
+
+    Args:
+        pending (dict): Count and sum in seconds by (name, phase).
+    """
+    try:
+        pipe = RedisClusterCache().pipeline()
+        for (name, phase), (count, duration) in pending.items():
+            key = 'timings_{0}'.format(name)
+            pipe.hincrby(key, '{0}:count'.format(phase), count)
+            pipe.hincrbyfloat(key, '{0}:sum'.format(phase), duration)
+        pipe.execute()
+    except Exception:
+        logger.exception('Failed to flush phase timings to redis')
+
+
+def get_timing_aggregates(names):
+    """
+    Function to get the aggregated timings from redis.
+
+    Args:
+        names (list): Names of the timed requests.
+
+    Returns:
+        list: A dict per name with the count and average msec per phase.
+    """
+    redis_cache = RedisClusterCache()
+
+    results = []
+    for name in names:
+        totals = redis_cache.hgetall('timings_{0}'.format(name))
+
+        phases = []
+        for field in sorted(totals):
+            phase, kind = field.rsplit(':', 1)
+            if kind != 'count':
+                continue
+            count = int(totals[field])
+            duration = float(totals.get('{0}:sum'.format(phase), 0))
+            phases.append({
+                'phase': phase,
+                'count': count,
+                'avg_ms': duration * 1000 / count if count else None,
+                'total_sec': duration,
+            })
+
+        results.append({'name': name, 'phases': phases})
+
+    return results
@@ -0,0 +1,141 @@
+from importlib import import_module
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .cache import RedisClusterCache, reset_client
+from .callbacks import start_scheduler
+from .membership import build_filter
+from .models import App, APNS_PLATFORM
+
+logger = logging.getLogger('django')
+
+_warming_up = False
+_warm_up_time = None
+
+
+def is_warming_up():
+    return _warming_up
+
+
+def get_warm_up_time():
+    """
+    Returns:
+        float: Seconds the warm up took or None when it did not run.
+    """
+    return _warm_up_time
+
+
+def _import_code():
+    """
+    Import the url config, which imports the views, tasks and push libraries.
+    """
+    import_module(settings.ROOT_URLCONF)
+
+
+def _connect_redis():
+    """
+    Create the shared redis client (cluster slot discovery) and open a
+    connection to every node.
+    """
+    RedisClusterCache().ping()
+
+
+def _connect_database():
+    """
+    Check the database connection. Connections are per thread, the
+    connection of the warm up thread is closed when it is done.
+    """
+    connection.ensure_connection()
+
+
+def _load_apps():
+    """
+    Load the apps and read the APNS certificates so missing certificates are
+    logged before the first call.
+    """
+    for app in App.objects.all():
+        if app.platform != APNS_PLATFORM:
+            continue
+        with open(os.path.join(settings.CERT_DIR, app.push_key), 'rb') as cert_file:
+            cert_file.read()
+
+
+def _build_membership_filter():
+    """
+    Build the filter of sip accounts with devices.
+    """
+    if settings.MEMBERSHIP_FILTER_ENABLED:
+        build_filter()
+
+
+def _start_callback_scheduler():
+    """
+    Start the thread that handles calls in callback mode, when it is enabled.
+    """
+    start_scheduler()
+
+
+def prepare_worker():
+    """
+    Function to drop the redis client and database connection inherited from
+    the parent process, they can not be shared with it.
+    """
+    reset_client()
+    connection.close()
+
+
+def warm_up():
+    """
+    Function to prepare a worker, so the first call on a new worker does not
+    pay for imports and connection setup. Failing steps are logged and do not
+    stop the worker.
+    """
+    global _warming_up, _warm_up_time
+
+    _warming_up = True
+    start = time.perf_counter()
+
+    for step in (_import_code, _connect_redis, _connect_database, _load_apps, _build_membership_filter,
+                 _start_callback_scheduler):
+        try:
+            step()
+        except Exception:
+            logger.exception('Warm up step {0} failed for worker {1}'.format(step.__name__, os.getpid()))
+
+    _warm_up_time = time.perf_counter() - start
+    _warming_up = False
+
+    logger.info('Worker {0} warmed up in {1:.3f} sec'.format(os.getpid(), _warm_up_time))
+
+
+def _warm_up_thread():
+    try:
+        warm_up()
+    finally:
+        connection.close()
+
+
+def start_warm_up():
+    """
+    Function to warm up a forked worker in the background. The worker serves
+    requests meanwhile and the health endpoint reports it is warming up, so
+    load balancers send calls to warm workers.
+
+    Returns:
+        Thread: The warm up thread.
+    """
+    global _warming_up
+
+    prepare_worker()
+
+    # Set before the thread starts, so the worker never looks warm before.
+    _warming_up = True
+    thread = threading.Thread(target=_warm_up_thread, name='warm-up')
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -32,5 +32,18 @@ echo "DB server up and running."
 python /usr/src/app/manage.py migrate --noinput
 python /usr/src/app/manage.py collectstatic --noinput
 
-# Run via debugging server
-exec /usr/local/bin/uwsgi /usr/src/app/deploy/uwsgi.ini
\ No newline at end of file
+# Run uwsgi. On SIGTERM (docker stop) the workers start draining by touching
+# DRAIN_FILE while uwsgi still routes requests to them, so the load balancer
+# sees the failing health check. After DRAIN_GRACE_PERIOD seconds uwsgi stops
+# the workers gracefully, they wait for the calls in the wait loop.
+DRAIN_FILE=${DRAIN_FILE:-/tmp/middleware-drain}
+DRAIN_GRACE_PERIOD=${DRAIN_GRACE_PERIOD:-5}
+
+/usr/local/bin/uwsgi /usr/src/app/deploy/uwsgi.ini &
+UWSGI_PID=$!
+
+trap 'touch "${DRAIN_FILE}"; sleep "${DRAIN_GRACE_PERIOD}"; kill -TERM ${UWSGI_PID}' TERM INT
+
+# Wait returns when the trap ran, then wait for uwsgi to stop.
+wait ${UWSGI_PID}
+wait ${UWSGI_PID}
@@ -115,9 +115,111 @@ APP_API_URL = os.environ.get('APP_API_URL')
 APP_PUSH_ROUNDTRIP_WAIT = int(os.environ.get('APP_PUSH_ROUNDTRIP_WAIT', 4000))
 APP_PUSH_RESEND_INTERVAL = int(os.environ.get('APP_PUSH_RESEND_INTERVAL', 1000))
 
+# Resend a push message when the given percentile of the round trip times of
+# the platform in the last window (in seconds) passed without a response.
+# APP_PUSH_RESEND_INTERVAL is used without enough responses and still sets
+# the maximum amount of push messages per call.
+ADAPTIVE_RESEND_ENABLED = os.environ.get('ADAPTIVE_RESEND_ENABLED', 'True') == 'True'
+ADAPTIVE_RESEND_PERCENTILE = int(os.environ.get('ADAPTIVE_RESEND_PERCENTILE', 80))
+ADAPTIVE_RESEND_WINDOW = int(os.environ.get('ADAPTIVE_RESEND_WINDOW', 86400))
+ADAPTIVE_RESEND_MIN_SAMPLES = int(os.environ.get('ADAPTIVE_RESEND_MIN_SAMPLES', 100))
+ADAPTIVE_RESEND_MAX_SAMPLES = int(os.environ.get('ADAPTIVE_RESEND_MAX_SAMPLES', 10000))
+ADAPTIVE_RESEND_MIN_INTERVAL = int(os.environ.get('ADAPTIVE_RESEND_MIN_INTERVAL', 500))
+ADAPTIVE_RESEND_REFRESH_INTERVAL = int(os.environ.get('ADAPTIVE_RESEND_REFRESH_INTERVAL', 300))
+
+# Give up on a call before APP_PUSH_ROUNDTRIP_WAIT when the chance one of the
+# devices still answers in time drops below the threshold, based on a moving
+# average (with weight alpha) of the round trip time and answers per device.
+# Devices with less calls than the minimum are always waited for.
+EARLY_GIVE_UP_THRESHOLD = float(os.environ.get('EARLY_GIVE_UP_THRESHOLD', 0.05))
+EARLY_GIVE_UP_MIN_CALLS = int(os.environ.get('EARLY_GIVE_UP_MIN_CALLS', 10))
+DEVICE_MODEL_ALPHA = float(os.environ.get('DEVICE_MODEL_ALPHA', 0.2))
+
+# Seconds before an unchanged device registration writes last_seen again.
+DEVICE_LAST_SEEN_INTERVAL = int(os.environ.get('DEVICE_LAST_SEEN_INTERVAL', 3600))
+# Default days without registration before prune_devices deletes a device.
+DEVICE_PRUNE_DAYS = int(os.environ.get('DEVICE_PRUNE_DAYS', 90))
+# Devices per sip account, registering another device replaces the least
+# recently seen one.
+MAX_DEVICES_PER_ACCOUNT = int(os.environ.get('MAX_DEVICES_PER_ACCOUNT', 3))
+# Maximum sip accounts rung by a single group call.
+GROUP_CALL_MAX_ACCOUNTS = int(os.environ.get('GROUP_CALL_MAX_ACCOUNTS', 50))
+
+# Every worker keeps a bloom filter of the sip accounts with devices so calls
+# for unknown accounts are refused without a database query. The filter is
+# rebuilt every rebuild interval (in seconds).
+MEMBERSHIP_FILTER_ENABLED = os.environ.get('MEMBERSHIP_FILTER_ENABLED', 'True') == 'True'
+MEMBERSHIP_FILTER_ERROR_RATE = float(os.environ.get('MEMBERSHIP_FILTER_ERROR_RATE', 0.01))
+MEMBERSHIP_FILTER_REBUILD_INTERVAL = int(os.environ.get('MEMBERSHIP_FILTER_REBUILD_INTERVAL', 3600))
+
+# Log the time spent per phase of the call views and aggregate them in redis
+# every flush interval (in seconds).
+PHASE_TIMING_ENABLED = os.environ.get('PHASE_TIMING_ENABLED', 'True') == 'True'
+PHASE_TIMING_FLUSH_INTERVAL = int(os.environ.get('PHASE_TIMING_FLUSH_INTERVAL', 10))
+
+# Health endpoint, results are cached per worker for HEALTH_CACHE_TIMEOUT
+# seconds.
+HEALTH_CACHE_TIMEOUT = float(os.environ.get('HEALTH_CACHE_TIMEOUT', 2))
+HEALTH_MAX_THREADS = int(os.environ.get('HEALTH_MAX_THREADS', 200))
+
+# Calls in the wait loop are registered in redis. The registry expires a call
+# INFLIGHT_TTL_MARGIN seconds after its wait time. WORKERS_PER_NODE should
+# match the workers in deploy/uwsgi.ini.
+INFLIGHT_TTL_MARGIN = int(os.environ.get('INFLIGHT_TTL_MARGIN', 5))
+WORKERS_PER_NODE = int(os.environ.get('WORKERS_PER_NODE', 6))
+
+# Calls that may wait for a device at the same time per node, more calls get
+# LOAD_SHED_RESPONSE with status code 503 at once. Keep a worker free for the
+# call responses of the devices. 0 disables the limit.
+MAX_WAITING_CALLS = int(os.environ.get('MAX_WAITING_CALLS', WORKERS_PER_NODE - 1))
+LOAD_SHED_RESPONSE = os.environ.get('LOAD_SHED_RESPONSE', 'status=NAK')
+
+# Hosts the PBX callback urls of incoming calls in callback mode may point to,
+# comma separated. Callback mode is disabled without hosts. The due calls are
+# checked every scheduler interval, a call that failed to process is retried
+# after the retry delay (both in msec).
+CALLBACK_ALLOWED_HOSTS = os.environ.get('CALLBACK_ALLOWED_HOSTS', '')
+CALLBACK_TIMEOUT = float(os.environ.get('CALLBACK_TIMEOUT', 2))
+CALLBACK_SCHEDULER_INTERVAL = int(os.environ.get('CALLBACK_SCHEDULER_INTERVAL', 50))
+CALLBACK_RETRY_DELAY = int(os.environ.get('CALLBACK_RETRY_DELAY', 500))
+
+# Sign the unique_key sent to the devices with an expiry of the wait time
+# plus UNIQUE_KEY_SIGNING_MARGIN seconds, so the call-response endpoint
+# refuses unknown keys without redis. Enable once all apps post the
+# unique_key of the push message unchanged.
+UNIQUE_KEY_SIGNING = os.environ.get('UNIQUE_KEY_SIGNING', 'False') == 'True'
+UNIQUE_KEY_SIGNING_MARGIN = int(os.environ.get('UNIQUE_KEY_SIGNING_MARGIN', 60))
+
+# FastAGI server (manage.py agi_server) for asterisk. The blocking database
+# and redis calls run in AGI_SERVER_THREADS threads, the waiting calls are
+# checked together every AGI_POLL_INTERVAL (in msec).
+AGI_SERVER_HOST = os.environ.get('AGI_SERVER_HOST', '0.0.0.0')
+AGI_SERVER_PORT = int(os.environ.get('AGI_SERVER_PORT', 4573))
+AGI_SERVER_THREADS = int(os.environ.get('AGI_SERVER_THREADS', 20))
+AGI_POLL_INTERVAL = int(os.environ.get('AGI_POLL_INTERVAL', 10))
+
+# Outcome of every incoming call, written to the call log in batches of
+# CALL_LOG_BATCH_SIZE calls or at least every CALL_LOG_FLUSH_INTERVAL seconds.
+CALL_LOG_BATCH_SIZE = int(os.environ.get('CALL_LOG_BATCH_SIZE', 50))
+CALL_LOG_FLUSH_INTERVAL = int(os.environ.get('CALL_LOG_FLUSH_INTERVAL', 10))
+
+# Seconds a stopping worker waits for background tasks (push messages and
+# logging) after the waiting calls finished. Workers start draining when
+# DRAIN_FILE is touched, before uwsgi stops them.
+DRAIN_TASK_TIMEOUT = int(os.environ.get('DRAIN_TASK_TIMEOUT', 5))
+DRAIN_FILE = os.environ.get('DRAIN_FILE', '/tmp/middleware-drain')
+
 LOGGING_DIR = os.environ.get('LOGGING_DIR', '/var/log/middleware')
 LOG_SOURCE = 'web-app'
 
+# Sampling profiler, profiles are written to LOGGING_DIR. Started through the
+# admin (responselog/profiler/) or by sending PROFILER_SIGNAL (eq. 'SIGUSR2')
+# to a worker. Sample interval in msec, durations in seconds.
+PROFILER_SIGNAL = os.environ.get('PROFILER_SIGNAL', '')
+PROFILER_INTERVAL = int(os.environ.get('PROFILER_INTERVAL', 5))
+PROFILER_DURATION = int(os.environ.get('PROFILER_DURATION', 30))
+PROFILER_MAX_DURATION = int(os.environ.get('PROFILER_MAX_DURATION', 300))
+
 MANAGERS = ADMINS = ('noc+middleware@voipgrid.nl',)
 
 LOGGING = {
@@ -182,8 +284,34 @@ VG_API_USER_URL = urljoin(VG_API_BASE_URL, os.environ.get('VG_API_USER_URL', '/a
 # Testing
 TESTING = os.environ.get('TESTING', sys.argv[1:2] == ['test'])
 PERFORMANCE_TEST_ITERATIONS = os.environ.get('PERFORMANCE_TEST_ITERATIONS', 1)
+# Intervals learned from the response logs of a test would leak into the
+# tests after it, the resend tests enable adaptive resending themselves.
+if TESTING:
+    ADAPTIVE_RESEND_ENABLED = False
+# Micro benchmarks for the per call code, see api/tests/test_benchmarks.py.
+# They are skipped in the normal test suite unless enabled.
+BENCHMARK_ENABLED = os.environ.get('BENCHMARK_ENABLED', 'False') == 'True'
+BENCHMARK_ITERATIONS = int(os.environ.get('BENCHMARK_ITERATIONS', 20))
+BENCHMARK_BASELINE_FILE = os.environ.get(
+    'BENCHMARK_BASELINE_FILE', os.path.join(BASE_DIR, 'api/tests/benchmark_baseline.json'))
+BENCHMARK_SAVE_BASELINE = os.environ.get('BENCHMARK_SAVE_BASELINE', 'False') == 'True'
+# Allowed slowdown compared to the baseline before reporting a regression.
+BENCHMARK_TOLERANCE = float(os.environ.get('BENCHMARK_TOLERANCE', 0.25))
+BENCHMARK_FAIL_ON_REGRESSION = os.environ.get('BENCHMARK_FAIL_ON_REGRESSION', 'False') == 'True'
 TEST_RUNNER = 'django_nose.NoseTestSuiteRunner'
 
+# Token bucket rate limits of the call-response and device endpoints per
+# client ip and per sip_user_id, eq. '20/min' (per s, min, hour or day).
+# Empty disables a limit, the limits are disabled in tests.
+REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = {
+    'ip': None if TESTING else os.environ.get('THROTTLE_RATE_IP', '300/min'),
+    'sip_user_id': None if TESTING else os.environ.get('THROTTLE_RATE_SIP_USER_ID', '20/min'),
+}
+# Amount of proxies in front of the api that add the client ip to
+# X-Forwarded-For. With 0 the ip throttle uses the address that connected,
+# a header set by the client can not give it a new bucket.
+REST_FRAMEWORK['NUM_PROXIES'] = int(os.environ.get('NUM_PROXIES', 0))
+
 
 RAVEN_CONFIG = {
     'dsn': os.environ.get('SENTRY_DSN', None),
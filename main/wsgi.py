@@ -9,9 +9,35 @@ https://docs.djangoproject.com/en/1.8/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 from raven.contrib.django.raven_compat.middleware.wsgi import Sentry
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
 
 application = Sentry(get_wsgi_application())
+
+# Imported after setting up django because it needs the settings.
+from app.profiler import install_signal_handler  # noqa
+from app.drain import drain, prepare_drain_file, start_draining  # noqa
+from app.warmup import start_warm_up, warm_up  # noqa
+
+try:
+    import uwsgi
+    from uwsgidecorators import filemon, postfork
+except ImportError:
+    # Not running in uwsgi, there is only one process.
+    install_signal_handler()
+    warm_up()
+else:
+    postfork(install_signal_handler)
+    # Warm up every worker in the background after it is forked, the health
+    # endpoint reports the worker is warming up until it is done.
+    postfork(start_warm_up)
+    # Start draining while uwsgi still routes requests to the workers, so
+    # new calls are refused with a 503 and the health check fails. uwsgi
+    # stops routing requests to a worker before atexit runs.
+    prepare_drain_file()
+    filemon(settings.DRAIN_FILE, target='workers')(lambda signum: start_draining())
+    # Let waiting calls and background tasks finish before a worker exits.
+    uwsgi.atexit = drain